@@ -0,0 +1,131 @@
+# Timings for the image processing in linedraw, comparing its functions with the versions they replaced
+# (kept in linedraw_reference) and checking that both give the same results.
+#
+# Run with, for example:
+#
+#     python benchmark.py images/africa.jpg --resolution 2048
+#
+# The reference versions can be very slow on large images. To see instead how vectorising scales
+# with the number of worker processes (from 1 up to 4, here), run:
+#
+#     python benchmark.py images/africa.jpg --resolution 4096 --workers 4
+
+import argparse
+import time
+
+from PIL import Image, ImageOps
+
+import linedraw
+import linedraw_reference
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def compare(name, function, reference, *args, expected=None, **kwargs):
+
+    # expected, if supplied, turns the reference result into the one the new function should give
+
+    new_time, new_result = timed(function, *args, **kwargs)
+    reference_time, reference_result = timed(reference, *args, **kwargs)
+
+    if expected:
+        reference_result = expected(reference_result)
+
+    print(
+        f"{name:<12} {new_time:>9.3f}s {reference_time:>11.3f}s {reference_time / new_time:>8.1f}x  "
+        f"{'same' if new_result == reference_result else 'DIFFERENT'}"
+    )
+
+    return new_result, reference_result
+
+
+def sobel(image):
+    image = image.copy()
+    linedraw.appmask(image, [linedraw.F_SobelX, linedraw.F_SobelY])
+    return image.tobytes()
+
+
+def sobel_reference(image):
+    image = image.copy()
+    linedraw_reference.appmask(image, [linedraw.F_SobelX, linedraw.F_SobelY])
+    return image.tobytes()
+
+
+def scaling(image_filename, resolution, draw_contours, draw_hatch, max_workers):
+
+    print(f"{image_filename}, resolution {resolution}")
+    print(f"{'workers':<12} {'time':>10} {'speed-up':>9}")
+
+    image = linedraw.open_image(image_filename)
+
+    for workers in range(1, max_workers + 1):
+
+        # the work that vectorise() does, without writing an SVG file
+        elapsed, lines = timed(
+            lambda: [
+                line
+                for strokes in linedraw.stroke_groups(
+                    image, resolution, draw_contours=draw_contours, draw_hatch=draw_hatch, workers=workers
+                )
+                for line in strokes
+            ]
+        )
+
+        if workers == 1:
+            single = elapsed
+
+        print(f"{workers:<12} {elapsed:>9.3f}s {single / elapsed:>8.1f}x  {len(lines)} lines")
+
+
+def load_image(filename, resolution, scale):
+
+    # prepare an image the way linedraw.vectorise() does
+
+    image = Image.open(filename)
+    w, h = image.size
+    image = ImageOps.autocontrast(image.convert("L"), 10)
+
+    return image.resize((int(resolution/scale), int(resolution/scale*h/w)))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark linedraw's image processing")
+    parser.add_argument("image", nargs="?", default="images/africa.jpg")
+    parser.add_argument("--resolution", type=int, default=1024)
+    parser.add_argument("--hatch", type=int, default=8, help="hatching scale")
+    parser.add_argument("--contours", type=int, default=2, help="contour scale")
+    parser.add_argument("--workers", type=int, default=0, help="time vectorising with 1 to this many processes")
+    args = parser.parse_args()
+
+    if args.workers:
+        scaling(args.image, args.resolution, args.contours, args.hatch, args.workers)
+        return
+
+    print(f"{args.image}, resolution {args.resolution}")
+    print(f"{'':<12} {'new':>10} {'reference':>12} {'speed-up':>9}")
+
+    image = load_image(args.image, args.resolution, args.hatch)
+    compare("hatch", linedraw.hatch, linedraw_reference.hatch, image, args.hatch)
+
+    image = load_image(args.image, args.resolution, args.contours)
+    compare("appmask", sobel, sobel_reference, image)
+
+    edges = linedraw.find_edges(image)
+    dots, _ = compare("getdots", linedraw.getdots, linedraw_reference.getdots, edges)
+
+    # the reference version can leave behind some short contours that should have been dropped
+    contours, _ = compare(
+        "connectdots", linedraw.connectdots, linedraw_reference.connectdots, dots,
+        expected=lambda contours: [c for c in contours if len(c) >= 4 or c[-1][1] >= len(dots)-2],
+    )
+
+    compare("join", linedraw.join_contours, linedraw_reference.join_contours, contours)
+
+
+if __name__ == "__main__":
+    main()
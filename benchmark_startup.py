@@ -0,0 +1,66 @@
+# Timings for importing brachiograph and creating a virtual BrachioGraph, each in a fresh Python
+# process - as they would be for a short-lived plotting job. It also reports which of the slow-to-import
+# modules have actually been loaded by the end.
+#
+# Run with, for example:
+#
+#     python benchmark_startup.py --runs 20
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ("numpy", "readchar", "tqdm", "pigpio")
+
+# run in each fresh process; modules that have only been lazily imported aren't yet of type module
+startup = f"""
+import json, sys, time
+
+start = time.perf_counter()
+import brachiograph
+imported = time.perf_counter()
+brachiograph.BrachioGraph(8, 8, virtual_mode=True, bounds=(-6, 4, 6, 12), wiggle_pen={{wiggle_pen}})
+created = time.perf_counter()
+
+loaded = [name for name in {HEAVY_MODULES} if type(sys.modules.get(name)).__name__ == "module"]
+print(json.dumps([imported - start, created - imported, loaded]), file=sys.stderr)
+"""
+
+
+def run(wiggle_pen):
+
+    result = subprocess.run(
+        [sys.executable, "-c", startup.format(wiggle_pen=wiggle_pen)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark importing brachiograph and creating a BrachioGraph")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--wiggle", action="store_true", help="wiggle the pen when creating the BrachioGraph")
+    args = parser.parse_args()
+
+    results = [run(args.wiggle) for _ in range(args.runs)]
+
+    import_times = [import_time for import_time, create_time, loaded in results]
+    create_times = [create_time for import_time, create_time, loaded in results]
+
+    print(f"{'':<22} {'median':>9} {'min':>9} {'max':>9}")
+    for name, times in (("import brachiograph", import_times), ("create BrachioGraph", create_times)):
+        print(
+            f"{name:<22} {statistics.median(times) * 1000:>7.1f}ms {min(times) * 1000:>7.1f}ms "
+            f"{max(times) * 1000:>7.1f}ms"
+        )
+
+    print(f"modules loaded: {', '.join(results[-1][2]) or 'none of ' + ', '.join(HEAVY_MODULES)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,46 @@
 # coding=utf-8
 
 from time import sleep
-import readchar
+import importlib.util
 import math
-import numpy
-import json
+import sys
 
-try:
-    import pigpio
+
+def lazy_import(name):
+
+    # Returns a module that will only actually be loaded when one of its attributes is first used.
+    # numpy and readchar take most of the time it takes to import this module, and none of them
+    # is needed just to create a BrachioGraph. (A plain `import numpy` elsewhere loads it straight
+    # away, so the library's own modules that use numpy are imported only when needed, too.)
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+    return module
+
+
+numpy = lazy_import("numpy")
+readchar = lazy_import("readchar")
+
+# pigpio itself is imported by the driver that uses it
+if importlib.util.find_spec("pigpio"):
     force_virtual_mode = False
-except ModuleNotFoundError:
+else:
     print("pigpio not installed, running in test mode")
     force_virtual_mode = True
 
-import tqdm
+from calibration import Calibration
+from drivers import PigpioDriver, VirtualDriver
+from progress import Progress, make_sinks
 
 
 class BrachioGraph:
@@ -37,6 +64,15 @@ class BrachioGraph:
         hysteresis_correction_2=0,
         pw_up=1500,                 # pulse-widths for pen up/down
         pw_down=1100,
+        waveforms=False,            # use pigpio waveforms to clock out whole moves
+        driver=None,                # the servo driver; by default, chosen according to virtual_mode
+        calibration_cache=None,     # a folder to keep fitted servo calibrations in
+        wiggle_pen=True,            # move the pen down and up again on start-up, to show that it works
+        progress=None,              # progress reporting: by default a progress bar; see progress.py
+        tolerance=0,                # if set, how far in mm the pen may stray from straight lines, instead of
+                                    # interpolating a fixed number of steps per cm
+        acceleration=0,             # if set, in cm/s², the pen speeds up and slows down at this rate
+        junction_deviation=0.01,    # in cm; larger values take corners faster, when there's an acceleration
     ):
 
         # set the pantograph geometry
@@ -48,8 +84,16 @@ class BrachioGraph:
         # the box bounds describe a rectangle that we can safely draw in
         self.bounds = bounds
 
+        self.tolerance = tolerance
+
+        # motion profiles
+        self.acceleration = acceleration
+        self.junction_deviation = junction_deviation
+
+        self.progress_sinks = make_sinks(progress)
+
         # if pulse-widths to angles are supplied for each servo, we will feed them to
-        # numpy.polyfit(), to produce a function for each one. Otherwise, we will use a simple
+        # numpy.polyfit(), to produce a Calibration for each one. Otherwise, we will use a simple
         # approximation based on a centre of travel of 1500µS and 10µS per degree
 
         self.servo_1_centre = servo_1_centre
@@ -62,65 +106,54 @@ class BrachioGraph:
         self.arm_2_centre = arm_2_centre
         self.hysteresis_correction_2 = hysteresis_correction_2
 
+        # fitting is only done once for any set of measurements; with calibration_cache, the fitted
+        # calibrations are also saved for other processes to use
         if servo_1_angle_pws:
-            servo_1_array = numpy.array(servo_1_angle_pws)
-            self.angles_to_pw_1 = numpy.poly1d(
-                numpy.polyfit(
-                    servo_1_array[:,0],
-                    servo_1_array[:,1],
-                    3
-                )
-            )
-
+            self.angles_to_pw_1 = Calibration.cached(servo_1_angle_pws, calibration_cache)
         else:
             self.angles_to_pw_1 = self.naive_angles_to_pulse_widths_1
 
         if servo_2_angle_pws:
-            servo_2_array = numpy.array(servo_2_angle_pws)
-            self.angles_to_pw_2 = numpy.poly1d(
-                numpy.polyfit(
-                    servo_2_array[:,0],
-                    servo_2_array[:,1],
-                    3
-                )
-            )
-
+            self.angles_to_pw_2 = Calibration.cached(servo_2_angle_pws, calibration_cache)
         else:
             self.angles_to_pw_2 = self.naive_angles_to_pulse_widths_2
 
+        # the driver sends pulse-widths to the servos - or in virtual mode, just keeps track of them
+        if driver:
+            self.driver = driver
+        elif self.virtual_mode:
+            self.driver = VirtualDriver()
+        else:
+            self.driver = PigpioDriver(waveforms=waveforms)
 
         # create the pen object, and make sure the pen is up
-        self.pen = Pen(bg=self, pw_up=pw_up, pw_down=pw_down, virtual_mode=self.virtual_mode)
+        self.pen = Pen(bg=self, pw_up=pw_up, pw_down=pw_down, virtual_mode=self.virtual_mode, wiggle=wiggle_pen)
+
+        # the pulse frequency should be no higher than 100Hz - higher values could (supposedly) damage the servos
+        self.driver.set_frequency(14, 50)
+        self.driver.set_frequency(15, 50)
+
+        # Initialise the pantograph with the motors in the centre of their travel
+        self.driver.set_pulse_width(14, self.angles_to_pw_1(-90))
+        if not self.virtual_mode:
+            sleep(0.3)
+        self.driver.set_pulse_width(15, self.angles_to_pw_2(90))
+        if not self.virtual_mode:
+            sleep(0.3)
 
         if self.virtual_mode:
 
             print("Initialising virtual BrachioGraph")
 
-            self.virtual_pw_1 = self.angles_to_pw_1(-90)
-            self.virtual_pw_2 = self.angles_to_pw_2(90)
-
             # by default in virtual mode, we use a wait factor of 0 for speed
             self.wait = wait or 0
 
             print("    Pen is up")
-            print("    Pulse-width 1", self.virtual_pw_1)
-            print("    Pulse-width 2", self.virtual_pw_2)
+            print("    Pulse-width 1", self.driver.get_pulse_width(14))
+            print("    Pulse-width 2", self.driver.get_pulse_width(15))
 
         else:
 
-            # instantiate this Raspberry Pi as a pigpio.pi() instance
-            self.rpi = pigpio.pi()
-
-            # the pulse frequency should be no higher than 100Hz - higher values could (supposedly) damage the servos
-            self.rpi.set_PWM_frequency(14, 50)
-            self.rpi.set_PWM_frequency(15, 50)
-
-            # Initialise the pantograph with the motors in the centre of their travel
-            self.rpi.set_servo_pulsewidth(14, self.angles_to_pw_1(-90))
-            sleep(0.3)
-            self.rpi.set_servo_pulsewidth(15, self.angles_to_pw_2(90))
-            sleep(0.3)
-
             # by default we use a wait factor of 0.1 for accuracy
             self.wait = wait or .1
 
@@ -150,7 +183,9 @@ class BrachioGraph:
     # ----------------- drawing methods -----------------
 
 
-    def plot_file(self, filename="", wait=0, interpolate=10, bounds=None):
+    def plot_file(self, filename="", wait=0, interpolate=10, bounds=None, optimise=0, merge=0, fix=None):
+
+        from linefile import read_lines
 
         wait = wait or self.wait
         bounds = bounds or self.bounds
@@ -158,13 +193,21 @@ class BrachioGraph:
         if not bounds:
             return "File plotting is only possible when BrachioGraph.bounds is set."
 
-        with open(filename, "r") as line_file:
-            lines = json.load(line_file)
+        lines = read_lines(filename)
 
-        self.plot_lines(lines=lines, wait=wait, interpolate=interpolate, bounds=bounds, flip=True)
+        self.plot_lines(
+            lines=lines, wait=wait, interpolate=interpolate, bounds=bounds, flip=True, optimise=optimise, merge=merge,
+            fix=fix,
+        )
 
 
-    def plot_lines(self, lines=[], wait=0, interpolate=10, rotate=False, flip=False, bounds=None):
+    def plot_lines(
+        self, lines=[], wait=0, interpolate=10, rotate=False, flip=False, bounds=None, optimise=0, merge=0, fix=None
+    ):
+
+        # fix: what to do with lines that can't be plotted (see validate.py) - None to refuse to plot
+        #      them, "clip" to leave out the parts that can't be plotted (and any lines the pen can't
+        #      travel to), or "rescale" to shrink the whole drawing until they all can be
 
         wait = wait or self.wait
         bounds = bounds or self.bounds
@@ -172,22 +215,78 @@ class BrachioGraph:
         if not bounds:
             return "Line plotting is only possible when BrachioGraph.bounds is set."
 
-        lines = self.rotate_and_scale_lines(lines=lines, bounds=bounds, flip=True)
+        lines = self.prepare_lines(lines=lines, bounds=bounds, optimise=optimise, merge=merge)
 
-        for line in tqdm.tqdm(lines, desc="Lines", leave=False):
-            x, y = line[0]
+        if fix:
+            lines = self.fix_lines(lines, fix, interpolate=interpolate, bounds=bounds)
 
-            # only if we are not within 1mm of the start of the line, lift pen and go there
-            if (round(self.current_x, 1), round(self.current_y, 1)) != (round(x, 1), round(y, 1)):
-                self.xy(x, y, wait=wait, interpolate=interpolate)
+        self.draw_lines(lines, wait=wait, interpolate=interpolate, bounds=bounds)
+
+        self.park()
+
+
+    def plot_stream(self, strokes, extent, wait=0, interpolate=10, bounds=None):
+
+        # Plots lines as they become available, from an iterator over chunks of lines (such as the one
+        # returned by linedraw.vectorise_stream()), so that plotting can start before they are all
+        # ready. As the lines can't be analysed in advance, they are scaled so that extent - the
+        # rectangle (x min, y min, x max, y max) that they lie within - fits the bounds.
+
+        wait = wait or self.wait
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Stream plotting is only possible when BrachioGraph.bounds is set."
+
+        for chunk in strokes:
 
-            for point in tqdm.tqdm(line[1:], desc="Segments", leave=False):
-                x, y = point
-                self.draw(x, y, wait=wait, interpolate=interpolate)
+            lines = self.rotate_and_scale_lines(lines=chunk, bounds=bounds, flip=True, extent=extent)
+
+            self.draw_lines(lines, wait=wait, interpolate=interpolate)
 
         self.park()
 
 
+    def draw_lines(self, lines, wait=0, interpolate=10, bounds=None):
+
+        # draws lines (which may be a Drawing) that have already been scaled to fit the bounds
+
+        from drawing import Drawing
+        from validate import validate
+
+        drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+
+        # check in a single pass that every point the pen will pass through can be plotted (and is
+        # within bounds, if they are given), before the pen starts moving
+        validation = validate(self, drawing, interpolate=interpolate, bounds=bounds)
+        if not validation.ok:
+            raise ValueError(str(validation))
+
+        with self.start_progress(int(numpy.maximum(drawing.lengths - 1, 0).sum()), "Lines") as progress:
+
+            for line in drawing:
+                line = line.tolist()
+                x, y = line[0]
+
+                # only if we are not within 1mm of the start of the line, lift pen and go there
+                if (round(self.current_x, 1), round(self.current_y, 1)) != (round(x, 1), round(y, 1)):
+                    self.xy(x, y, wait=wait, interpolate=interpolate)
+
+                speeds = self.line_speeds(line, wait) if self.acceleration and wait else [0] * len(line)
+
+                # with waveforms, the daemon can clock out the whole line without a pause between
+                # its segments
+                if getattr(self.driver, "waveforms", False):
+                    self.draw_path(line, wait=wait, interpolate=interpolate, speeds=speeds)
+                    progress.step(len(line) - 1)
+                    continue
+
+                for i, point in enumerate(line[1:]):
+                    x, y = point
+                    self.draw(x, y, wait=wait, interpolate=interpolate, speeds=speeds[i:i + 2])
+                    progress.step()
+
+
     def draw_line(self, start=(0, 0), end=(0, 0), wait=0, interpolate=10, both=False):
 
         wait = wait or self.wait
@@ -207,42 +306,296 @@ class BrachioGraph:
         self.pen.up()
 
 
-    def draw(self, x=0, y=0, wait=0, interpolate=10):
+    def draw(self, x=0, y=0, wait=0, interpolate=10, speeds=(0, 0)):
+
+        wait = wait or self.wait
+
+        self.xy(x=x, y=y, wait=wait, interpolate=interpolate, draw=True, speeds=speeds)
+
+
+    def draw_path(self, line, wait=0, interpolate=10, speeds=None):
+
+        # Draws from the current position through the rest of the points of line, working out the
+        # steps of every segment first, so that the driver can play them all in one go. speeds are
+        # the speeds at which to pass each point, if the BrachioGraph has an acceleration.
+
+        wait = wait or self.wait
+        speeds = speeds or [0] * len(line)
+
+        self.pen.down()
+
+        # each segment starts from the last step of the one before, as it would moving point by point
+        x_steps, y_steps, dwells = [], [], []
+        start = (self.current_x, self.current_y)
+
+        for (x, y), segment_speeds in zip(line[1:], zip(speeds, speeds[1:])):
+            segment = self.steps(x, y, wait, interpolate, start=start, speeds=segment_speeds)
+            for steps, segment_steps in zip((x_steps, y_steps, dwells), segment):
+                steps.append(segment_steps)
+            start = (float(segment[0][-1]), float(segment[1][-1]))
+
+        if not dwells:
+            return
+
+        x_steps, y_steps, dwells = (numpy.concatenate(steps) for steps in (x_steps, y_steps, dwells))
+        angles_1, angles_2, pws_1, pws_2 = self.xy_to_pulse_widths_array(x_steps, y_steps)
+
+        self.play_pulse_widths(pws_1, pws_2, angles_1, angles_2, dwells)
+
+        self.current_x, self.current_y = start
+
+    # ----------------- plot program methods -----------------
+
+    # Instead of plotting lines directly, they can first be compiled into a PlotProgram - the
+    # complete timeline of pulse-widths for the servos - which can then be run (repeatedly, or saved
+    # and loaded later) without any further calculation while the plotter is moving.
+
+    def compile_file(self, filename="", wait=0, interpolate=10, bounds=None, optimise=0, merge=0):
+
+        from linefile import read_lines
+
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Compiling a file is only possible when BrachioGraph.bounds is set."
+
+        lines = read_lines(filename)
+
+        return self.compile_lines(
+            lines=lines, wait=wait, interpolate=interpolate, bounds=bounds, optimise=optimise, merge=merge
+        )
+
+
+    def compile_lines(self, lines=[], wait=0, interpolate=10, bounds=None, optimise=0, merge=0):
+
+        from plot_program import ProgramBuilder
 
         wait = wait or self.wait
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Compiling lines is only possible when BrachioGraph.bounds is set."
+
+        drawing = self.prepare_lines(lines=lines, bounds=bounds, optimise=optimise, merge=merge)
+
+        # programs always start (and finish) with the plotter parked
+        builder = ProgramBuilder(self, wait=wait, interpolate=interpolate, start=(-self.INNER_ARM, self.OUTER_ARM))
+
+        for line in drawing:
+            line = line.tolist()
+            x, y = line[0]
+
+            # only if we are not within 1mm of the start of the line, lift pen and go there
+            if (round(builder.x, 1), round(builder.y, 1)) != (round(x, 1), round(y, 1)):
+                builder.xy(x, y)
+
+            speeds = self.line_speeds(line, wait) if self.acceleration and wait else [0] * len(line)
+
+            for i, (x, y) in enumerate(line[1:]):
+                builder.xy(x, y, draw=True, speeds=speeds[i:i + 2])
+
+        builder.wait = self.wait
+        builder.interpolate = 10
+        builder.xy(-self.INNER_ARM, self.OUTER_ARM)
+        builder.dwell(1)
+
+        return builder.build()
+
+
+    def load_program(self, filename):
+        from plot_program import PlotProgram
+        return PlotProgram.load(filename)
+
+
+    def run_program(self, program):
+
+        # get to the position the program starts from, with the pen up
+        self.pen.up()
+        self.xy(*program.start)
+
+        records = program.records
+        pulse_widths = numpy.column_stack((records["pw_1"], records["pw_2"], records["pen_pw"])).astype(float)
+
+        # the driver streams out the whole program, arm and pen servos together
+        self.driver.play((14, 15, self.pen.pin), pulse_widths, records["dwell"].astype(float))
+
+        # the plotter is left where the program finished, so that it can carry on from there
+        if len(records):
+            correction_1, correction_2 = program.corrections
+            self.previous_pw_1 = float(records["pw_1"][-1]) - correction_1
+            self.previous_pw_2 = float(records["pw_2"][-1]) - correction_2
+            self.active_hysteresis_correction_1, self.active_hysteresis_correction_2 = correction_1, correction_2
+            self.pen.pulse_width = float(records["pen_pw"][-1])
+
+        self.current_x, self.current_y = program.end
+        self.angle_1, self.angle_2 = self.xy_to_angles(*program.end)
+
+
+    # ----------------- estimating methods -----------------
+
+    # A dry run of plot_file() or plot_lines(): nothing is moved, but the plot is followed against a
+    # virtual clock (see simulate.py) to estimate how long it would take on the plotter, and what
+    # would be sent to the servos. A virtual BrachioGraph doesn't wait at all, so unless a wait is
+    # given the estimate uses the plotter's default of 0.1.
+
+    def estimate_file(self, filename="", wait=0, interpolate=10, bounds=None, optimise=0, merge=0):
+
+        from linefile import read_lines
+
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Estimating a file is only possible when BrachioGraph.bounds is set."
+
+        lines = read_lines(filename)
+
+        return self.estimate_lines(
+            lines=lines, wait=wait, interpolate=interpolate, bounds=bounds, flip=True, optimise=optimise, merge=merge
+        )
+
+
+    def estimate_lines(
+        self, lines=[], wait=0, interpolate=10, rotate=False, flip=False, bounds=None, optimise=0, merge=0
+    ):
+
+        from simulate import simulate
+
+        wait = wait or self.wait or .1
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Estimating lines is only possible when BrachioGraph.bounds is set."
+
+        lines = self.prepare_lines(lines=lines, bounds=bounds, optimise=optimise, merge=merge)
+
+        return simulate(self, lines, wait=wait, interpolate=interpolate, park_wait=self.wait or .1)
+
+
+    # ----------------- validating methods -----------------
+
+    # Checks that lines can be plotted, before plotting them: see validate.py. validate_file() and
+    # validate_lines() take the same arguments as plot_file() and plot_lines(), and return a
+    # Validation, listing the lines (by their position in the order they'd be plotted) that can't be.
+
+    def validate_file(self, filename="", interpolate=10, bounds=None, optimise=0, merge=0):
+
+        from linefile import read_lines
+
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Validating a file is only possible when BrachioGraph.bounds is set."
+
+        lines = read_lines(filename)
+
+        return self.validate_lines(
+            lines=lines, interpolate=interpolate, bounds=bounds, flip=True, optimise=optimise, merge=merge
+        )
+
+
+    def validate_lines(self, lines=[], interpolate=10, rotate=False, flip=False, bounds=None, optimise=0, merge=0):
+
+        from validate import validate
+
+        bounds = bounds or self.bounds
+
+        if not bounds:
+            return "Validating lines is only possible when BrachioGraph.bounds is set."
+
+        lines = self.prepare_lines(lines=lines, bounds=bounds, optimise=optimise, merge=merge)
+
+        return validate(self, lines, interpolate=interpolate, bounds=bounds)
+
+
+    def fix_lines(self, lines, fix, interpolate=10, bounds=None):
+
+        # returns lines (already scaled to fit the bounds) clipped or rescaled so that they can be plotted
+
+        import validate
+
+        fixes = {"clip": validate.clip, "rescale": validate.rescale}
+
+        if fix not in fixes:
+            raise ValueError(f"fix must be one of {', '.join(fixes)}, not {fix!r}")
+
+        return fixes[fix](self, lines, interpolate=interpolate, bounds=bounds)
 
-        self.xy(x=x, y=y, wait=wait, interpolate=interpolate, draw=True)
 
     # ----------------- line-processing methods -----------------
 
-    def rotate_and_scale_lines(self, lines=[], rotate=False, flip=False, bounds=None):
+    def prepare_lines(self, lines=[], bounds=None, optimise=0, merge=0):
+
+        # Gets lines (which may be a Drawing) ready for plotting, and returns them as a Drawing:
+        #
+        # optimise: the number of seconds of CPU time to spend on improving the order of the lines, to
+        #           reduce pen-up travel (0 to keep them in the order given)
+        # merge:    a distance in cm; lines whose ends are closer than this are joined, so that they
+        #           can be drawn without lifting the pen (0 not to merge them)
+
+        from drawing import Drawing
+        from optimise import optimise_lines, merge_lines, pen_lifts
+
+        drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+
+        if optimise:
+            drawing = optimise_lines(drawing, time_limit=optimise)
+
+        drawing = self.rotate_and_scale_lines(lines=drawing, bounds=bounds, flip=True)
+
+        if merge:
+            # merging builds up the lines point by point, so it works on lists
+            lines = drawing.to_lines()
+            merged_lines = merge_lines(lines, tolerance=merge)
+            print(
+                f"Merged {len(lines)} lines into {len(merged_lines)}, "
+                f"saving {pen_lifts(lines) - pen_lifts(merged_lines)} pen lifts"
+            )
+            drawing = Drawing.from_lines(merged_lines)
+
+        return drawing
+
+
+    def rotate_and_scale_lines(self, lines=[], rotate=False, flip=False, bounds=None, extent=None):
+
+        # Returns a Drawing of the lines (which may themselves be a Drawing), rotated if that's needed to
+        # match the orientation of the bounds, and scaled to fit them. The lines passed in are left
+        # unchanged, so they can be plotted again.
+        #
+        # extent, if given, is the rectangle (x min, y min, x max, y max) to fit within the bounds;
+        # otherwise the lines are fitted to the bounds as closely as possible
+
+        from drawing import Drawing
+
+        drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+
+        if extent:
+            corners = Drawing.from_lines([[[extent[0], extent[1]], [extent[2], extent[3]]]])
+        else:
+            corners = drawing
 
         rotate, x_mid_point, y_mid_point, box_x_mid_point, box_y_mid_point, divider = self.analyse_lines(
-            lines=lines, rotate=rotate, bounds=bounds
+            lines=corners, rotate=rotate, bounds=bounds
         )
 
-        for line in lines:
-
-            for point in line:
-                if rotate:
-                    point[0], point[1] = point[1], point[0]
+        points = numpy.asarray(drawing.points, dtype=float)
 
-                x = point[0]
-                x = x - x_mid_point         # shift x values so that they have zero as their mid-point
-                x = x / divider             # scale x values to fit in our box width
-                x = x + box_x_mid_point     # shift x values so that they have the box x midpoint as their endpoint
+        if rotate:
+            points = points[:, ::-1]
 
-                if flip ^ rotate:
-                    x = -x
+        x = points[:, 0]
+        x = x - x_mid_point         # shift x values so that they have zero as their mid-point
+        x = x / divider             # scale x values to fit in our box width
+        x = x + box_x_mid_point     # shift x values so that they have the box x midpoint as their endpoint
 
-                y = point[1]
-                y = y - y_mid_point
-                y = y / divider
-                y = y + box_y_mid_point
+        if flip ^ rotate:
+            x = -x
 
-                point[0], point[1] = x, y
+        y = points[:, 1]
+        y = y - y_mid_point
+        y = y / divider
+        y = y + box_y_mid_point
 
-        return lines
+        return Drawing(numpy.column_stack((x, y)), drawing.offsets)
 
 
     def analyse_lines(self, lines=[], rotate=False, bounds=None):
@@ -267,24 +620,14 @@ class BrachioGraph:
         #     ],                                                                                # |
         # ]                                                                                     # |
 
-        # First, we create a pair of empty sets for all the x and y values in all of the lines of the plot data.
-
-        x_values_in_lines = set()
-        y_values_in_lines = set()
-
-        # Loop over each line and all the points in each line, to get sets of all the x and y values:
+        from drawing import Drawing
 
-        for line in lines:
+        # The lines can also be a Drawing, which holds all the points in a single array. Identify the minimum and
+        # maximum x and y values across all of them.
 
-            x_values_in_line, y_values_in_line = zip(*line)
+        drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
 
-            x_values_in_lines.update(x_values_in_line)
-            y_values_in_lines.update(y_values_in_line)
-
-        # Identify the minimum and maximum values.
-
-        min_x, max_x = min(x_values_in_lines), max(x_values_in_lines)
-        min_y, max_y = min(y_values_in_lines), max(y_values_in_lines)
+        min_x, min_y, max_x, max_y = drawing.bounds()
 
         # Identify the range they span.
 
@@ -325,14 +668,19 @@ class BrachioGraph:
         if not bounds:
             return "Plotting a test pattern is only possible when BrachioGraph.bounds is set."
 
-        for r in tqdm.tqdm(tqdm.trange(repeat, desc='Iteration'), leave=False):
+        rows = range(bounds[1], bounds[3], 2)
+
+        with self.start_progress(repeat * len(rows) * 2, "Test pattern", unit="lines") as progress:
 
-            for y in range(bounds[1], bounds[3], 2):
+            for r in range(repeat):
 
-                self.xy(bounds[0],   y,     wait, interpolate)
-                self.draw(bounds[2], y,     wait, interpolate)
-                self.xy(bounds[2],   y + 1, wait, interpolate)
-                self.draw(bounds[0], y + 1, wait, interpolate)
+                for y in rows:
+
+                    self.xy(bounds[0],   y,     wait, interpolate)
+                    self.draw(bounds[2], y,     wait, interpolate)
+                    self.xy(bounds[2],   y + 1, wait, interpolate)
+                    self.draw(bounds[0], y + 1, wait, interpolate)
+                    progress.step(2)
 
         self.park()
 
@@ -405,29 +753,34 @@ class BrachioGraph:
 
         self.xy(bounds[0], bounds[1], wait, interpolate)
 
-        for r in tqdm.tqdm(tqdm.trange(repeat), desc='Iteration', leave=False):
+        with self.start_progress(repeat * 4, "Box", unit="sides") as progress:
 
-            if not reverse:
+            for r in range(repeat):
 
-                self.draw(bounds[2], bounds[1], wait, interpolate)
-                self.draw(bounds[2], bounds[3], wait, interpolate)
-                self.draw(bounds[0], bounds[3], wait, interpolate)
-                self.draw(bounds[0], bounds[1], wait, interpolate)
+                if not reverse:
 
-            else:
+                    self.draw(bounds[2], bounds[1], wait, interpolate)
+                    self.draw(bounds[2], bounds[3], wait, interpolate)
+                    self.draw(bounds[0], bounds[3], wait, interpolate)
+                    self.draw(bounds[0], bounds[1], wait, interpolate)
 
-                self.draw(bounds[0], bounds[3], wait, interpolate)
-                self.draw(bounds[2], bounds[3], wait, interpolate)
-                self.draw(bounds[2], bounds[1], wait, interpolate)
-                self.draw(bounds[0], bounds[1], wait, interpolate)
+                else:
+
+                    self.draw(bounds[0], bounds[3], wait, interpolate)
+                    self.draw(bounds[2], bounds[3], wait, interpolate)
+                    self.draw(bounds[2], bounds[1], wait, interpolate)
+                    self.draw(bounds[0], bounds[1], wait, interpolate)
+
+                progress.step(4)
 
         self.park()
 
 
     # ----------------- pen-moving methods -----------------
 
-    def xy(self, x=0, y=0, wait=0, interpolate=10, draw=False):
-        # Moves the pen to the xy position; optionally draws
+    def xy(self, x=0, y=0, wait=0, interpolate=10, draw=False, speeds=(0, 0)):
+        # Moves the pen to the xy position; optionally draws. speeds are the speeds at which to start
+        # and finish the move, if the BrachioGraph has an acceleration.
 
         wait = wait or self.wait
 
@@ -451,33 +804,14 @@ class BrachioGraph:
         # we assume the pantograph knows its x/y positions - if not, there could be
         # a sudden movement later
 
-        # calculate how many steps we need for this move, and the x/y length of each
-        (x_length, y_length) = (x - self.current_x, y - self.current_y)
-
-        length = math.sqrt(x_length ** 2 + y_length **2)
-
-        no_of_steps = int(length * interpolate) or 1
-
-        if no_of_steps < 100:
-            disable_tqdm = True
-        else:
-            disable_tqdm = False
-
-        (length_of_step_x, length_of_step_y) = (x_length/no_of_steps, y_length/no_of_steps)
-
-        for step in tqdm.tqdm(range(no_of_steps), desc='Interpolation', leave=False, disable=disable_tqdm):
+        # work out the positions, angles and pulse-widths for every step of the move in one go
+        x_steps, y_steps, dwells = self.steps(x, y, wait, interpolate, speeds=speeds)
+        angles_1, angles_2, pws_1, pws_2 = self.xy_to_pulse_widths_array(x_steps, y_steps)
 
-            self.current_x = self.current_x + length_of_step_x
-            self.current_y = self.current_y + length_of_step_y
+        # the driver plays out the whole move
+        self.play_pulse_widths(pws_1, pws_2, angles_1, angles_2, dwells)
 
-            angle_1, angle_2 = self.xy_to_angles(self.current_x, self.current_y)
-
-            self.set_angles(angle_1, angle_2)
-
-            if step + 1 < no_of_steps:
-                sleep(length * wait/no_of_steps)
-
-        sleep(length * wait/10)
+        self.current_x, self.current_y = float(x_steps[-1]), float(y_steps[-1])
 
 
     def set_angles(self, angle_1=0, angle_2=0):
@@ -485,6 +819,13 @@ class BrachioGraph:
 
         pw_1, pw_2 = self.angles_to_pulse_widths(angle_1, angle_2)
 
+        self.apply_pulse_widths(pw_1, pw_2, angle_1, angle_2)
+
+
+    def apply_pulse_widths(self, pw_1, pw_2, angle_1, angle_2):
+        # applies hysteresis correction to a pair of pulse-widths already calculated for the
+        # angles, moves the servo motors, and records the movement
+
         if pw_1 > self.previous_pw_1:
             self.active_hysteresis_correction_1 = self.hysteresis_correction_1
         elif pw_1 < self.previous_pw_1:
@@ -509,6 +850,114 @@ class BrachioGraph:
         self.pulse_widths_used_2.add(int(pw_2))
 
 
+    def steps(self, x, y, wait, interpolate, start=None, speeds=(0, 0)):
+
+        # Returns arrays of the x and y positions of each step of a move to x/y, from start (by
+        # default, the current position), and of how long to wait after each step. If the
+        # BrachioGraph has a tolerance, steps are only placed where they are needed to keep the pen
+        # within it (see adaptive_xy()); otherwise there are interpolate steps per cm.
+        #
+        # If it has an acceleration, the waits follow a motion profile (see motion.py), entering and
+        # leaving the move at speeds (in cm/s); otherwise each step takes wait seconds per cm, and the
+        # arms are given time to settle at the end.
+
+        start_x, start_y = start or (self.current_x, self.current_y)
+
+        length = math.sqrt((x - start_x) ** 2 + (y - start_y) ** 2)
+
+        if self.tolerance:
+            x_steps, y_steps = self.adaptive_xy(x, y, self.tolerance / 10, start=(start_x, start_y))
+        else:
+            no_of_steps = int(length * interpolate) or 1
+            x_steps, y_steps = self.interpolate_xy(x, y, no_of_steps, start=(start_x, start_y))
+
+        if self.acceleration and wait:
+
+            from motion import profile_times
+
+            times = profile_times(
+                numpy.hypot(x_steps - start_x, y_steps - start_y), length, *speeds, 1 / wait, self.acceleration
+            )
+
+            return x_steps, y_steps, numpy.diff(times, prepend=0)
+
+        if self.tolerance:
+            # wait in proportion to the distance covered by each step
+            dwells = numpy.hypot(numpy.diff(x_steps, prepend=start_x), numpy.diff(y_steps, prepend=start_y)) * wait
+        else:
+            dwells = numpy.full(no_of_steps, length * wait/no_of_steps)
+
+        # allow the arms to settle at the end of the move
+        dwells[-1] = length * wait/10
+
+        return x_steps, y_steps, dwells
+
+
+    def line_speeds(self, line, wait):
+
+        # the speeds (in cm/s) at which to pass each point of a line, when there's an acceleration
+
+        from motion import junction_speeds
+
+        return junction_speeds(line, 1 / wait, self.acceleration, self.junction_deviation)
+
+
+    def interpolate_xy(self, x, y, no_of_steps, start=None):
+        # Returns arrays of the x and y positions of each step of a move to x/y, from start (by
+        # default, the current position). The steps are accumulated one at a time (as cumsum
+        # does), so that the positions are exactly those that adding the step length repeatedly
+        # would produce.
+
+        start_x, start_y = start or (self.current_x, self.current_y)
+
+        x_steps = numpy.full(no_of_steps + 1, (x - start_x) / no_of_steps)
+        y_steps = numpy.full(no_of_steps + 1, (y - start_y) / no_of_steps)
+        x_steps[0], y_steps[0] = start_x, start_y
+
+        return numpy.cumsum(x_steps)[1:], numpy.cumsum(y_steps)[1:]
+
+
+    def adaptive_xy(self, x, y, tolerance, start=None):
+
+        # Returns arrays of the x and y positions of steps for a move to x/y, as interpolate_xy() does,
+        # but only as many as are needed. Between two steps the servos move from one pair of angles
+        # to the next, so the pen follows a straight line in angle space - which is a curve in x/y,
+        # most of all near the limits of the arms' reach. Starting with a single step, each step is
+        # halved for as long as the pen would stray more than tolerance (in cm) from the line of the
+        # move half-way through it.
+
+        start_x, start_y = start or (self.current_x, self.current_y)
+        x_length, y_length = x - start_x, y - start_y
+        length = math.sqrt(x_length ** 2 + y_length ** 2)
+
+        if not length:
+            return numpy.array([float(x)]), numpy.array([float(y)])
+
+        # the positions of the steps, as fractions of the way along the move
+        fractions = numpy.array([0.0, 1.0])
+
+        for _ in range(16):
+
+            angles_1, angles_2 = self.xy_to_angles_array(start_x + fractions * x_length, start_y + fractions * y_length)
+            mid_x, mid_y = self.angles_to_xy_array((angles_1[:-1] + angles_1[1:]) / 2, (angles_2[:-1] + angles_2[1:]) / 2)
+
+            # how far the pen would be from the line, half-way between each pair of steps
+            deviations = numpy.abs(x_length * (mid_y - start_y) - y_length * (mid_x - start_x)) / length
+
+            halve = deviations > tolerance
+
+            if not halve.any():
+                break
+
+            fractions = numpy.sort(numpy.concatenate((fractions, (fractions[:-1] + fractions[1:])[halve] / 2)))
+
+        fractions = fractions[1:]
+        x_steps, y_steps = start_x + fractions * x_length, start_y + fractions * y_length
+        x_steps[-1], y_steps[-1] = x, y
+
+        return x_steps, y_steps
+
+
     #  ----------------- angles-to-pulse-widths methods -----------------
 
     def naive_angles_to_pulse_widths_1(self, angle):
@@ -519,10 +968,11 @@ class BrachioGraph:
 
 
     def angles_to_pulse_widths(self, angle_1, angle_2):
-        # Given a pair of angles, returns the appropriate pulse widths.
+        # Given a pair of angles, returns the appropriate pulse widths. The angles can also be
+        # NumPy arrays, in which case arrays of pulse-widths are returned.
 
         # at present we assume only one method of calculating, using the angles_to_pw_1 and angles_to_pw_2
-        # functions created using numpy
+        # functions - Calibrations, or the naive methods above
 
         pulse_width_1, pulse_width_2 = self.angles_to_pw_1(angle_1), self.angles_to_pw_2(angle_2)
 
@@ -533,33 +983,43 @@ class BrachioGraph:
 
     def set_pulse_widths(self, pw_1, pw_2):
 
-        if self.virtual_mode:
+        self.driver.set_pulse_width(14, pw_1)
+        self.driver.set_pulse_width(15, pw_2)
 
-            if (500 < pw_1 < 2500) and (500 < pw_2 < 2500):
 
-                self.virtual_pw_1 = self.angles_to_pw_1(pw_1)
-                self.virtual_pw_2 = self.angles_to_pw_2(pw_2)
+    def play_pulse_widths(self, pws_1, pws_2, angles_1, angles_2, dwells):
 
-            else:
-               raise ValueError
+        # The array equivalent of calling apply_pulse_widths() for each step and sleeping for its
+        # dwell time: applies hysteresis correction to every step at once, then has the driver play
+        # the steps.
 
-        else:
+        from plot_program import hysteresis_corrections
 
-            self.rpi.set_servo_pulsewidth(14, pw_1)
-            self.rpi.set_servo_pulsewidth(15, pw_2)
+        corrections_1 = hysteresis_corrections(
+            pws_1, self.previous_pw_1, self.active_hysteresis_correction_1, self.hysteresis_correction_1
+        )
+        corrections_2 = hysteresis_corrections(
+            pws_2, self.previous_pw_2, self.active_hysteresis_correction_2, self.hysteresis_correction_2
+        )
 
+        self.driver.play((14, 15), numpy.column_stack((pws_1 + corrections_1, pws_2 + corrections_2)), dwells)
 
-    def get_pulse_widths(self):
+        self.previous_pw_1, self.previous_pw_2 = float(pws_1[-1]), float(pws_2[-1])
+        self.active_hysteresis_correction_1 = float(corrections_1[-1])
+        self.active_hysteresis_correction_2 = float(corrections_2[-1])
 
-        if self.virtual_mode:
+        self.angle_1, self.angle_2 = float(angles_1[-1]), float(angles_2[-1])
 
-            actual_pulse_width_1 = self.virtual_pw_1
-            actual_pulse_width_2 = self.virtual_pw_2
+        self.angles_used_1.update(angles_1.astype(int).tolist())
+        self.angles_used_2.update(angles_2.astype(int).tolist())
+        self.pulse_widths_used_1.update(pws_1.astype(int).tolist())
+        self.pulse_widths_used_2.update(pws_2.astype(int).tolist())
 
-        else:
 
-            actual_pulse_width_1 = self.rpi.get_servo_pulsewidth(14)
-            actual_pulse_width_2 = self.rpi.get_servo_pulsewidth(15)
+    def get_pulse_widths(self):
+
+        actual_pulse_width_1 = self.driver.get_pulse_width(14)
+        actual_pulse_width_2 = self.driver.get_pulse_width(15)
 
         return (actual_pulse_width_1, actual_pulse_width_2)
 
@@ -573,7 +1033,8 @@ class BrachioGraph:
 
         self.pen.up()
         self.xy(-self.INNER_ARM, self.OUTER_ARM)
-        sleep(1)
+        if not self.virtual_mode:
+            sleep(1)
         # self.quiet()
 
 
@@ -584,10 +1045,12 @@ class BrachioGraph:
         if self.virtual_mode:
             print("Going quiet")
 
-        else:
+        for servo in servos:
+            self.driver.set_pulse_width(servo, 0)
 
-            for servo in servos:
-                self.rpi.set_servo_pulsewidth(servo, 0)
+        # a quiet pen servo could be anywhere
+        if self.pen.pin in servos:
+            self.pen.pulse_width = None
 
 
     # ----------------- trigonometric methods -----------------
@@ -622,6 +1085,55 @@ class BrachioGraph:
         return (math.degrees(shoulder_motor_angle), math.degrees(elbow_motor_angle))
 
 
+    def xy_to_angles_array(self, x, y):
+
+        # convert arrays of x/y co-ordinates into arrays of motor angles in a single vectorised
+        # pass - the results match those of xy_to_angles() for each point, to within floating
+        # point rounding
+
+        x = numpy.asarray(x, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+
+        hypotenuse = numpy.sqrt(x**2+y**2)
+
+        if numpy.any(hypotenuse > self.INNER_ARM + self.OUTER_ARM):
+            raise Exception(
+                f"Cannot reach {hypotenuse.max()}; total arm length is {self.INNER_ARM + self.OUTER_ARM}"
+            )
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+
+            hypotenuse_angle = numpy.arcsin(x/hypotenuse)
+
+            inner_angle = numpy.arccos(
+                (hypotenuse**2+self.INNER_ARM**2-self.OUTER_ARM**2)/(2*hypotenuse*self.INNER_ARM)
+            )
+            outer_angle = numpy.arccos(
+                (self.INNER_ARM**2+self.OUTER_ARM**2-hypotenuse**2)/(2*self.INNER_ARM*self.OUTER_ARM)
+            )
+
+        shoulder_motor_angle = hypotenuse_angle - inner_angle
+        elbow_motor_angle = math.pi - outer_angle
+
+        # xy_to_angles() raises a ValueError for points it cannot calculate (for example, too close
+        # to the shoulder motor); do the same here rather than returning NaNs
+        if numpy.isnan(shoulder_motor_angle).any() or numpy.isnan(elbow_motor_angle).any():
+            raise ValueError("math domain error")
+
+        return (numpy.degrees(shoulder_motor_angle), numpy.degrees(elbow_motor_angle))
+
+
+    def xy_to_pulse_widths_array(self, x, y):
+
+        # convert arrays of x/y co-ordinates into arrays of angles and pulse-widths for both
+        # motors (before any hysteresis correction)
+
+        angles_1, angles_2 = self.xy_to_angles_array(x, y)
+        pws_1, pws_2 = self.angles_to_pulse_widths(angles_1, angles_2)
+
+        return (angles_1, angles_2, pws_1, pws_2)
+
+
     def angles_to_xy(self, shoulder_motor_angle, elbow_motor_angle):
 
         # convert motor angles into x/y co-ordinates
@@ -645,6 +1157,27 @@ class BrachioGraph:
         return(x, y)
 
 
+    def angles_to_xy_array(self, shoulder_motor_angles, elbow_motor_angles):
+
+        # convert arrays of motor angles into arrays of x/y co-ordinates, as angles_to_xy() does
+
+        elbow_motor_angles = numpy.radians(elbow_motor_angles)
+        shoulder_motor_angles = numpy.radians(shoulder_motor_angles)
+
+        hypotenuse = numpy.sqrt(
+            self.INNER_ARM ** 2 + self.OUTER_ARM ** 2 - 2 * self.INNER_ARM * self.OUTER_ARM * numpy.cos(
+                math.pi - elbow_motor_angles
+            )
+        )
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            base_angle = numpy.arccos(
+                (hypotenuse ** 2 + self.INNER_ARM ** 2 - self.OUTER_ARM ** 2) / (2 * hypotenuse * self.INNER_ARM)
+            )
+        inner_angle = base_angle + shoulder_motor_angles
+
+        return numpy.sin(inner_angle) * hypotenuse, numpy.cos(inner_angle) * hypotenuse
+
+
     # ----------------- calibration -----------------
 
     def calibrate(self, servo=1):
@@ -668,7 +1201,7 @@ class BrachioGraph:
         print(f"Calibrating servo {servo}, for the {texts['arm-name'][servo]} arm.")
         print(f"See https://brachiograph.art/how-to/calibrate.html")
         print()
-        self.rpi.set_servo_pulsewidth(pin, pw)
+        self.driver.set_pulse_width(pin, pw)
         print(f"The servo is now at {pw}µS, in the centre of its range of movement.")
         print("Attach the protractor to the base, with its centre at the axis of the servo.")
 
@@ -703,7 +1236,7 @@ class BrachioGraph:
 
             print(pw)
 
-            self.rpi.set_servo_pulsewidth(pin, pw)
+            self.driver.set_pulse_width(pin, pw)
 
         print(f"------------------------")
         print(f"Recorded angles servo {servo}")
@@ -715,17 +1248,9 @@ class BrachioGraph:
         for [angle, pw] in servo_angle_pws:
             print(f" {angle:>6.1f}  |  {pw:>4.0f}")
 
-        servo_array = numpy.array(servo_angle_pws)
+        pw = int(Calibration.fit(servo_angle_pws)(0))
 
-        pw = int(numpy.poly1d(
-            numpy.polyfit(
-                servo_array[:,0],
-                servo_array[:,1],
-                3
-            )
-        )(0))
-
-        self.rpi.set_servo_pulsewidth(pin, pw)
+        self.driver.set_pulse_width(pin, pw)
         print()
         print(f"The servo is now at {int(pw)}µS, which should correspond to {texts['nominal-centre'][servo]}˚.")
         print("If necessary, remount the arm at the centre of its optimal sweep for your drawing area.")
@@ -869,6 +1394,13 @@ class BrachioGraph:
             print("No data recorded yet. Try calling the BrachioGraph.box() method first.")
 
 
+    def start_progress(self, total, description, unit="segments"):
+
+        # a Progress for a plot of total units, reporting to this BrachioGraph's progress sinks
+
+        return Progress(total, self.progress_sinks, description=description, unit=unit)
+
+
     def reset_report(self):
 
         self.angle_1 = self.angle_2 = None
@@ -899,7 +1431,9 @@ class BrachioGraph:
 
 class Pen:
 
-    def __init__(self, bg, pw_up=1700, pw_down=1300, pin=18, transition_time=0.25, virtual_mode=False):
+    def __init__(
+        self, bg, pw_up=1700, pw_down=1300, pin=18, transition_time=0.25, virtual_mode=False, wiggle=True
+    ):
 
         self.bg = bg
         self.pin = pin
@@ -907,51 +1441,63 @@ class Pen:
         self.pw_down = pw_down
         self.transition_time = transition_time
         self.virtual_mode = virtual_mode
-        if self.virtual_mode:
 
+        # not known until the pen is first moved
+        self.pulse_width = None
+
+        # the pen shares the BrachioGraph's driver
+        self.driver = bg.driver
+
+        if self.virtual_mode:
             print("Initialising virtual Pen")
 
-        else:
+        self.driver.set_frequency(self.pin, 50)
 
-            self.rpi = pigpio.pi()
-            self.rpi.set_PWM_frequency(self.pin, 50)
+        # make sure the pen is up - moving it down and up again first, unless wiggle is False
+        if wiggle:
+            self.up()
+            self.pause(0.3)
+            self.down()
+            self.pause(0.3)
 
         self.up()
-        sleep(0.3)
-        self.down()
-        sleep(0.3)
-        self.up()
-        sleep(0.3)
+        self.pause(0.3)
+
+
+    def pause(self, seconds):
+
+        # in virtual mode there's no servo to wait for
+
+        if not self.virtual_mode:
+            sleep(seconds)
 
 
     def down(self):
 
-        if self.virtual_mode:
-            self.virtual_pw = self.pw_down
+        # if the pen is already down, there's nothing to send and nothing to wait for
+        if self.pulse_width == self.pw_down:
+            return
 
-        else:
-            self.rpi.set_servo_pulsewidth(self.pin, self.pw_down)
-            sleep(self.transition_time)
+        self.pw(self.pw_down)
+        self.pause(self.transition_time)
 
 
     def up(self):
 
-        if self.virtual_mode:
-            self.virtual_pw = self.pw_up
+        if self.pulse_width == self.pw_up:
+            return
 
-        else:
-            self.rpi.set_servo_pulsewidth(self.pin, self.pw_up)
-            sleep(self.transition_time)
+        self.pw(self.pw_up)
+        self.pause(self.transition_time)
 
 
     # for convenience, a quick way to set pen motor pulse-widths
     def pw(self, pulse_width):
 
-        if self.virtual_mode:
-            self.virtual_pw = pulse_width
+        self.driver.set_pulse_width(self.pin, pulse_width)
 
-        else:
-            self.rpi.set_servo_pulsewidth(self.pin, pulse_width)
+        # We record the pulse-width, so that we know where the pen is.
+        self.pulse_width = pulse_width
 
 
     def calibrate(self):
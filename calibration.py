@@ -0,0 +1,143 @@
+# Servo calibrations: functions from arm angle to pulse-width, fitted to measured pairs of angles and
+# pulse-widths.
+#
+# A Calibration is a polynomial, fitted with numpy.polyfit(), and evaluated using Horner's rule -
+# which gives exactly the same results as numpy.poly1d, with a fraction of the overhead for single
+# angles. It also knows the range of angles it was fitted to, and keeps a table of pulse-widths over
+# that range, for working out angles from pulse-widths.
+#
+# Fitting is done once for any set of measurements: calibrations are kept in memory, and can be cached
+# in JSON files, named after a hash of the measurements, so that new processes can load them instead.
+
+import bisect
+import hashlib
+import json
+import math
+import os
+
+
+class Calibration:
+
+    def __init__(self, coefficients, angle_range, inverse_angles=(), inverse_pulse_widths=()):
+
+        # coefficients are highest power first, as returned by numpy.polyfit(); the inverse table is
+        # a list of angles and the pulse-widths for them, in order of pulse-width
+
+        self.coefficients = [float(coefficient) for coefficient in coefficients]
+        self.angle_range = tuple(float(angle) for angle in angle_range)
+        self.inverse_angles = [float(angle) for angle in inverse_angles]
+        self.inverse_pulse_widths = [float(pw) for pw in inverse_pulse_widths]
+
+        self.leading_coefficient, self.other_coefficients = self.coefficients[0], self.coefficients[1:]
+
+    @classmethod
+    def fit(cls, angle_pws, degree=3):
+
+        import numpy
+
+        angle_pws = numpy.array(angle_pws, dtype=float)
+        calibration = cls(
+            numpy.polyfit(angle_pws[:, 0], angle_pws[:, 1], degree),
+            (angle_pws[:, 0].min(), angle_pws[:, 0].max())
+        )
+
+        # tabulate pulse-widths every degree or so across the range; the table can only be used to
+        # find angles if the pulse-widths always increase or always decrease
+        min_angle, max_angle = calibration.angle_range
+        angles = numpy.linspace(min_angle, max_angle, max(math.ceil(max_angle - min_angle), 1) + 1)
+        pws = calibration(angles)
+        steps = numpy.diff(pws)
+
+        if (steps > 0).all() or (steps < 0).all():
+            order = numpy.argsort(pws)
+            calibration.inverse_angles = angles[order].tolist()
+            calibration.inverse_pulse_widths = pws[order].tolist()
+
+        return calibration
+
+    @classmethod
+    def cached(cls, angle_pws, cache_folder=None, degree=3):
+
+        # Returns the Calibration for the measurements - from memory, or from cache_folder if it has
+        # been fitted before; otherwise, fits it, and saves it in cache_folder.
+
+        key = calibration_key(angle_pws, degree)
+
+        if key in fitted:
+            return fitted[key]
+
+        filename = cache_folder and os.path.join(cache_folder, f"calibration-{key}.json")
+
+        if filename and os.path.exists(filename):
+            calibration = cls.load(filename)
+
+        else:
+            calibration = cls.fit(angle_pws, degree)
+
+            if filename:
+                os.makedirs(cache_folder, exist_ok=True)
+                calibration.save(filename)
+
+        fitted[key] = calibration
+
+        return calibration
+
+    def __call__(self, angle):
+
+        # the pulse-width for an angle, or an array of pulse-widths for a NumPy array of angles
+
+        pulse_width = self.leading_coefficient
+
+        for coefficient in self.other_coefficients:
+            pulse_width = pulse_width * angle + coefficient
+
+        return pulse_width
+
+    def angle(self, pulse_width):
+
+        # the angle for a pulse-width, interpolated from the inverse table
+
+        pws, angles = self.inverse_pulse_widths, self.inverse_angles
+
+        if not pws:
+            raise ValueError("This calibration has no inverse: its pulse-widths don't change steadily with angle")
+
+        if not pws[0] <= pulse_width <= pws[-1]:
+            raise ValueError(f"A pulse-width of {pulse_width}µS is outside the calibrated range ({pws[0]:.0f}-{pws[-1]:.0f}µS)")
+
+        i = min(max(bisect.bisect_right(pws, pulse_width), 1), len(pws) - 1)
+
+        return angles[i - 1] + (angles[i] - angles[i - 1]) * (pulse_width - pws[i - 1]) / (pws[i] - pws[i - 1])
+
+    def __repr__(self):
+        return f"<Calibration: {self.coefficients} over {self.angle_range[0]}˚ to {self.angle_range[1]}˚>"
+
+    def save(self, filename):
+        with open(filename, "w") as calibration_file:
+            json.dump(
+                {
+                    "coefficients": self.coefficients,
+                    "angle_range": self.angle_range,
+                    "inverse_angles": self.inverse_angles,
+                    "inverse_pulse_widths": self.inverse_pulse_widths,
+                },
+                calibration_file,
+            )
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as calibration_file:
+            return cls(**json.load(calibration_file))
+
+
+# calibrations already fitted in this process, by calibration_key()
+fitted = {}
+
+
+def calibration_key(angle_pws, degree=3):
+
+    # a hash of the measurements and the degree of the polynomial fitted to them
+
+    data = json.dumps([degree, [[float(angle), float(pw)] for angle, pw in angle_pws]])
+
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
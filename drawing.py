@@ -0,0 +1,166 @@
+# A Drawing holds a set of lines in NumPy arrays, rather than as lists of lists of [x, y] points.
+#
+# All the points of all the lines are kept in a single array of shape (number of points, 2), and the
+# lines are marked out in it by an array of offsets: line i is made of points offsets[i] to
+# offsets[i + 1]. This takes a fraction of the memory of nested lists, and lets whole drawings be
+# analysed and transformed at once.
+#
+# Drawings convert to and from the usual format with Drawing.from_lines() and to_lines(), and can be
+# saved and loaded as line files (see linefile.py) - or loaded from JSON files.
+
+from itertools import chain
+
+import numpy
+
+from linefile import save_arrays, read_lines
+
+
+class Drawing:
+
+    def __init__(self, points, offsets):
+
+        # the points of a Drawing loaded from a line file are memory-mapped, so avoid copying them
+        points = numpy.asarray(points)
+        if not numpy.issubdtype(points.dtype, numpy.floating):
+            points = points.astype(float)
+
+        self.points = points.reshape(-1, 2)
+        self.offsets = numpy.asarray(offsets, dtype=numpy.int64)
+
+        if len(self.offsets) == 0 or self.offsets[0] != 0 or self.offsets[-1] != len(self.points):
+            raise ValueError("The offsets must run from 0 to the number of points")
+
+    @classmethod
+    def from_lines(cls, lines):
+
+        lengths = [len(line) for line in lines]
+
+        offsets = numpy.zeros(len(lines) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=offsets[1:])
+
+        # it's quickest to read all the coordinates in one go, if the points are all [x, y] pairs
+        coordinates = numpy.fromiter(chain.from_iterable(chain.from_iterable(lines)), dtype=float)
+
+        if len(coordinates) == 2 * offsets[-1]:
+            points = coordinates.reshape(-1, 2)
+        else:
+            points = numpy.array([point[:2] for line in lines for point in line], dtype=float).reshape(-1, 2)
+
+        return cls(points, offsets)
+
+    def to_lines(self):
+
+        points, offsets = self.points.tolist(), self.offsets.tolist()
+
+        return [points[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    @classmethod
+    def load(cls, filename):
+        return read_lines(filename)
+
+    def save(self, filename):
+        save_arrays(self.points, self.offsets, filename)
+
+    def __repr__(self):
+        return f"<Drawing: {len(self)} lines, {len(self.points)} points>"
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+
+        # each line is an array of shape (number of points in the line, 2)
+
+        offsets = self.offsets.tolist()
+
+        for start, end in zip(offsets, offsets[1:]):
+            yield self.points[start:end]
+
+    def __getitem__(self, index):
+
+        # A single line, as an array of its points; or, given a slice, a Drawing of those lines. For a
+        # slice of consecutive lines the Drawing's points are a view of this one's.
+
+        if isinstance(index, slice):
+
+            start, stop, step = index.indices(len(self))
+
+            if step != 1:
+                return self.reorder(range(start, stop, step))
+
+            stop = max(start, stop)
+            first, last = self.offsets[start], self.offsets[stop]
+
+            return Drawing(self.points[first:last], self.offsets[start:stop + 1] - first)
+
+        if index < 0:
+            index = index + len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("Drawing index out of range")
+
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def lengths(self):
+        # the number of points in each line
+        return numpy.diff(self.offsets)
+
+    @property
+    def starts(self):
+        # the first point of each line
+        return self.points[self.offsets[:-1]]
+
+    @property
+    def ends(self):
+        # the last point of each line
+        return self.points[self.offsets[1:] - 1]
+
+    def segments(self):
+
+        # Returns arrays of the start and end points of every segment - each pair of consecutive points
+        # within a line - and of the index of the line each belongs to.
+
+        is_segment = numpy.ones(max(len(self.points) - 1, 0), dtype=bool)
+        is_segment[self.offsets[1:-1] - 1] = False
+
+        lines = numpy.repeat(numpy.arange(len(self)), numpy.maximum(self.lengths - 1, 0))
+
+        return self.points[:-1][is_segment], self.points[1:][is_segment], lines
+
+    def bounds(self):
+
+        # (min x, min y, max x, max y) of all the points
+
+        if not len(self.points):
+            raise ValueError("An empty Drawing has no bounds")
+
+        (min_x, min_y), (max_x, max_y) = self.points.min(axis=0), self.points.max(axis=0)
+
+        return float(min_x), float(min_y), float(max_x), float(max_y)
+
+    def reorder(self, order, reverse=None):
+
+        # Returns a new Drawing of the lines in the given order (a sequence of line indices), each
+        # reversed where the corresponding item of reverse (if given) is True.
+
+        order = numpy.asarray(order, dtype=numpy.int64).reshape(-1)
+        lengths = self.lengths[order]
+
+        offsets = numpy.zeros(len(order) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=offsets[1:])
+
+        # for each new point, its position within its line, counting from the end for reversed lines
+        positions = numpy.arange(offsets[-1]) - numpy.repeat(offsets[:-1], lengths)
+
+        if reverse is not None:
+            reverse = numpy.repeat(numpy.asarray(reverse, dtype=bool).reshape(-1), lengths)
+            positions = numpy.where(reverse, numpy.repeat(lengths, lengths) - 1 - positions, positions)
+
+        return Drawing(self.points[numpy.repeat(self.offsets[order], lengths) + positions], offsets)
+
+    def reversed(self):
+
+        # the whole drawing backwards: the lines in the opposite order, each of them reversed
+
+        return Drawing(self.points[::-1], self.offsets[-1] - self.offsets[::-1])
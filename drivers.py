@@ -0,0 +1,144 @@
+# Servo drivers: the only parts of the library that talk to servos.
+#
+# A BrachioGraph or PantoGraph sends everything through a driver, so that the same plotting code can
+# run on a Raspberry Pi using pigpio, in virtual mode with no hardware, or against a recording driver
+# that keeps a log of exactly what the servos were sent. A plotter's Pen uses the plotter's driver, and
+# so shares its connection to the servos.
+
+from collections import deque
+from time import sleep, monotonic
+
+
+class Driver:
+
+    # The interface that all drivers provide. Subclasses need at least to implement
+    # set_pulse_width() and get_pulse_width().
+
+    def set_frequency(self, pin, frequency):
+        pass
+
+    def set_pulse_width(self, pin, pulse_width):
+        raise NotImplementedError
+
+    def get_pulse_width(self, pin):
+        raise NotImplementedError
+
+    def play(self, pins, pulse_widths, dwells):
+
+        # Plays a sequence of steps: pulse_widths has a row for each step, with a pulse-width for each
+        # of the pins, and dwells has the time in seconds to hold each step. Drivers that can hand a
+        # whole sequence over to the hardware in one go override this.
+
+        previous = [None] * len(pins)
+        next_step = monotonic()
+
+        for step_pulse_widths, dwell in zip(pulse_widths.tolist(), dwells.tolist()):
+
+            # only send the pulse-widths that have changed
+            for i, (pin, pulse_width) in enumerate(zip(pins, step_pulse_widths)):
+                if pulse_width != previous[i]:
+                    self.set_pulse_width(pin, pulse_width)
+            previous = step_pulse_widths
+
+            # schedule each step against the clock, so that delays in one step don't accumulate
+            next_step = next_step + dwell
+            delay = next_step - monotonic()
+            if delay > 0:
+                sleep(delay)
+
+
+class PigpioDriver(Driver):
+
+    # Drives the servos through the pigpio daemon on a Raspberry Pi.
+
+    def __init__(self, rpi=None, waveforms=False):
+
+        # instantiate this Raspberry Pi as a pigpio.pi() instance, unless a connection is supplied
+        if not rpi:
+            import pigpio
+            rpi = pigpio.pi()
+
+        self.rpi = rpi
+
+        # optionally, sequences of steps can be submitted to the daemon as waveforms, so that the
+        # daemon rather than Python's sleep() takes care of the timing
+        self.waveforms = waveforms
+        self.servo_waves = {}
+
+    def set_frequency(self, pin, frequency):
+        self.rpi.set_PWM_frequency(pin, frequency)
+
+    def set_pulse_width(self, pin, pulse_width):
+        self.rpi.set_servo_pulsewidth(pin, pulse_width)
+
+    def get_pulse_width(self, pin):
+        return self.rpi.get_servo_pulsewidth(pin)
+
+    def play(self, pins, pulse_widths, dwells):
+
+        if not self.waveforms:
+            return super().play(pins, pulse_widths, dwells)
+
+        pins = tuple(pins)
+
+        if pins not in self.servo_waves:
+            from servo_waves import ServoWaves
+            self.servo_waves[pins] = ServoWaves(self.rpi, pins=pins)
+
+        self.servo_waves[pins].play(pulse_widths, dwells)
+
+
+class VirtualDriver(Driver):
+
+    # Keeps track of the pulse-widths that would be sent, checking that they are safe for the servos,
+    # but has no hardware to wait for.
+
+    def __init__(self, min_pulse_width=500, max_pulse_width=2500):
+
+        self.min_pulse_width = min_pulse_width
+        self.max_pulse_width = max_pulse_width
+        self.pulse_widths = {}
+
+    def set_pulse_width(self, pin, pulse_width):
+
+        # a pulse-width of 0 switches the servo off
+        if pulse_width and not (self.min_pulse_width < pulse_width < self.max_pulse_width):
+            raise ValueError(
+                f"Pulse-width {pulse_width}µS for pin {pin} is outside the range "
+                f"{self.min_pulse_width}-{self.max_pulse_width}µS"
+            )
+
+        self.pulse_widths[pin] = pulse_width
+
+    def get_pulse_width(self, pin):
+        return self.pulse_widths.get(pin, 0)
+
+    def play(self, pins, pulse_widths, dwells):
+
+        for step_pulse_widths in pulse_widths.tolist():
+            for pin, pulse_width in zip(pins, step_pulse_widths):
+                self.set_pulse_width(pin, pulse_width)
+
+
+class RecordingDriver(VirtualDriver):
+
+    # A virtual driver that also logs every pulse-width it is sent, with a timestamp, to a ring buffer
+    # holding the most recent `size` entries - for checking exactly what the servos would receive.
+
+    def __init__(self, size=100000, clock=monotonic, **kwargs):
+
+        super().__init__(**kwargs)
+        self.clock = clock
+        self.log = deque(maxlen=size)
+
+    def set_pulse_width(self, pin, pulse_width):
+
+        super().set_pulse_width(pin, pulse_width)
+        self.log.append((self.clock(), pin, pulse_width))
+
+    def sent(self, pin):
+        # the pulse-widths sent to a pin, oldest first
+        return [pulse_width for timestamp, logged_pin, pulse_width in self.log if logged_pin == pin]
+
+    def clear(self):
+        self.log.clear()
@@ -4,11 +4,17 @@
 from random import *
 import math
 import argparse
-import json
+import bisect
+import concurrent.futures
+import queue
+import threading
 import time
 
 from PIL import Image, ImageDraw, ImageOps
 
+import linefile
+import optimise as stroke_order
+
 # file settings
 export_path = "images/out.svg"
 svg_folder = "images/"
@@ -17,11 +23,12 @@ json_folder = "images/"
 # CV
 no_cv = False
 
+import numpy as np
+
 try:
-    import numpy as np
     import cv2
 except:
-    print("Cannot import numpy/openCV. Switching to NO_CV mode.")
+    print("Cannot import openCV. Switching to NO_CV mode.")
     no_cv = True
 
 
@@ -31,15 +38,20 @@ def image_to_json(
     image_filename, resolution=1024,
     draw_contours=False, repeat_contours=1,
     draw_hatch=False, repeat_hatch=1,
+    optimise=0,
+    workers=1,
+    binary=False,   # save a compact binary .lines file (see linefile.py) instead of JSON
     ):
 
     lines=vectorise(
         image_filename, resolution,
         draw_contours, repeat_contours,
         draw_hatch, repeat_hatch,
+        optimise,
+        workers,
         )
 
-    filename = json_folder + image_filename + ".json"
+    filename = json_folder + image_filename + (".lines" if binary else ".json")
     lines_to_file(lines, filename)
 
 
@@ -89,8 +101,69 @@ def vectorise(
     image_filename, resolution=1024,
     draw_contours=False, repeat_contours=1,
     draw_hatch=False, repeat_hatch=1,
+    optimise=0,     # seconds of CPU time to spend improving the stroke order, after sorting
+    workers=1,      # the number of processes to share the image processing between
     ):
 
+    image = open_image(image_filename)
+
+    lines = []
+
+    for strokes in stroke_groups(
+        image, resolution,
+        draw_contours, repeat_contours,
+        draw_hatch, repeat_hatch,
+        optimise,
+        workers,
+        ):
+        lines += strokes
+
+    finish(lines, image_filename)
+    return lines
+
+
+def vectorise_stream(
+    image_filename, resolution=1024,
+    draw_contours=False, repeat_contours=1,
+    draw_hatch=False, repeat_hatch=1,
+    optimise=0,
+    workers=1,
+    chunk_size=100, # the number of strokes in each chunk
+    ):
+
+    # Like vectorise(), but rather than waiting for all the lines, returns straight away with the
+    # extent of the drawing - the rectangle (0, 0, width, height) that the lines will lie within - and
+    # an iterator over the lines, in chunks of up to chunk_size strokes. The lines are worked out in a
+    # background thread, so the first chunks can be plotted (with BrachioGraph.plot_stream()) while
+    # the rest are still being generated.
+
+    image = open_image(image_filename)
+    w,h = image.size
+
+    extent = (0, 0, resolution, resolution*h/w)
+
+    def chunks():
+
+        lines = []
+
+        for strokes in stroke_groups(
+            image, resolution,
+            draw_contours, repeat_contours,
+            draw_hatch, repeat_hatch,
+            optimise,
+            workers,
+            ):
+            lines += strokes
+            for i in range(0, len(strokes), chunk_size):
+                yield strokes[i:i+chunk_size]
+
+        finish(lines, image_filename)
+
+    return extent, prefetch(chunks())
+
+
+def open_image(image_filename):
+
     image = None
     possible = [
         image_filename,
@@ -106,7 +179,6 @@ def vectorise(
             break
         except:
             pass
-    w,h = image.size
 
     # convert the image to greyscale
     image = image.convert("L")
@@ -114,27 +186,56 @@ def vectorise(
     # maximise contrast
     image=ImageOps.autocontrast(image, 10)
 
-    lines = []
+    return image
+
+
+def stroke_groups(
+    image, resolution=1024,
+    draw_contours=False, repeat_contours=1,
+    draw_hatch=False, repeat_hatch=1,
+    optimise=0,
+    workers=1,
+    ):
+
+    # Yields the sorted contours (once for each repeat) and then the sorted hatching (likewise), each
+    # as a list of lines; nothing is worked out until it's needed. With more than one worker, the
+    # image is processed in tiles, shared between that many processes.
+
+    w,h = image.size
+
+    executor = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else None
+
+    try:
+
+        if draw_contours and repeat_contours:
+            resized = image.resize((int(resolution/draw_contours), int(resolution/draw_contours*h/w)))
+            if executor:
+                contours = tiled_getcontours(resized, draw_contours, executor, tiles=workers)
+            else:
+                contours = getcontours(resized, draw_contours)
+            contours = sortlines(contours, optimise)
+            for r in range(repeat_contours):
+                yield contours
+
+        if draw_hatch and repeat_hatch:
+            resized = image.resize((int(resolution/draw_hatch), int(resolution/draw_hatch*h/w)))
+            if executor:
+                hatches = tiled_hatch(resized, draw_hatch, executor, tiles=workers)
+            else:
+                hatches = hatch(resized, draw_hatch)
+            hatches = sortlines(hatches, optimise)
+            for r in range(repeat_hatch):
+                yield hatches
 
-    if draw_contours and repeat_contours:
-        contours = sortlines(getcontours(
-            image.resize((int(resolution/draw_contours), int(resolution/draw_contours*h/w))),
-            draw_contours
-        ))
-        for r in range(repeat_contours):
-            lines += contours
-
-    if draw_hatch and repeat_hatch:
-        hatches = sortlines(
-            hatch(
-                # image,
-                image.resize((int(resolution/draw_hatch), int(resolution/draw_hatch*h/w))),
-                draw_hatch
-        ))
-        for r in range(repeat_hatch):
-            lines += hatches
+    finally:
+        if executor:
+            executor.shutdown()
 
 
+def finish(lines, image_filename):
+
+    # save an SVG of the lines, and report on them
+
     f = open(svg_folder + image_filename + ".svg", 'w')
     f.write(makesvg(lines))
     f.close()
@@ -143,12 +244,42 @@ def vectorise(
         segments = segments + len(line)
     print(len(lines), "strokes,", segments, "points.")
     print("done.")
-    return lines
+
+
+def prefetch(iterator):
+
+    # Runs an iterator in a background thread, and returns an iterator over the items it produces, in
+    # the same order. Exceptions raised in the background are raised again by the returned iterator.
+
+    items = queue.Queue()
+    finished = object()
+
+    def produce():
+        try:
+            for item in iterator:
+                items.put((item, None))
+        except Exception as error:
+            items.put((finished, error))
+        else:
+            items.put((finished, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    def consume():
+        while True:
+            item, error = items.get()
+            if error:
+                raise error
+            if item is finished:
+                return
+            yield item
+
+    return consume()
 
 
 # -------------- vectorisation options --------------
 
-def getcontours(image, draw_contours=2):
+def getcontours(image, draw_contours=2, join_distance=8):
     print("generating contours...")
     image = find_edges(image)
     IM1 = image.copy()
@@ -162,12 +293,14 @@ def getcontours(image, draw_contours=2):
         contours2[i] = [(c[1],c[0]) for c in contours2[i]]
     contours = contours1+contours2
 
-    for i in range(len(contours)):
-        for j in range(len(contours)):
-            if len(contours[i]) > 0 and len(contours[j])>0:
-                if distsum(contours[j][0],contours[i][-1]) < 8:
-                    contours[i] = contours[i]+contours[j]
-                    contours[j] = []
+    contours = join_contours(contours, join_distance)
+
+    return scale_contours(contours, draw_contours)
+
+
+def scale_contours(contours, draw_contours=2):
+
+    # keep every 8th point of each contour, drop any left with a single point, and scale them up
 
     for i in range(len(contours)):
         contours[i] = [contours[i][j] for j in range(0,len(contours[i]),8)]
@@ -181,78 +314,261 @@ def getcontours(image, draw_contours=2):
     return contours
 
 
-# improved, faster and easier to understand hatching
-def hatch(image, draw_hatch=16):
+def join_contours(contours, join_distance=8):
+
+    # Joins contours end to start, wherever the start of one is less than join_distance pixels from
+    # the end of another. Each contour in turn is extended by the first (lowest-numbered) contour
+    # starting close enough to its end, then by the first one after that starting close enough to
+    # its new end, and so on. A contour that ends up close to its own start is dropped. The starts
+    # are kept in a grid of join_distance-sized cells, so that only the nearby ones need checking.
+
+    contours = list(contours)
+
+    if join_distance <= 0:
+        return [c for c in contours if c]
+
+    def cell(point):
+        return (math.floor(point[0] / join_distance), math.floor(point[1] / join_distance))
+
+    starts = {}
+    for j in range(len(contours)):
+        if contours[j]:
+            starts.setdefault(cell(contours[j][0]), []).append(j)
+
+    for i in range(len(contours)):
+
+        j = 0
+
+        while contours[i]:
+
+            # the first contour from j onwards that starts close to the end of this one
+            x, y = cell(contours[i][-1])
+            candidates = [
+                k for dx in (-1, 0, 1) for dy in (-1, 0, 1) for k in starts.get((x+dx, y+dy), ())
+                if k >= j and distsum(contours[k][0], contours[i][-1]) < join_distance
+            ]
+
+            if not candidates:
+                break
+
+            j = min(candidates)
+            starts[cell(contours[j][0])].remove(j)
+
+            contours[i] = contours[i]+contours[j]
+            contours[j] = []
+            j = j+1
+
+    return [c for c in contours if c]
+
+
+# Hatching works on a downsampled image, each pixel of which becomes a cell draw_hatch units square.
+# Cells darker than 144 get a horizontal line a quarter of the way down; darker than 64, a diagonal
+# line as well; darker than 16, a second horizontal line three quarters of the way down. Rather than
+# generating a segment for each cell and then joining them up, hatch() finds the runs of cells in each
+# band - along rows for the horizontal lines, along diagonals for the diagonal ones - and turns each
+# run directly into a single line.
+
+def hatch(image, draw_hatch=16, first_row=0):
+
+    # first_row: when the image is a band of a larger one, the row of the larger image it starts at
 
     t0 = time.time()
 
     print("hatching using hatch()...")
-    pixels = image.load()
-    w, h = image.size
-    lg1 = []
-    lg2 = []
-    for x0 in range(w):
-        # print("reading x", x0)
-        for y0 in range(h):
-            # print("    reading y", x0)
-            x = x0 * draw_hatch
-            y = y0 * draw_hatch
-
-            # don't hatch above a certain level of brightness
-            if pixels[x0, y0] > 144:
-                pass
-
-            # above 64, draw horizontal lines
-            elif pixels[x0,y0] > 64:
-                lg1.append([(x,y+draw_hatch/4),(x+draw_hatch,y+draw_hatch/4)])
-
-            # above 16, draw diagonal lines also
-            elif pixels[x0,y0] > 16:
-                lg1.append([(x,y+draw_hatch/4),(x+draw_hatch,y+draw_hatch/4)])
-                lg2.append([(x+draw_hatch,y),(x,y+draw_hatch)])
-
-            # below 16, draw diagonal lines and a second horizontal line
-            else:
-                lg1.append([(x,y+draw_hatch/4),(x+draw_hatch,y+draw_hatch/4)])  # horizontal lines
-                lg1.append([(x,y+draw_hatch/2+draw_hatch/4),(x+draw_hatch,y+draw_hatch/2+draw_hatch/4)])  # horizontal lines with additional offset
-                lg2.append([(x+draw_hatch,y),(x,y+draw_hatch)])                 # diagonal lines, left
+    pixels = np.asarray(image)
 
-    t1 = time.time()
+    # horizontal lines
+    ys_1, starts_1, ends_1 = horizontal_runs(pixels <= 144)
+    ys_2, starts_2, ends_2 = horizontal_runs(pixels <= 16)
 
-    print("wrangling points...")
+    ys = (np.concatenate((ys_1, ys_2)) + first_row) * draw_hatch
+    offsets = np.concatenate((np.zeros(len(ys_1), dtype=int), np.ones(len(ys_2), dtype=int)))
+    starts = np.concatenate((starts_1, starts_2))
+    ends = np.concatenate((ends_1, ends_2))
 
-    # Make segments into lines
-    line_groups = [lg1, lg2]
+    # sort the runs by the cell they start in (column first), and lines a quarter of the way down first
+    order = np.lexsort((offsets, ys, starts))
+    ys, offsets, starts, ends = ys[order], offsets[order], starts[order], ends[order]
 
-    for line_group in line_groups:
-        for lines in line_group:
-            for lines2 in line_group:
+    ys = np.where(offsets, ys + draw_hatch/2 + draw_hatch/4, ys + draw_hatch/4)
+    x_starts = starts * draw_hatch
+    x_ends = ends * draw_hatch + draw_hatch
 
-                # do items exist in both?
-                if lines and lines2:
-                    # if the last point of first is the same as the first point of of the second
-                    if lines[-1] == lines2[0]:
-                        # then extend the first with all the rest of the points of the second
-                        lines.extend(lines2[1:])
-                        # and empty the second list
-                        lines2.clear()
+    lg1 = [
+        [(x_start, y), (x_end, y)]
+        for x_start, x_end, y in zip(x_starts.tolist(), x_ends.tolist(), ys.tolist())
+    ]
+
+    # diagonal lines, from the top right of the first cell to the bottom left of the last
+    (head_xs, head_ys), (tail_xs, tail_ys) = diagonal_runs(pixels <= 64)
+
+    order = np.lexsort((head_ys, head_xs))
+    head_xs, head_ys, tail_xs, tail_ys = head_xs[order], head_ys[order], tail_xs[order], tail_ys[order]
 
-        # in each line group keep any non-empty lines
-        saved_lines = [[line[0], line[-1]] for line in line_group if line]
-        line_group.clear()
-        line_group.extend(saved_lines)
+    lg2 = [
+        [(x_start, y_start), (x_end, y_end)]
+        for x_start, y_start, x_end, y_end in zip(
+            (head_xs * draw_hatch + draw_hatch).tolist(),
+            ((head_ys + first_row) * draw_hatch).tolist(),
+            (tail_xs * draw_hatch).tolist(),
+            ((tail_ys + first_row) * draw_hatch + draw_hatch).tolist(),
+        )
+    ]
 
-    lines = [item for group in line_groups for item in group]
+    lines = lg1 + lg2
 
-    t2 = time.time()
+    t1 = time.time()
 
-    print("hatching   : ", t1 - t0)
-    print("wrangling:   ", t2 - t1)
-    print("total:       ", t2 - t0)
+    print("hatching:    ", t1 - t0)
 
     return lines
 
 
+def horizontal_runs(mask):
+
+    # Finds the runs of True along each row of a 2D boolean array, returning arrays of the row, first
+    # column and last column of each run.
+
+    edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+
+    ys, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[1] - 1
+
+    return ys, starts, ends
+
+
+def diagonal_runs(mask):
+
+    # Finds the runs of True along each diagonal of a 2D boolean array running from top right to
+    # bottom left, returning the (x, y) arrays of the top right and the bottom left cell of each run.
+
+    padded = np.pad(mask, 1)
+
+    # whether each cell's neighbour to the top right, and to the bottom left, is also in a run
+    above = padded[:-2, 2:]
+    below = padded[2:, :-2]
+
+    head_ys, head_xs = np.nonzero(mask & ~above)
+    tail_ys, tail_xs = np.nonzero(mask & ~below)
+
+    # a diagonal is identified by x + y; along it, runs are in order of y, and each starts before it ends
+    heads = np.lexsort((head_ys, head_xs + head_ys))
+    tails = np.lexsort((tail_ys, tail_xs + tail_ys))
+
+    return (head_xs[heads], head_ys[heads]), (tail_xs[tails], tail_ys[tails])
+
+
+# -------------- tiled vectorisation --------------
+
+# For large images, hatching and finding contours can be shared out between processes. The image is
+# cut into horizontal bands, each band is processed separately by an executor (such as a
+# concurrent.futures.ProcessPoolExecutor - or None, to process the bands one after another), and
+# the lines that cross from one band into the next are joined up again afterwards.
+
+def bands(height, tiles):
+
+    # the (first row, last row + 1) of each of up to tiles bands, of as near equal height as possible
+
+    edges = [round(height * i / tiles) for i in range(tiles + 1)]
+    return [(top, bottom) for top, bottom in zip(edges, edges[1:]) if bottom > top]
+
+
+def tiled_hatch(image, draw_hatch=16, executor=None, tiles=4):
+
+    # Gives exactly the same lines as hatch(), in the same order.
+
+    print("hatching in tiles...")
+    w,h = image.size
+    rows = bands(h, tiles)
+
+    results = (executor.map if executor else map)(
+        hatch,
+        [image.crop((0, top, w, bottom)) for top, bottom in rows],
+        [draw_hatch] * len(rows),
+        [top for top, bottom in rows],
+    )
+
+    horizontal = []
+    diagonal = []
+    ends = {}
+
+    for band_lines in results:
+
+        band_ends = {}
+
+        for line in band_lines:
+
+            if line[0][1] == line[1][1]:
+                horizontal.append(line)
+                continue
+
+            # a diagonal line that starts where one in the band above ended carries it on
+            if line[0] in ends:
+                line, start = ends.pop(line[0]), line
+                line[1] = start[1]
+            else:
+                diagonal.append(line)
+
+            band_ends[line[1]] = line
+
+        ends = band_ends
+
+    # hatch() orders lines by the column and then the row of their first cell
+    return sorted(horizontal) + sorted(diagonal)
+
+
+def tiled_getcontours(image, draw_contours=2, executor=None, tiles=4, join_distance=8, margin=8):
+
+    # Like getcontours(), but traces the contours in each band separately. Edges are found with
+    # margin rows of the image either side of each band, so that they're the same as for the whole
+    # image; contours that cross between bands are broken, but are joined up again (by
+    # join_contours(), along with the rest).
+
+    print("generating contours in tiles...")
+    w,h = image.size
+    rows = bands(h, tiles)
+    offsets = [max(top - margin, 0) for top, bottom in rows]
+
+    results = (executor.map if executor else map)(
+        trace_band,
+        [image.crop((0, offset, w, min(bottom + margin, h))) for offset, (top, bottom) in zip(offsets, rows)],
+        [top - offset for offset, (top, bottom) in zip(offsets, rows)],
+        [bottom - offset for offset, (top, bottom) in zip(offsets, rows)],
+        offsets,
+    )
+
+    contours1 = []
+    contours2 = []
+
+    for band_contours1, band_contours2 in results:
+        contours1 += band_contours1
+        contours2 += band_contours2
+
+    contours = join_contours(contours1+contours2, join_distance)
+
+    return scale_contours(contours, draw_contours)
+
+
+def trace_band(image, top, bottom, offset):
+
+    # Traces the contours in rows top to bottom of an image that is a band of a larger one, starting
+    # at row offset of it; returns the contours found in each direction, as getcontours() does.
+
+    image = find_edges(image)
+    w,h = image.size
+
+    # getdots() leaves out the last row of an image, and the first column - which here, as the image
+    # is transposed, is also the first row - so each includes one more row than it needs
+    first = max(top-1, 0)
+    IM1 = image.crop((0, top, w, min(bottom+1, h)))
+    IM2 = image.crop((0, first, w, bottom)).rotate(-90,expand=True).transpose(Image.FLIP_LEFT_RIGHT)
+
+    contours1 = [[(x, y+top+offset) for x, y in c] for c in connectdots(getdots(IM1))]
+    contours2 = [[(y, x+first+offset) for x, y in c] for c in connectdots(getdots(IM2))]
+
+    return contours1, contours2
+
+
 # -------------- supporting functions for drawing contours --------------
 
 def find_edges(image):
@@ -269,85 +585,84 @@ def find_edges(image):
 
 
 def getdots(IM):
+
+    # For each row (except the last), a list of the runs of white pixels, starting from the second
+    # column: (x, n), where x is the first pixel in the run, and n is the number of pixels after it.
+
     print("getting contour points...")
-    PX = IM.load()
-    dots = []
+    pixels = np.asarray(IM)
     w,h = IM.size
-    for y in range(h-1):
-        row = []
-        for x in range(1,w):
-            if PX[x,y] == 255:
-                if len(row) > 0:
-                    if x-row[-1][0] == row[-1][-1]+1:
-                        row[-1] = (row[-1][0],row[-1][-1]+1)
-                    else:
-                        row.append((x,0))
-                else:
-                    row.append((x,0))
-        dots.append(row)
+
+    ys, starts, ends = horizontal_runs(pixels[:h-1, 1:] == 255)
+
+    dots = [[] for y in range(h-1)]
+    for y, x, n in zip(ys.tolist(), (starts + 1).tolist(), (ends - starts).tolist()):
+        dots[y].append((x, n))
+
     return dots
 
 
 def connectdots(dots):
+
+    # Links the runs found by getdots() into contours, running down the image. Each run continues the
+    # contour ending at the closest run in the row above, if that's no more than 3 pixels away and
+    # hasn't already been continued; otherwise it starts a new contour. The contours that end in the
+    # previous row are kept in a dictionary keyed on x, so that each run is dealt with in constant
+    # time, apart from finding the closest run above.
+
     print("connecting contour points...")
     contours = []
+    tails = {}
+    previous_xs = []
+
     for y in range(len(dots)):
+
+        row_tails = {}
+
         for x,v in dots[y]:
-            if v > -1:
-                if y == 0:
-                    contours.append([(x,y)])
-                else:
-                    closest = -1
-                    cdist = 100
-                    for x0,v0 in dots[y-1]:
-                        if abs(x0-x) < cdist:
-                            cdist = abs(x0-x)
-                            closest = x0
-
-                    if cdist > 3:
-                        contours.append([(x,y)])
-                    else:
-                        found = 0
-                        for i in range(len(contours)):
-                            if contours[i][-1] == (closest,y-1):
-                                contours[i].append((x,y,))
-                                found = 1
-                                break
-                        if found == 0:
-                            contours.append([(x,y)])
-        for c in contours:
-            if c[-1][1] < y-1 and len(c)<4:
-                contours.remove(c)
-    return contours
+
+            contour = None
+
+            if previous_xs:
+                # the closest run in the previous row, the one to the left if two are equally close
+                i = bisect.bisect_left(previous_xs, x)
+                closest = min(previous_xs[max(i-1, 0):i+1], key=lambda x0: abs(x0-x))
+
+                if abs(closest-x) <= 3:
+                    contour = tails.pop(closest, None)
+
+            if contour is None:
+                contour = []
+                contours.append(contour)
+
+            contour.append((x,y))
+            row_tails[x] = contour
+
+        tails = row_tails
+        previous_xs = [x for x,v in dots[y]]
+
+    # drop contours of fewer than 4 points, unless they reach one of the last two rows
+    return [c for c in contours if len(c) >= 4 or c[-1][1] >= len(dots)-2]
 
 
 # -------------- optimisation for pen movement --------------
 
-def sortlines(lines):
+def sortlines(lines, optimise_time=0):
     print("optimizing stroke sequence...")
-    clines = lines[:]
-    slines = [clines.pop(0)]
-    while clines != []:
-        x,s,r = None,1000000,False
-        for l in clines:
-            d = distsum(l[0],slines[-1][-1])
-            dr = distsum(l[-1],slines[-1][-1])
-            if d < s:
-                x,s,r = l[:],d,False
-            if dr < s:
-                x,s,r = l[:],s,True
-
-        clines.remove(x)
-        if r == True:
-            x = x[::-1]
-        slines.append(x)
+    slines = stroke_order.sort_lines(lines)
+    if optimise_time:
+        slines = stroke_order.improve_order(slines, time_limit=optimise_time)
+    print(
+        "pen-up travel before: %.0f, after: %.0f"
+        % (stroke_order.pen_up_distance(lines), stroke_order.pen_up_distance(slines))
+    )
     return slines
 
 
 
 def lines_to_file(lines, filename):
-    with open(filename, "w") as file_to_save:
-        json.dump(lines, file_to_save, indent=4)
+    # as JSON, or in the binary line file format if the filename ends with .lines
+    linefile.write_lines(lines, filename)
 
 
 # -------------- helper functions --------------
@@ -368,22 +683,35 @@ def distsum(*args):
 
 
 def appmask(IM,masks):
-    PX = IM.load()
-    w,h = IM.size
-    NPX = {}
-    for x in range(0,w):
-        for y in range(0,h):
-            a = [0]*len(masks)
-            for i in range(len(masks)):
-                for p in masks[i].keys():
-                    if 0<x+p[0]<w and 0<y+p[1]<h:
-                        a[i] += PX[x+p[0],y+p[1]] * masks[i][p]
-                if sum(masks[i].values())!=0:
-                    a[i] = a[i] / sum(masks[i].values())
-            NPX[x,y]=int(sum([v**2 for v in a])**0.5)
-    for x in range(0,w):
-        for y in range(0,h):
-            PX[x,y] = NPX[x,y]
+
+    # Applies each of the masks - weights keyed on (x, y) offsets from a pixel - to every pixel of
+    # the image, dividing by the sum of the weights where that isn't 0, and replaces each pixel with
+    # the magnitude of the results, clipped to 255. Pixels off the edge of the image count as 0, and
+    # so (as they always have here) do those in the first row and column.
+
+    pixels = np.asarray(IM, dtype=np.int32)
+    h, w = pixels.shape
+    margin = max([max(abs(p[0]), abs(p[1])) for mask in masks for p in mask], default=0)
+
+    padded = np.zeros((h + 2*margin, w + 2*margin), dtype=np.int32)
+    padded[margin+1:margin+h, margin+1:margin+w] = pixels[1:, 1:]
+
+    squares = np.zeros((h, w))
+
+    for mask in masks:
+
+        a = np.zeros((h, w), dtype=np.int32)
+        for (dx, dy), weight in mask.items():
+            if weight:
+                a += weight * padded[margin+dy:margin+dy+h, margin+dx:margin+dx+w]
+
+        if sum(mask.values()) != 0:
+            a = a / sum(mask.values())
+
+        squares = squares + np.square(a, dtype=np.float64)
+
+    NPX = np.minimum(np.sqrt(squares).astype(np.int64), 255).astype(np.uint8)
+    IM.paste(Image.fromarray(NPX))
 
 F_Blur = {
     (-2,-2):2,(-1,-2):4,(0,-2):5,(1,-2):4,(2,-2):2,
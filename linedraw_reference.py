@@ -0,0 +1,144 @@
+# The functions in linedraw that have been rewritten for speed, as they were before, for comparing
+# results and timings against (see benchmark.py and test_linedraw.py). They're much slower on large
+# images. Apart from no longer printing their progress, they're unchanged.
+
+import linedraw
+
+
+def hatch(image, draw_hatch=16):
+
+    pixels = image.load()
+    w, h = image.size
+    lg1 = []
+    lg2 = []
+    for x0 in range(w):
+        for y0 in range(h):
+            x = x0 * draw_hatch
+            y = y0 * draw_hatch
+
+            # don't hatch above a certain level of brightness
+            if pixels[x0, y0] > 144:
+                pass
+
+            # above 64, draw horizontal lines
+            elif pixels[x0,y0] > 64:
+                lg1.append([(x,y+draw_hatch/4),(x+draw_hatch,y+draw_hatch/4)])
+
+            # above 16, draw diagonal lines also
+            elif pixels[x0,y0] > 16:
+                lg1.append([(x,y+draw_hatch/4),(x+draw_hatch,y+draw_hatch/4)])
+                lg2.append([(x+draw_hatch,y),(x,y+draw_hatch)])
+
+            # below 16, draw diagonal lines and a second horizontal line
+            else:
+                lg1.append([(x,y+draw_hatch/4),(x+draw_hatch,y+draw_hatch/4)])  # horizontal lines
+                lg1.append([(x,y+draw_hatch/2+draw_hatch/4),(x+draw_hatch,y+draw_hatch/2+draw_hatch/4)])  # horizontal lines with additional offset
+                lg2.append([(x+draw_hatch,y),(x,y+draw_hatch)])                 # diagonal lines, left
+
+    # Make segments into lines
+    line_groups = [lg1, lg2]
+
+    for line_group in line_groups:
+        for lines in line_group:
+            for lines2 in line_group:
+
+                # do items exist in both?
+                if lines and lines2:
+                    # if the last point of first is the same as the first point of of the second
+                    if lines[-1] == lines2[0]:
+                        # then extend the first with all the rest of the points of the second
+                        lines.extend(lines2[1:])
+                        # and empty the second list
+                        lines2.clear()
+
+        # in each line group keep any non-empty lines
+        saved_lines = [[line[0], line[-1]] for line in line_group if line]
+        line_group.clear()
+        line_group.extend(saved_lines)
+
+    lines = [item for group in line_groups for item in group]
+
+    return lines
+
+
+def getdots(IM):
+    PX = IM.load()
+    dots = []
+    w,h = IM.size
+    for y in range(h-1):
+        row = []
+        for x in range(1,w):
+            if PX[x,y] == 255:
+                if len(row) > 0:
+                    if x-row[-1][0] == row[-1][-1]+1:
+                        row[-1] = (row[-1][0],row[-1][-1]+1)
+                    else:
+                        row.append((x,0))
+                else:
+                    row.append((x,0))
+        dots.append(row)
+    return dots
+
+
+def connectdots(dots):
+    contours = []
+    for y in range(len(dots)):
+        for x,v in dots[y]:
+            if v > -1:
+                if y == 0:
+                    contours.append([(x,y)])
+                else:
+                    closest = -1
+                    cdist = 100
+                    for x0,v0 in dots[y-1]:
+                        if abs(x0-x) < cdist:
+                            cdist = abs(x0-x)
+                            closest = x0
+
+                    if cdist > 3:
+                        contours.append([(x,y)])
+                    else:
+                        found = 0
+                        for i in range(len(contours)):
+                            if contours[i][-1] == (closest,y-1):
+                                contours[i].append((x,y,))
+                                found = 1
+                                break
+                        if found == 0:
+                            contours.append([(x,y)])
+        for c in contours:
+            if c[-1][1] < y-1 and len(c)<4:
+                contours.remove(c)
+    return contours
+
+
+def join_contours(contours):
+    contours = list(contours)
+
+    for i in range(len(contours)):
+        for j in range(len(contours)):
+            if len(contours[i]) > 0 and len(contours[j])>0:
+                if linedraw.distsum(contours[j][0],contours[i][-1]) < 8:
+                    contours[i] = contours[i]+contours[j]
+                    contours[j] = []
+
+    return [c for c in contours if c]
+
+
+def appmask(IM,masks):
+    PX = IM.load()
+    w,h = IM.size
+    NPX = {}
+    for x in range(0,w):
+        for y in range(0,h):
+            a = [0]*len(masks)
+            for i in range(len(masks)):
+                for p in masks[i].keys():
+                    if 0<x+p[0]<w and 0<y+p[1]<h:
+                        a[i] += PX[x+p[0],y+p[1]] * masks[i][p]
+                if sum(masks[i].values())!=0:
+                    a[i] = a[i] / sum(masks[i].values())
+            NPX[x,y]=int(sum([v**2 for v in a])**0.5)
+    for x in range(0,w):
+        for y in range(0,h):
+            PX[x,y] = NPX[x,y]
@@ -0,0 +1,109 @@
+# A compact binary format for files of lines, as an alternative to JSON.
+#
+# Detailed drawings can make JSON files of tens of megabytes, which take a long time to parse. A
+# line file instead holds all the points in a single float32 buffer:
+#
+#     header    32 bytes: the magic bytes b"BGLINES\0", the format version and a reserved field
+#               (each a little-endian uint32), then the number of lines and the number of points
+#               (each a little-endian uint64)
+#     offsets   a little-endian uint64 for each line, plus one: line i is made of points
+#               offsets[i] to offsets[i + 1]
+#     points    a little-endian float32 x and y for each point
+#
+# Line files are memory-mapped when they're read, so the points are only loaded from disk as they're
+# used - and read_lines() hands them on as a Drawing, which the plotter works on without converting
+# them to lists.
+
+import json
+import struct
+
+import numpy
+
+
+MAGIC = b"BGLINES\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+
+
+def save_lines(lines, filename):
+
+    lengths = [len(line) for line in lines]
+
+    offsets = numpy.zeros(len(lines) + 1, dtype="<u8")
+    numpy.cumsum(lengths, out=offsets[1:])
+
+    points = numpy.array([point[:2] for line in lines for point in line], dtype="<f4").reshape(-1, 2)
+
+    save_arrays(points, offsets, filename)
+
+
+def save_arrays(points, offsets, filename):
+
+    # points is an array of shape (number of points, 2), and offsets the start of each line in it,
+    # followed by the total number of points
+
+    points = numpy.asarray(points, dtype="<f4").reshape(-1, 2)
+    offsets = numpy.asarray(offsets, dtype="<u8")
+
+    with open(filename, "wb") as line_file:
+        line_file.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets) - 1, len(points)))
+        line_file.write(offsets.tobytes())
+        line_file.write(points.tobytes())
+
+
+def load_lines(filename):
+
+    # Returns the points, as an array of shape (number of points, 2), and the offsets of the lines
+    # into it - both memory-mapped from the file rather than read into memory.
+
+    with open(filename, "rb") as line_file:
+        header = line_file.read(HEADER.size)
+
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{filename} is not a line file")
+
+    magic, version, reserved, number_of_lines, number_of_points = HEADER.unpack(header)
+
+    if version != VERSION:
+        raise ValueError(f"{filename} is a version {version} line file; only version {VERSION} can be read")
+
+    offsets = numpy.memmap(filename, dtype="<u8", mode="r", offset=HEADER.size, shape=(number_of_lines + 1,))
+
+    points = numpy.memmap(
+        filename, dtype="<f4", mode="r", offset=HEADER.size + offsets.nbytes, shape=(number_of_points, 2)
+    )
+
+    return points, offsets
+
+
+def is_line_file(filename):
+
+    with open(filename, "rb") as line_file:
+        return line_file.read(len(MAGIC)) == MAGIC
+
+
+def read_lines(filename):
+
+    # Reads lines from either a line file or a JSON file, and returns them as a Drawing - of the
+    # memory-mapped points, for a line file. Use its to_lines() for the usual list of lists of [x, y]
+    # points.
+
+    from drawing import Drawing  # drawing imports this module
+
+    if is_line_file(filename):
+        return Drawing(*load_lines(filename))
+
+    with open(filename, "r") as line_file:
+        return Drawing.from_lines(json.load(line_file))
+
+
+def write_lines(lines, filename):
+
+    # Writes lines to a line file if the filename ends with .lines, and to a JSON file otherwise.
+
+    if filename.endswith(".lines"):
+        save_lines(lines, filename)
+
+    else:
+        with open(filename, "w") as line_file:
+            json.dump(lines, line_file, indent=4)
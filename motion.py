@@ -0,0 +1,123 @@
+# Motion profiles: how fast the pen moves along each part of a drawing.
+#
+# Without a profile, every step of a move takes the same time per cm, so the arms are jerked from
+# standing still to full speed at the start of each move, and stopped dead at the end of it. With a
+# profile, the pen speeds up and slows down at a limited acceleration - a trapezoidal velocity
+# profile: accelerating, cruising, then decelerating.
+#
+# Along a line, the profile looks ahead to each point where the line changes direction. Corners are
+# taken as fast as their sharpness allows, by the junction deviation method used by many CNC
+# controllers: sharp corners need the pen almost to stop, gentle ones hardly at all, and it runs
+# straight through points where the line carries straight on. Lines always start and end at rest.
+
+import math
+
+import numpy
+
+
+def junction_speeds(points, max_speed, acceleration, junction_deviation):
+
+    # Returns the speed (in cm/s) at which the pen can pass each point of a line, given its top speed
+    # (in cm/s) and acceleration (in cm/s²). junction_deviation (in cm) sets how fast corners can
+    # be taken: in effect, how far the pen can cut across the inside of a corner.
+
+    points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+
+    vectors = numpy.diff(points, axis=0)
+    lengths = numpy.hypot(vectors[:, 0], vectors[:, 1])
+
+    limits = numpy.full(len(points), float(max_speed))
+    limits[0] = limits[-1] = 0
+
+    if len(points) > 2:
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+
+            directions = vectors / lengths[:, None]
+
+            # 1 where the line doubles back on itself, -1 where it carries straight on
+            cos_theta = -(directions[:-1] * directions[1:]).sum(axis=1)
+            sin_half_theta = numpy.sqrt(numpy.clip((1 - cos_theta) / 2, 0, 1))
+
+            corner_speeds = numpy.sqrt(acceleration * junction_deviation * sin_half_theta / (1 - sin_half_theta))
+
+        # points joining segments of no length are taken at rest
+        limits[1:-1] = numpy.minimum(max_speed, numpy.nan_to_num(corner_speeds, nan=0, posinf=max_speed))
+
+    speeds, lengths = limits.tolist(), lengths.tolist()
+
+    # look ahead: the pen must be able to slow down in time for every point after this one...
+    for i in range(len(speeds) - 2, -1, -1):
+        speeds[i] = min(speeds[i], math.sqrt(speeds[i + 1] ** 2 + 2 * acceleration * lengths[i]))
+
+    # ... and to have reached the speed from the points before it
+    for i in range(1, len(speeds)):
+        speeds[i] = min(speeds[i], math.sqrt(speeds[i - 1] ** 2 + 2 * acceleration * lengths[i - 1]))
+
+    return speeds
+
+
+def profile_times(distances, length, entry_speed, exit_speed, max_speed, acceleration):
+
+    # Returns an array of the times (in seconds, from the start) at which the pen reaches each of
+    # distances along a straight move of length cm. It enters the move at entry_speed and leaves at
+    # exit_speed, accelerating and decelerating at acceleration, and going no faster than max_speed.
+
+    distances = numpy.asarray(distances, dtype=float)
+
+    if length <= 0:
+        return numpy.zeros_like(distances)
+
+    # the highest speed reached: max_speed, unless the move is too short to get there and slow down again
+    peak_speed = min(max_speed, math.sqrt((2 * acceleration * length + entry_speed ** 2 + exit_speed ** 2) / 2))
+    peak_speed = max(peak_speed, entry_speed, exit_speed)
+
+    accelerating_distance = max((peak_speed ** 2 - entry_speed ** 2) / (2 * acceleration), 0)
+    decelerating_from = min(length - (peak_speed ** 2 - exit_speed ** 2) / (2 * acceleration), length)
+    decelerating_from = max(decelerating_from, accelerating_distance)
+
+    accelerated_at = (peak_speed - entry_speed) / acceleration
+    decelerating_at = accelerated_at + (decelerating_from - accelerating_distance) / peak_speed
+
+    with numpy.errstate(invalid="ignore"):
+
+        accelerating = (numpy.sqrt(entry_speed ** 2 + 2 * acceleration * distances) - entry_speed) / acceleration
+        cruising = accelerated_at + (distances - accelerating_distance) / peak_speed
+        decelerating = decelerating_at + (
+            peak_speed - numpy.sqrt(numpy.maximum(peak_speed ** 2 - 2 * acceleration * (distances - decelerating_from), 0))
+        ) / acceleration
+
+    return numpy.where(
+        distances < accelerating_distance, accelerating, numpy.where(distances <= decelerating_from, cruising, decelerating)
+    )
+
+
+def profile_durations(lengths, entry_speeds, exit_speeds, max_speed, acceleration):
+
+    # Returns an array of how long (in seconds) each of many straight moves takes - the time at which
+    # profile_times() reaches the end of each - worked out for all of them at once.
+
+    lengths = numpy.asarray(lengths, dtype=float)
+    entry_speeds = numpy.asarray(entry_speeds, dtype=float)
+    exit_speeds = numpy.asarray(exit_speeds, dtype=float)
+
+    peak_speeds = numpy.minimum(max_speed, numpy.sqrt((2 * acceleration * lengths + entry_speeds ** 2 + exit_speeds ** 2) / 2))
+    peak_speeds = numpy.maximum.reduce([peak_speeds, entry_speeds, exit_speeds])
+
+    accelerating_distances = numpy.maximum((peak_speeds ** 2 - entry_speeds ** 2) / (2 * acceleration), 0)
+    decelerating_from = numpy.minimum(lengths - (peak_speeds ** 2 - exit_speeds ** 2) / (2 * acceleration), lengths)
+    decelerating_from = numpy.maximum(decelerating_from, accelerating_distances)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+
+        accelerating = (numpy.sqrt(entry_speeds ** 2 + 2 * acceleration * lengths) - entry_speeds) / acceleration
+        decelerated = (
+            (peak_speeds - entry_speeds) / acceleration
+            + (decelerating_from - accelerating_distances) / peak_speeds
+            + (peak_speeds - numpy.sqrt(numpy.maximum(peak_speeds ** 2 - 2 * acceleration * (lengths - decelerating_from), 0)))
+            / acceleration
+        )
+
+    durations = numpy.where(lengths < accelerating_distances, accelerating, decelerated)
+
+    return numpy.where(lengths > 0, durations, 0.0)
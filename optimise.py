@@ -0,0 +1,459 @@
+# Optimisation of the order and direction in which lines are drawn.
+#
+# Most of the time a BrachioGraph spends on a drawing that isn't spent drawing goes on lifting the pen
+# and travelling to the start of the next line, so these functions aim to reduce that pen-up travel.
+# They work on lines in the usual format - a list of lines, each a list of [x, y] points - and so can
+# be used on the output of linedraw.vectorise() as well as on any JSON file of lines. The ordering
+# functions also take a Drawing, and then return one.
+
+import math
+import time
+
+import numpy
+
+from drawing import Drawing
+
+
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def pen_up_distance(lines):
+
+    # the total distance travelled with the pen up, from the end of each line to the start of the next
+
+    if isinstance(lines, Drawing):
+        return float(numpy.hypot(*(lines.starts[1:] - lines.ends[:-1]).astype(float).T).sum())
+
+    total = 0
+
+    for line, next_line in zip(lines, lines[1:]):
+        total = total + distance(line[-1], next_line[0])
+
+    return total
+
+
+def pen_lifts(lines):
+
+    # the number of times the pen is lifted between lines - as in BrachioGraph.draw_lines(), only when
+    # the next line doesn't start within a millimetre of the end of the one before
+
+    lifts = 0
+
+    for line, next_line in zip(lines, lines[1:]):
+        (end_x, end_y), (start_x, start_y) = line[-1][:2], next_line[0][:2]
+        if (round(end_x, 1), round(end_y, 1)) != (round(start_x, 1), round(start_y, 1)):
+            lifts = lifts + 1
+
+    return lifts
+
+
+def line_endpoints(lines):
+
+    # the start and end of each line, as an array of shape (number of lines, 2, 2)
+
+    if isinstance(lines, Drawing):
+        return numpy.stack((lines.starts, lines.ends), axis=1).astype(float)
+
+    return numpy.array([[line[0][:2], line[-1][:2]] for line in lines], dtype=float).reshape(-1, 2, 2)
+
+
+def arrange(lines, order, reversed_lines=None):
+
+    # the lines in the given order (a sequence of line indices), each reversed where the corresponding
+    # item of reversed_lines (if given) is true
+
+    if isinstance(lines, Drawing):
+        return lines.reorder(order, reversed_lines)
+
+    reversed_lines = reversed_lines or [False] * len(order)
+
+    return [lines[line][::-1] if reverse else lines[line] for line, reverse in zip(order, reversed_lines)]
+
+
+class EndpointGrid:
+
+    # A spatial hash of the start and end points of a set of lines, for finding the nearest endpoint
+    # to any position without having to check every line. Each cell of the grid holds the endpoints
+    # that fall within it, as (line index, end) pairs, where end is 0 for the start of the line and
+    # -1 for its end.
+
+    def __init__(self, endpoints, cell_size):
+
+        # endpoints is an array of shape (number of lines, 2, 2): the start and end x/y of each line
+
+        self.endpoints = endpoints.tolist()
+        self.cell_size = cell_size
+        self.cells = {}
+
+        for index, (start, end) in enumerate(self.endpoints):
+            self.add(index, 0, start)
+            self.add(index, -1, end)
+
+    def cell(self, point):
+        return (math.floor(point[0] / self.cell_size), math.floor(point[1] / self.cell_size))
+
+    def add(self, index, end, point):
+        self.cells.setdefault(self.cell(point), []).append((index, end))
+
+    def remove(self, index):
+        for end in (0, -1):
+            self.cells[self.cell(self.endpoints[index][end])].remove((index, end))
+
+    def ring(self, centre, radius):
+
+        # the endpoints in the cells forming a square ring at radius cells from the centre cell
+
+        cx, cy = centre
+
+        if radius == 0:
+            yield from self.cells.get(centre, ())
+            return
+
+        for x in range(cx - radius, cx + radius + 1):
+            yield from self.cells.get((x, cy - radius), ())
+            yield from self.cells.get((x, cy + radius), ())
+
+        for y in range(cy - radius + 1, cy + radius):
+            yield from self.cells.get((cx - radius, y), ())
+            yield from self.cells.get((cx + radius, y), ())
+
+    def nearest(self, point, max_radius):
+
+        # Returns (distance, index, end) for the endpoint nearest to point, searching outwards ring by
+        # ring, or None if it can't be found within max_radius cells. Ties go to the lowest line index,
+        # and to the start of a line before its end.
+
+        centre = self.cell(point)
+        best = None
+
+        for radius in range(max_radius + 1):
+
+            for index, end in self.ring(centre, radius):
+                candidate = (distance(point, self.endpoints[index][end]), index, -end)
+                if best is None or candidate < best:
+                    best = candidate
+
+            # anything in cells further out is at least radius cells away
+            if best is not None and best[0] <= radius * self.cell_size:
+                return best[0], best[1], -best[2]
+
+        return None
+
+
+def sort_lines(lines, max_radius=3):
+
+    # Orders lines (and reverses them where that helps) so that each line starts as close as possible
+    # to where the previous one ended - a greedy nearest-neighbour search, starting from the first line.
+    #
+    # Endpoints are found using an EndpointGrid, with cells sized so that each holds a couple of
+    # endpoints on average. When there's nothing within max_radius cells (as happens towards the end,
+    # once most of the lines have been used) the remaining endpoints are checked all together with
+    # NumPy instead. The result is never longer in pen-up travel than the order the lines came in.
+
+    if len(lines) < 3:
+        return arrange(lines, range(len(lines)))
+
+    endpoints = line_endpoints(lines)
+
+    min_x, min_y = endpoints.reshape(-1, 2).min(axis=0)
+    max_x, max_y = endpoints.reshape(-1, 2).max(axis=0)
+    cell_size = max(max_x - min_x, max_y - min_y) / math.sqrt(len(lines)) or 1
+
+    grid = EndpointGrid(endpoints, cell_size)
+
+    remaining = numpy.ones(len(lines), dtype=bool)
+    order = []
+
+    index, end = 0, 0
+
+    while True:
+
+        grid.remove(index)
+        remaining[index] = False
+        order.append((index, end))
+
+        if len(order) == len(lines):
+            break
+
+        # we finish at the opposite end of the line from the one we started at
+        position = endpoints[index, -1 - end].tolist()
+
+        nearest = grid.nearest(position, max_radius)
+
+        if nearest:
+            gap, index, end = nearest
+
+        else:
+            candidates = numpy.flatnonzero(remaining)
+            distances = numpy.hypot(*(endpoints[candidates] - position).transpose(2, 0, 1))
+
+            # flattened row-major, so ties go to the lower index, and the start before the end
+            best = int(numpy.argmin(distances))
+            index, end = int(candidates[best // 2]), -(best % 2)
+
+    sorted_lines = arrange(lines, [index for index, end in order], [end != 0 for index, end in order])
+
+    if pen_up_distance(sorted_lines) > pen_up_distance(lines):
+        return arrange(lines, range(len(lines)))
+
+    return sorted_lines
+
+
+def nearest_neighbours(endpoints, k):
+
+    # For each line, the indices of the (up to) k other lines with endpoints nearest to either of its
+    # own endpoints, nearest first.
+
+    number = len(endpoints)
+    k = min(k, number - 1)
+
+    extent = max(numpy.ptp(endpoints.reshape(-1, 2), axis=0)) or 1
+    grid = EndpointGrid(endpoints, cell_size=extent / math.sqrt(number))
+
+    neighbours = []
+
+    for index in range(number):
+
+        distances = {}
+
+        for point in grid.endpoints[index]:
+
+            centre = grid.cell(point)
+            radius = 0
+
+            # widen the search until there are k candidates and nothing unsearched can be nearer
+            while True:
+
+                for other, end in grid.ring(centre, radius):
+                    if other != index:
+                        gap = distance(point, grid.endpoints[other][end])
+                        distances[other] = min(gap, distances.get(other, math.inf))
+
+                if len(distances) >= k and sorted(distances.values())[k - 1] <= radius * grid.cell_size:
+                    break
+
+                if radius * grid.cell_size > extent:
+                    break
+
+                radius = radius + 1
+
+        neighbours.append(sorted(distances, key=distances.get)[:k])
+
+    return neighbours
+
+
+def improve_order(lines, time_limit=2, k=8):
+
+    # Improves an existing order of lines (for example, one produced by sort_lines()) using 2-opt
+    # moves, which reverse a run of lines, and Or-opt moves, which take a single line out and put it
+    # back in elsewhere, either way round. Only moves that connect each line to one of its k nearest
+    # neighbours are tried. Stops when no move helps or after time_limit seconds of CPU time. The
+    # first line always stays first.
+
+    start_time = time.process_time()
+
+    number = len(lines)
+
+    if number < 4:
+        return arrange(lines, range(number))
+
+    endpoints = line_endpoints(lines)
+    neighbours = nearest_neighbours(endpoints, k)
+    points = endpoints.tolist()
+
+    # the order is a list of line indices, and a parallel list of directions (0 forwards, 1 reversed)
+    order = list(range(number))
+    directions = [0] * number
+    positions = list(range(number))
+
+    def start(position):
+        return points[order[position]][directions[position]]
+
+    def end(position):
+        return points[order[position]][1 - directions[position]]
+
+    def link(position):
+        # the pen-up distance from the line at position to the next one
+        if position + 1 >= number:
+            return 0
+        return distance(end(position), start(position + 1))
+
+    def reverse(first, last):
+        # reverse the run of lines from first to last inclusive
+        order[first:last + 1] = order[first:last + 1][::-1]
+        directions[first:last + 1] = [1 - direction for direction in reversed(directions[first:last + 1])]
+        for position in range(first, last + 1):
+            positions[order[position]] = position
+
+    def two_opt(i):
+
+        # try to replace the link into position i with a link to the end of a neighbouring line's run
+
+        for neighbour in neighbours[order[i - 1]]:
+
+            j = positions[neighbour]
+
+            if j >= i:
+                # reverse i..j: end(i-1) then links to end(j), and start(i) to start(j+1)
+                after = distance(end(i - 1), end(j))
+                if j + 1 < number:
+                    after = after + distance(start(i), start(j + 1))
+                if after < link(i - 1) + link(j) - 1e-9:
+                    reverse(i, j)
+                    return True
+
+            elif j < i - 1:
+                # reverse j+1..i-1: end(j) then links to end(i-1), and start(j+1) to start(i)
+                after = distance(end(j), end(i - 1)) + distance(start(j + 1), start(i))
+                if after < link(j) + link(i - 1) - 1e-9:
+                    reverse(j + 1, i - 1)
+                    return True
+
+        return False
+
+    def or_opt(i):
+
+        # try to move the line at position i to sit after one of its neighbours, either way round
+
+        removed = link(i - 1) + link(i)
+        if i + 1 < number:
+            removed = removed - distance(end(i - 1), start(i + 1))
+
+        line_start, line_end = start(i), end(i)
+
+        for neighbour in neighbours[order[i]]:
+
+            j = positions[neighbour]
+
+            if j in (i - 1, i):
+                continue
+
+            for direction, (first, last) in enumerate(((line_start, line_end), (line_end, line_start))):
+
+                added = distance(end(j), first)
+                if j + 1 < number:
+                    added = added + distance(last, start(j + 1)) - link(j)
+
+                if added < removed - 1e-9:
+
+                    line, line_direction = order.pop(i), directions.pop(i) ^ direction
+                    j = j if j < i else j - 1
+                    order.insert(j + 1, line)
+                    directions.insert(j + 1, line_direction)
+
+                    for position in range(min(i, j + 1), max(i, j + 1) + 1):
+                        positions[order[position]] = position
+
+                    return True
+
+        return False
+
+    improved = True
+
+    while improved and time.process_time() - start_time < time_limit:
+
+        improved = False
+
+        for i in range(1, number):
+
+            if two_opt(i) or or_opt(i):
+                improved = True
+
+            if i % 256 == 0 and time.process_time() - start_time > time_limit:
+                break
+
+    return arrange(lines, order, [direction == 1 for direction in directions])
+
+
+def optimise_lines(lines, time_limit=2):
+
+    # Sorts lines into a good order, then spends up to time_limit seconds improving it.
+
+    start_time = time.process_time()
+    sorted_lines = sort_lines(lines)
+
+    return improve_order(sorted_lines, time_limit=max(time_limit - (time.process_time() - start_time), 0))
+
+
+def merge_lines(lines, tolerance=0.05):
+
+    # Joins lines whose ends meet - the end of one within tolerance of the start or end of another -
+    # into single lines, so that they can be drawn without lifting the pen in between. Where the
+    # point at which two lines are joined lies on the straight line between its neighbours (again to
+    # within tolerance), it's dropped. Merged lines take the place of the first of their parts.
+
+    if len(lines) < 2:
+        return [list(line) for line in lines]
+
+    endpoints = line_endpoints(lines)
+
+    # with cells the size of the tolerance, every endpoint within tolerance is in the 3x3 cells around
+    grid = EndpointGrid(endpoints, cell_size=tolerance or 1e-9)
+
+    used = [False] * len(lines)
+    merged_lines = []
+
+    def nearest(point):
+        nearest = grid.nearest(point, max_radius=1)
+        if nearest and nearest[0] <= tolerance:
+            return nearest
+
+    def join(line, other):
+        # append other to line, dropping a duplicated or redundant point at the join
+        if list(line[-1][:2]) == list(other[0][:2]):
+            other = other[1:]
+        if len(line) > 1 and other and is_between(line[-2], line[-1], other[0], tolerance):
+            line.pop()
+        line.extend(other)
+
+    for index, line in enumerate(lines):
+
+        if used[index]:
+            continue
+
+        used[index] = True
+        grid.remove(index)
+        line = list(line)
+
+        # extend the line forwards from its end...
+        while True:
+            match = nearest(line[-1])
+            if not match:
+                break
+            gap, other, end = match
+            used[other] = True
+            grid.remove(other)
+            join(line, lines[other] if end == 0 else lines[other][::-1])
+
+        # ...and backwards from its start
+        while True:
+            match = nearest(line[0])
+            if not match:
+                break
+            gap, other, end = match
+            used[other] = True
+            grid.remove(other)
+            head = list(lines[other] if end == -1 else lines[other][::-1])
+            join(head, line)
+            line = head
+
+        merged_lines.append(line)
+
+    return merged_lines
+
+
+def is_between(a, b, c, tolerance):
+
+    # whether point b lies between a and c, within tolerance of the straight line joining them
+
+    (ax, ay), (bx, by), (cx, cy) = a[:2], b[:2], c[:2]
+
+    length = distance(a, c)
+    if not length:
+        return False
+
+    cross = (cx - ax) * (by - ay) - (cy - ay) * (bx - ax)
+    dot = (bx - ax) * (cx - ax) + (by - ay) * (cy - ay)
+
+    return abs(cross) / length <= tolerance and 0 <= dot <= length ** 2
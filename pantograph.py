@@ -7,7 +7,7 @@ import json
 from tqdm import tqdm, trange
 import readchar
 
-import pigpio
+from drivers import PigpioDriver
 
 
 def hypotenuse(side1, side2):
@@ -19,7 +19,7 @@ class PantoGraph:
     def __init__(
         self,
 
-        driver=4,                  # the lengths of the arms
+        driver_arm=4,              # the lengths of the arms
         follower=10.15,            # the lengths of the arms
 
         # The angles are relative to each motor, so we need to know where each motor actually is.
@@ -33,22 +33,23 @@ class PantoGraph:
         correction_2=0,
 
         centre_1=1350, multiplier_1=425/45,
-        centre_2=1350, multiplier_2=415/45
+        centre_2=1350, multiplier_2=415/45,
+
+        driver=None,        # the servo driver; by default, pigpio on this Raspberry Pi
     ):
 
-        # instantiate this Raspberry Pi as a pigpio.pi() instance
-        self.rpi = pigpio.pi()
+        self.driver = driver or PigpioDriver()
 
         # the pulse frequency should be 100Hz - higher values could damage the servos
-        self.rpi.set_PWM_frequency(14, 50)
-        self.rpi.set_PWM_frequency(15, 50)
+        self.driver.set_frequency(14, 50)
+        self.driver.set_frequency(15, 50)
 
         # create the pen object, and make sure the pen is up
         self.pen = Pen(pg=self)
         self.pen.up()
 
         # set the pantograph geometry
-        self.DRIVER = driver
+        self.DRIVER = driver_arm
         self.FOLLOWER = follower
         self.MOTOR_1_POS, self.MOTOR_2_POS = motor_1_pos, motor_2_pos
 
@@ -64,8 +65,8 @@ class PantoGraph:
         self.multiplier_1, self.multiplier_2 = multiplier_1, multiplier_2
 
         # Initialise the pantograph with the motors straight ahead
-        self.rpi.set_servo_pulsewidth(14, 1350)
-        self.rpi.set_servo_pulsewidth(15, 1350)
+        self.driver.set_pulse_width(14, 1350)
+        self.driver.set_pulse_width(15, 1350)
 
         self.set_angles(0, 0)
         self.current_x, self.current_y = self.angles_to_xy(0, 0)
@@ -112,7 +113,7 @@ Controls:
             pin = motor["pin"]
 
             pw = 1350
-            self.rpi.set_servo_pulsewidth(pin, pw)
+            self.driver.set_pulse_width(pin, pw)
 
             print("Adjusting servo on pin {}\n".format(pin))
 
@@ -160,7 +161,7 @@ Controls:
         adjustments = {"<": -100, ">": +100, "{": -10, "}": +10, "[": -1, "]": +1, "0": "done"}
 
         pw = 1350
-        self.rpi.set_servo_pulsewidth(pin, pw)
+        self.driver.set_pulse_width(pin, pw)
 
         print("        Now use the controls to move the arm to {}˚ (i.e. {}).\n".format(angle, description))
 
@@ -176,7 +177,7 @@ Controls:
                 else:
                     pw = pw + adjustment
                     print("        pulse width: {} ".format(pw), end="\r")
-                    self.rpi.set_servo_pulsewidth(pin, pw)
+                    self.driver.set_pulse_width(pin, pw)
 
 
     # ----------------- reporting methods -----------------
@@ -504,16 +505,16 @@ Controls:
 
     def set_pulse_widths(self, pw_1, pw_2):
 
-        self.rpi.set_servo_pulsewidth(14, pw_1)
-        self.rpi.set_servo_pulsewidth(15, pw_2)
+        self.driver.set_pulse_width(14, pw_1)
+        self.driver.set_pulse_width(15, pw_2)
 
         sleep(.01)
 
 
     def get_pulse_widths(self):
 
-        actual_pulse_width_1 = self.rpi.get_servo_pulsewidth(14)
-        actual_pulse_width_2 = self.rpi.get_servo_pulsewidth(15)
+        actual_pulse_width_1 = self.driver.get_pulse_width(14)
+        actual_pulse_width_2 = self.driver.get_pulse_width(15)
 
         return actual_pulse_width_1, actual_pulse_width_2
 
@@ -610,7 +611,7 @@ Controls:
     def quiet(self, servos=[14, 15, 18]):
 
         for servo in servos:
-            self.rpi.set_servo_pulsewidth(servo, 0)
+            self.driver.set_pulse_width(servo, 0)
 
 
 class Pen:
@@ -623,19 +624,20 @@ class Pen:
         self.pw_down = pw_down
         self.transition_time = transition_time
 
-        self.rpi = pigpio.pi()
-        self.rpi.set_PWM_frequency(self.pin, 50)
+        # the pen shares the PantoGraph's driver
+        self.driver = pg.driver
+        self.driver.set_frequency(self.pin, 50)
 
         self.up()
 
 
     def down(self):
-        self.rpi.set_servo_pulsewidth(self.pin, self.pw_down)
+        self.driver.set_pulse_width(self.pin, self.pw_down)
         sleep(self.transition_time)
 
 
     def up(self):
-        self.rpi.set_servo_pulsewidth(self.pin, self.pw_up)
+        self.driver.set_pulse_width(self.pin, self.pw_up)
         sleep(self.transition_time)
 
 
@@ -651,31 +653,31 @@ class Pen:
 
 # # large servos and box
 #
-# pg = PantoGraph(driver=4, follower=9.8, motor_1_pos=-1.7, motor_2_pos=1.7, centre_1 = 1864, multiplier_1 = 9.2779, centre_2= 964, multiplier_2 = 9.4222, box_bounds=(-4, 0, 4, 5))
+# pg = PantoGraph(driver_arm=4, follower=9.8, motor_1_pos=-1.7, motor_2_pos=1.7, centre_1 = 1864, multiplier_1 = 9.2779, centre_2= 964, multiplier_2 = 9.4222, box_bounds=(-4, 0, 4, 5))
 
-# pg = PantoGraph(driver=6.8, follower=10.7, motor_1_pos=-1.7, motor_2_pos=1.7, centre_1 = 1639, multiplier_1 = 9.211, centre_2= 1060, multiplier_2 = 9.4444, box_bounds=(-6, 7, 6, 15.5))
+# pg = PantoGraph(driver_arm=6.8, follower=10.7, motor_1_pos=-1.7, motor_2_pos=1.7, centre_1 = 1639, multiplier_1 = 9.211, centre_2= 1060, multiplier_2 = 9.4444, box_bounds=(-6, 7, 6, 15.5))
 
 
 # # small servos and box
 #
-# pg = PantoGraph(driver=4, follower=9.8, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 2040, multiplier_1 = 10.6222, centre_2= 950, multiplier_2 = 10.2778, box_bounds=(-4, 0, 4, 5))
+# pg = PantoGraph(driver_arm=4, follower=9.8, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 2040, multiplier_1 = 10.6222, centre_2= 950, multiplier_2 = 10.2778, box_bounds=(-4, 0, 4, 5))
 
-# pg = PantoGraph(driver=4.65, follower=9.8, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 2225, multiplier_1 = 9.5, centre_2=900, multiplier_2 = 10.2221, box_bounds=(-4.5, 7, 4.5, 13))
+# pg = PantoGraph(driver_arm=4.65, follower=9.8, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 2225, multiplier_1 = 9.5, centre_2=900, multiplier_2 = 10.2221, box_bounds=(-4.5, 7, 4.5, 13))
 
 # set 1
-# pg = PantoGraph(driver=6.8, follower=10.7, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 1730, multiplier_1 = 9.5556, centre_2= 1110, multiplier_2 = 10, box_bounds=(-5, 8, 5, 15))
+# pg = PantoGraph(driver_arm=6.8, follower=10.7, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 1730, multiplier_1 = 9.5556, centre_2= 1110, multiplier_2 = 10, box_bounds=(-5, 8, 5, 15))
 
 # set 2
-# pg = PantoGraph(driver=6.85, follower=11.85, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 1670, multiplier_1 = 9.6667, centre_2= 1100, multiplier_2 = 9.6667, box_bounds=(-7, 8, 7, 18))
+# pg = PantoGraph(driver_arm=6.85, follower=11.85, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 1670, multiplier_1 = 9.6667, centre_2= 1100, multiplier_2 = 9.6667, box_bounds=(-7, 8, 7, 18))
 
 # set 3
-# pg = PantoGraph(driver=8.5, follower=12.65, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 1760, multiplier_1 = 9.6667, centre_2= 922, multiplier_2 = 9.6667, box_bounds=(-7, 8, 7, 18))
+# pg = PantoGraph(driver_arm=8.5, follower=12.65, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 1760, multiplier_1 = 9.6667, centre_2= 922, multiplier_2 = 9.6667, box_bounds=(-7, 8, 7, 18))
 
 # set 4
-# pg = PantoGraph(driver=6.9, follower=10.7, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 2042, multiplier_1 = 10.2667, centre_2= 813, multiplier_2 = 9.4556, box_bounds=(-6.5, 7, 6.5, 15))
+# pg = PantoGraph(driver_arm=6.9, follower=10.7, motor_1_pos=-1.5, motor_2_pos=1.5, centre_1 = 2042, multiplier_1 = 10.2667, centre_2= 813, multiplier_2 = 9.4556, box_bounds=(-6.5, 7, 6.5, 15))
 
 # set 4
-# pg = PantoGraph(driver=6.85, follower=10.7, motor_1_pos=-1.55, motor_2_pos=1.55, centre_1 = 1721, multiplier_1 = 9.6778, centre_2= 850, multiplier_2 = 9.8889, box_bounds=(-6.5, 7, 6.5, 15))
+# pg = PantoGraph(driver_arm=6.85, follower=10.7, motor_1_pos=-1.55, motor_2_pos=1.55, centre_1 = 1721, multiplier_1 = 9.6778, centre_2= 850, multiplier_2 = 9.8889, box_bounds=(-6.5, 7, 6.5, 15))
 
 # set 5
 pg = PantoGraph(driver=6.85, follower=10.7, motor_1_pos=-1.55, motor_2_pos=1.55, centre_1 = 1721, multiplier_1 = 9.6778, centre_2= 983, multiplier_2 = 9.8889, box_bounds=(-6, 8, 6, 15.5))
@@ -0,0 +1,147 @@
+# A plot program is a BrachioGraph drawing compiled down to the exact sequence of pulse-widths that
+# will be sent to the servos. Compiling does all the geometry, rescaling, inverse kinematics and
+# hysteresis correction ahead of time, so that running the program only has to stream pulse-widths
+# out at the right moments - and the same program can be saved and replayed without recomputing it.
+
+import numpy
+
+
+# each record is a single step: the pulse-widths for the two arm servos and the pen servo, and how
+# long (in seconds) to wait before the next step
+PROGRAM_DTYPE = numpy.dtype([
+    ("pw_1", numpy.float32),
+    ("pw_2", numpy.float32),
+    ("pen_pw", numpy.float32),
+    ("dwell", numpy.float32),
+])
+
+
+class PlotProgram:
+
+    def __init__(self, records, start, end, corrections=(0, 0)):
+
+        self.records = numpy.asarray(records, dtype=PROGRAM_DTYPE)
+
+        # the x/y positions of the pen at the start and end of the program
+        self.start = tuple(start)
+        self.end = tuple(end)
+
+        # the hysteresis corrections included in the last pulse-widths of the arm servos
+        self.corrections = tuple(corrections)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        # the time in seconds that running the program will take
+        return float(self.records["dwell"].sum(dtype=numpy.float64))
+
+    def save(self, filename):
+        with open(filename, "wb") as program_file:
+            numpy.savez(
+                program_file, records=self.records, start=self.start, end=self.end, corrections=self.corrections
+            )
+
+    @classmethod
+    def load(cls, filename):
+        with numpy.load(filename) as program_file:
+            return cls(
+                program_file["records"], program_file["start"], program_file["end"], program_file["corrections"]
+            )
+
+
+def hysteresis_corrections(pws, previous_pw, active_correction, correction):
+
+    # A vectorised version of the hysteresis correction in BrachioGraph.set_angles(): the correction
+    # is +correction after a pulse-width increase, -correction after a decrease, and unchanged when
+    # the pulse-width stays the same. Returns the correction for each step.
+
+    directions = numpy.sign(numpy.diff(pws, prepend=previous_pw))
+
+    # for each step, the index of the most recent step at which the pulse-width changed (or -1)
+    last_changed = numpy.maximum.accumulate(
+        numpy.where(directions != 0, numpy.arange(len(pws)), -1)
+    )
+
+    return numpy.where(last_changed >= 0, directions[last_changed] * correction, active_correction)
+
+
+class ProgramBuilder:
+
+    # Follows the same logic as BrachioGraph.xy() and Pen.up()/down(), but instead of moving the
+    # servos records what they would be sent.
+
+    def __init__(self, bg, wait, interpolate, start):
+
+        self.bg = bg
+        self.wait = wait
+        self.interpolate = interpolate
+
+        self.start = self.x, self.y = start
+
+        angles_1, angles_2, pws_1, pws_2 = self.bg.xy_to_pulse_widths_array([start[0]], [start[1]])
+        self.pw_1 = self.previous_pw_1 = float(pws_1[0])
+        self.pw_2 = self.previous_pw_2 = float(pws_2[0])
+        self.active_hysteresis_correction_1 = self.active_hysteresis_correction_2 = 0
+
+        self.pen_pw = self.bg.pen.pw_up
+        self.chunks = []
+
+    def add(self, pws_1, pws_2, pen_pws, dwells):
+
+        chunk = numpy.empty(len(pws_1), dtype=PROGRAM_DTYPE)
+        chunk["pw_1"], chunk["pw_2"], chunk["pen_pw"], chunk["dwell"] = pws_1, pws_2, pen_pws, dwells
+        self.chunks.append(chunk)
+
+    def pen(self, down):
+
+        pen_pw = self.bg.pen.pw_down if down else self.bg.pen.pw_up
+
+        # only a change of pen position needs to wait for the pen servo
+        if pen_pw != self.pen_pw:
+            self.pen_pw = pen_pw
+            self.add([self.pw_1], [self.pw_2], [pen_pw], [self.bg.pen.transition_time])
+
+    def xy(self, x, y, draw=False, speeds=(0, 0)):
+
+        self.pen(draw)
+
+        if (x, y) == (self.x, self.y):
+            return
+
+        x_steps, y_steps, dwells = self.bg.steps(
+            x, y, self.wait, self.interpolate, start=(self.x, self.y), speeds=speeds
+        )
+        angles_1, angles_2, pws_1, pws_2 = self.bg.xy_to_pulse_widths_array(x_steps, y_steps)
+
+        corrections_1 = hysteresis_corrections(
+            pws_1, self.previous_pw_1, self.active_hysteresis_correction_1, self.bg.hysteresis_correction_1
+        )
+        corrections_2 = hysteresis_corrections(
+            pws_2, self.previous_pw_2, self.active_hysteresis_correction_2, self.bg.hysteresis_correction_2
+        )
+
+        self.add(pws_1 + corrections_1, pws_2 + corrections_2, self.pen_pw, dwells)
+
+        self.x, self.y = x_steps[-1], y_steps[-1]
+        self.previous_pw_1, self.previous_pw_2 = pws_1[-1], pws_2[-1]
+        self.active_hysteresis_correction_1, self.active_hysteresis_correction_2 = corrections_1[-1], corrections_2[-1]
+        self.pw_1, self.pw_2 = float(pws_1[-1] + corrections_1[-1]), float(pws_2[-1] + corrections_2[-1])
+
+    def dwell(self, seconds):
+        self.add([self.pw_1], [self.pw_2], [self.pen_pw], [seconds])
+
+    def build(self):
+
+        if self.chunks:
+            records = numpy.concatenate(self.chunks)
+        else:
+            records = numpy.empty(0, dtype=PROGRAM_DTYPE)
+
+        return PlotProgram(
+            records,
+            start=self.start,
+            end=(float(self.x), float(self.y)),
+            corrections=(float(self.active_hysteresis_correction_1), float(self.active_hysteresis_correction_2)),
+        )
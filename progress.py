@@ -0,0 +1,158 @@
+# Progress reporting for plots.
+#
+# A Progress is given the total amount of work in a plot - the number of segments to be drawn,
+# counted before the plot starts. The plotting loop calls step() after each one, which only adds to a
+# count and checks whether a report is due; every interval seconds (and at the start and end), the
+# sinks are told how far the plot has got.
+#
+# A sink is anything with update(progress) and close(progress) methods. TqdmSink shows a progress
+# bar, LogSink writes to a logger, and CallbackSink passes the Progress to a function of your own.
+
+import logging
+from time import monotonic
+
+
+class Progress:
+
+    def __init__(self, total, sinks=(), description="Plotting", unit="segments", interval=0.5, clock=monotonic):
+
+        self.total = total
+        self.sinks = list(sinks)
+        self.description = description
+        self.unit = unit
+        self.interval = interval
+        self.clock = clock
+
+        self.done = 0
+        self.started = clock()
+        self.next_report = self.started
+
+        if self.sinks:
+            self.report()
+
+    def step(self, amount=1):
+
+        self.done += amount
+
+        if self.sinks and self.clock() >= self.next_report:
+            self.report()
+
+    def report(self):
+
+        self.next_report = self.clock() + self.interval
+
+        for sink in self.sinks:
+            sink.update(self)
+
+    def close(self):
+
+        for sink in self.sinks:
+            sink.close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    @property
+    def elapsed(self):
+        return self.clock() - self.started
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 1
+
+    @property
+    def remaining(self):
+
+        # an estimate of the seconds left, assuming the rest goes at the same rate; None at the start
+
+        if not self.done:
+            return None
+
+        return self.elapsed * (self.total - self.done) / self.done
+
+
+class TqdmSink:
+
+    def __init__(self, **tqdm_arguments):
+
+        self.tqdm_arguments = {"leave": False, **tqdm_arguments}
+        self.bar = None
+        self.shown = 0
+
+    def update(self, progress):
+
+        if self.bar is None:
+            import tqdm
+            self.bar = tqdm.tqdm(
+                total=progress.total, desc=progress.description, unit=f" {progress.unit}", **self.tqdm_arguments
+            )
+
+        self.bar.update(progress.done - self.shown)
+        self.shown = progress.done
+
+    def close(self, progress):
+
+        if self.bar is not None:
+            self.update(progress)
+            self.bar.close()
+            self.bar = None
+            self.shown = 0
+
+
+class LogSink:
+
+    def __init__(self, logger=None, level=logging.INFO):
+
+        self.logger = logger or logging.getLogger("brachiograph")
+        self.level = level
+
+    def update(self, progress):
+
+        remaining = progress.remaining
+        self.logger.log(
+            self.level,
+            f"{progress.description}: {progress.done}/{progress.total} {progress.unit} ({progress.fraction:.0%}), "
+            f"{progress.elapsed:.1f}s elapsed" + (f", about {remaining:.0f}s remaining" if remaining is not None else "")
+        )
+
+    def close(self, progress):
+
+        self.logger.log(
+            self.level,
+            f"{progress.description}: finished {progress.done} {progress.unit} in {progress.elapsed:.1f}s"
+        )
+
+
+class CallbackSink:
+
+    def __init__(self, function):
+        self.function = function
+
+    def update(self, progress):
+        self.function(progress)
+
+    def close(self, progress):
+        self.function(progress)
+
+
+def make_sinks(progress):
+
+    # The sinks for BrachioGraph(progress=...): None for a progress bar, False for nothing, or a sink,
+    # a function to call, or a list of them.
+
+    if progress is None:
+        return [TqdmSink()]
+
+    if progress is False:
+        return []
+
+    if hasattr(progress, "update") and hasattr(progress, "close"):
+        return [progress]
+
+    if callable(progress):
+        return [CallbackSink(progress)]
+
+    return [sink for item in progress for sink in make_sinks(item)]
@@ -0,0 +1,159 @@
+# Hardware-timed servo output using pigpio waveforms.
+#
+# Setting pulse-widths one at a time with set_servo_pulsewidth() means a round-trip to the pigpio
+# daemon for every servo at every step, with Python's sleep() providing the timing in between. Instead,
+# ServoWaves turns a whole sequence of steps into waveforms - one servo frame per step, repeated for
+# as long as the step lasts - and submits them as a wave chain, so that the daemon clocks the pulses
+# out itself.
+
+from math import ceil
+from time import sleep
+
+import pigpio
+
+
+class ServoWaves:
+
+    def __init__(
+        self,
+        rpi,
+        pins=(14, 15),
+        min_frame=10000,    # the shortest servo frame in µS (100Hz) - higher rates could damage the servos
+        max_frame=20000,    # the longest servo frame in µS (50Hz)
+        chunk_size=80,      # steps per chain (each takes up to 7 of the 600 bytes a chain may use)
+        poll=0.002,         # how often to check whether a chain has finished
+    ):
+
+        self.rpi = rpi
+        self.pins = tuple(pins)
+        self.min_frame = min_frame
+        self.max_frame = max_frame
+        self.chunk_size = chunk_size
+        self.poll = poll
+
+        for pin in self.pins:
+            self.rpi.set_mode(pin, pigpio.OUTPUT)
+
+
+    def frame(self, pulse_widths, frame_length):
+
+        # Returns the pulses for a single servo frame: all the pins go high together, and each goes
+        # low again after its own pulse-width.
+
+        pulses = []
+        elapsed = 0
+
+        pins_by_pulse_width = sorted(zip(pulse_widths, self.pins))
+        on_mask = sum(1 << pin for pin in self.pins)
+        off_mask = 0
+
+        for pulse_width, pin in pins_by_pulse_width:
+
+            if pulse_width > elapsed:
+                pulses.append(pigpio.pulse(on_mask, off_mask, pulse_width - elapsed))
+                elapsed = pulse_width
+                on_mask = off_mask = 0
+
+            off_mask |= 1 << pin
+
+        pulses.append(pigpio.pulse(on_mask, off_mask, frame_length - elapsed))
+
+        return pulses
+
+
+    def steps_to_frames(self, pulse_widths, dwells):
+
+        # Converts each step - a tuple of pulse-widths, one for each pin, and the time in seconds until
+        # the next step - into frame lengths and the number of times to repeat them.
+        #
+        # The dwell is divided into the fewest frames that fit within max_frame, so that the step lasts
+        # as long as it should. Frame lengths are whole microseconds, so when the dwell doesn't divide
+        # evenly, some of the frames are a microsecond longer than the others and the step is yielded
+        # as two entries. Dwells shorter than min_frame are stretched to it.
+
+        for step_pulse_widths, dwell in zip(pulse_widths, dwells):
+
+            step_pulse_widths = tuple(int(round(pulse_width)) for pulse_width in step_pulse_widths)
+            dwell = max(int(round(dwell * 1000000)), self.min_frame)
+
+            repeats = min(ceil(dwell / self.max_frame), 65535)
+            frame_length, longer_frames = divmod(dwell, repeats)
+
+            if longer_frames:
+                yield step_pulse_widths, frame_length + 1, longer_frames
+
+            yield step_pulse_widths, frame_length, repeats - longer_frames
+
+
+    def create_chain(self, frames):
+
+        # Creates a wave for each distinct frame, and returns the chain that plays them all in order,
+        # along with the wave ids so that they can be deleted once the chain has been played.
+
+        chain = []
+        wave_ids = {}
+
+        for step_pulse_widths, frame_length, repeats in frames:
+
+            key = (step_pulse_widths, frame_length)
+
+            if key not in wave_ids:
+                self.rpi.wave_add_generic(self.frame(step_pulse_widths, frame_length))
+                wave_ids[key] = self.rpi.wave_create()
+
+            wave_id = wave_ids[key]
+
+            if repeats > 1:
+                # loop start, the wave, loop end with a 16-bit repeat count
+                chain.extend([255, 0, wave_id, 255, 1, repeats & 255, repeats >> 8])
+            else:
+                chain.append(wave_id)
+
+        return chain, list(wave_ids.values())
+
+
+    def wait_for_chain(self):
+
+        while self.rpi.wave_tx_busy():
+            sleep(self.poll)
+
+
+    def play(self, pulse_widths, dwells):
+
+        # Plays a sequence of steps. pulse_widths has a row for each step, with a pulse-width for each
+        # pin; dwells has the time in seconds that each step should last. Returns once all the steps
+        # have been played, leaving the servos holding the final pulse-widths.
+
+        pulse_widths = [tuple(step) for step in pulse_widths]
+        frames = list(self.steps_to_frames(pulse_widths, dwells))
+
+        if not frames:
+            return
+
+        # the servo pulses generated by set_servo_pulsewidth() would interfere with the waves
+        for pin in self.pins:
+            self.rpi.set_servo_pulsewidth(pin, 0)
+
+        chunks = [frames[i:i + self.chunk_size] for i in range(0, len(frames), self.chunk_size)]
+
+        chain, wave_ids = self.create_chain(chunks[0])
+
+        for next_chunk in chunks[1:] + [None]:
+
+            self.rpi.wave_chain(chain)
+
+            # prepare the next chunk's waves while this one is being transmitted
+            if next_chunk:
+                next_chain, next_wave_ids = self.create_chain(next_chunk)
+
+            self.wait_for_chain()
+
+            for wave_id in wave_ids:
+                self.rpi.wave_delete(wave_id)
+
+            if next_chunk:
+                chain, wave_ids = next_chain, next_wave_ids
+
+        # hand the pins back to the servo pulse generator, at the last positions
+        for pin, pulse_width in zip(self.pins, pulse_widths[-1]):
+            self.rpi.set_servo_pulsewidth(pin, pulse_width)
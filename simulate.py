@@ -0,0 +1,173 @@
+# A dry run of a plot: how long it will take, and what the servos will be sent, without moving them.
+#
+# simulate() follows the same logic as BrachioGraph.draw_lines() and park(), but instead of sleeping
+# through each step it adds up the time against a virtual clock - and works on whole arrays of moves
+# at once, so even drawings of hundreds of thousands of points take a fraction of a second. The time
+# is split into drawing (moving with the pen down), travel (moving with it up), pen (waiting for the
+# pen servo) and settling (waiting for the arms at the end of each move, and after parking).
+#
+# On real hardware, the plotter waits for the pen servo each time the pen goes up or down - but not
+# when it's already where it should be, so the estimate counts only the pen's actual movements.
+#
+# The estimate is exact but for rounding: the plotter accumulates its steps, so it doesn't always
+# finish a move exactly on its target, and a move that is a whole number of steps long can come out a
+# step shorter than the estimate expects.
+
+import math
+
+import numpy
+
+from drawing import Drawing
+from motion import junction_speeds, profile_durations
+
+
+class PlotEstimate:
+
+    def __init__(self):
+
+        self.drawing_time = self.travel_time = self.pen_time = self.settling_time = 0.0
+        self.drawing_distance = self.travel_distance = 0.0
+        self.drawing_moves = self.travel_moves = 0
+        self.steps = 0
+        self.servo_commands = 0
+        self.pen_lifts = 0
+
+    @property
+    def total_time(self):
+        return self.drawing_time + self.travel_time + self.pen_time + self.settling_time
+
+    def __str__(self):
+
+        def duration(seconds):
+            minutes, seconds = divmod(round(seconds), 60)
+            hours, minutes = divmod(minutes, 60)
+            return f"{hours}:{minutes:02}:{seconds:02}"
+
+        return "\n".join([
+            "               time     moves  distance",
+            f"drawing     {duration(self.drawing_time):>8}  {self.drawing_moves:>8}  {self.drawing_distance:>6.0f}cm",
+            f"travel      {duration(self.travel_time):>8}  {self.travel_moves:>8}  {self.travel_distance:>6.0f}cm",
+            f"pen         {duration(self.pen_time):>8}",
+            f"settling    {duration(self.settling_time):>8}",
+            f"total       {duration(self.total_time):>8}",
+            "",
+            f"{self.steps} steps, {self.servo_commands} servo commands, {self.pen_lifts} pen lifts",
+        ])
+
+
+def simulate(bg, lines, wait, interpolate, park_wait):
+
+    # Estimates plotting lines (already scaled to fit the bounds) with the BrachioGraph bg, starting
+    # from its current position, then parking it - which, like park(), moves at park_wait.
+
+    estimate = PlotEstimate()
+
+    drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+    counts = drawing.lengths
+
+    # Which lines the pen travels to the start of: draw_lines() doesn't bother to move if the pen is
+    # already within 1mm of it. Before each line the pen is at (or, after a single point it didn't
+    # travel to, within 1mm of) the end of the line before.
+
+    starts, ends = drawing.starts.astype(float), drawing.ends.astype(float)
+    previous_ends = numpy.concatenate(([[bg.current_x, bg.current_y]], ends[:-1])).reshape(-1, 2)
+
+    travels = (numpy.round(previous_ends, 1) != numpy.round(starts, 1)).any(axis=1)
+    drawn = counts > 1
+
+    travel_from, travel_to = previous_ends[travels], starts[travels]
+
+    # the pen is left down by a line that has been drawn, and up by a single point travelled to; it's
+    # lifted by every travel it makes while down, and when parking, and lowered by every line drawn
+    # while it's up
+    pen_down = bg.pen.pulse_width == bg.pen.pw_down
+    left_by = numpy.maximum.accumulate(numpy.where(drawn | travels, numpy.arange(len(counts)), -1))
+    pen_down_after = numpy.where(left_by >= 0, drawn[left_by], pen_down)
+    pen_down_before = numpy.concatenate(([pen_down], pen_down_after[:-1]))
+
+    estimate.pen_lifts = int((travels & pen_down_before).sum() + (pen_down_after[-1] if len(counts) else pen_down))
+    pen_lowerings = int((drawn & (travels | ~pen_down_before)).sum())
+
+    # the segments of every line, except that each line's first segment starts from wherever the pen was
+    segment_starts, segment_ends, _ = drawing.segments()
+
+    first_segments = numpy.cumsum(counts[drawn] - 1) - (counts[drawn] - 1)
+    segment_starts[first_segments] = numpy.where(travels[:, None], starts, previous_ends)[drawn]
+
+    # the speeds at which each segment starts and finishes, if there are motion profiles
+    if bg.acceleration and wait:
+        speeds = [junction_speeds(line, 1 / wait, bg.acceleration, bg.junction_deviation) for line in drawing if len(line) > 1]
+        segment_speeds = numpy.array([(a, b) for line_speeds in speeds for a, b in zip(line_speeds, line_speeds[1:])])
+    else:
+        segment_speeds = numpy.zeros((len(segment_starts), 2))
+
+    estimate.drawing_time, estimate.drawing_distance, estimate.drawing_moves = add_moves(
+        estimate, bg, segment_starts, segment_ends, segment_speeds.reshape(-1, 2), wait, interpolate
+    )
+    estimate.travel_time, estimate.travel_distance, estimate.travel_moves = add_moves(
+        estimate, bg, travel_from, travel_to, numpy.zeros_like(travel_to), wait, interpolate
+    )
+
+    # the move back to the parking position, from the end of the last line
+    last_position = ends[-1:] if len(ends) else numpy.array([[bg.current_x, bg.current_y]])
+    parking = add_moves(
+        estimate, bg, last_position, numpy.array([[-bg.INNER_ARM, bg.OUTER_ARM]]), numpy.zeros((1, 2)), park_wait, 10
+    )
+    estimate.travel_time += parking[0]
+    estimate.travel_distance += parking[1]
+    estimate.travel_moves += parking[2]
+
+    # each movement of the pen sends it a pulse-width, and waits for it
+    pen_movements = estimate.pen_lifts + pen_lowerings
+    estimate.pen_time = pen_movements * bg.pen.transition_time
+    estimate.servo_commands += pen_movements
+
+    # park() gives the arms a second to settle
+    estimate.settling_time += 1
+
+    return estimate
+
+
+def add_moves(estimate, bg, starts, ends, speeds, wait, interpolate):
+
+    # Adds the steps, servo commands and settling time of moves from starts to ends to the estimate,
+    # and returns the time spent moving, the distance covered, and the number of moves made.
+
+    lengths = numpy.hypot(*(ends - starts).T) if len(starts) else numpy.zeros(0)
+
+    # a move to where the pen already is doesn't send anything to the servos
+    moving = lengths > 0
+    starts, ends, speeds, lengths = starts[moving], ends[moving], speeds[moving], lengths[moving]
+
+    if bg.tolerance:
+        # adaptive steps can only be found move by move
+        numbers_of_steps, last_steps = [], []
+
+        for (start_x, start_y), (end_x, end_y) in zip(starts.tolist(), ends.tolist()):
+            x_steps, y_steps = bg.adaptive_xy(end_x, end_y, bg.tolerance / 10, start=(start_x, start_y))
+            last_x, last_y = (x_steps[-2], y_steps[-2]) if len(x_steps) > 1 else (start_x, start_y)
+
+            numbers_of_steps.append(len(x_steps))
+            last_steps.append(math.hypot(end_x - last_x, end_y - last_y))
+
+        numbers_of_steps, last_steps = numpy.array(numbers_of_steps, dtype=int), numpy.array(last_steps)
+
+    else:
+        numbers_of_steps = numpy.maximum((lengths * interpolate).astype(int), 1)
+        last_steps = lengths / numbers_of_steps
+
+    estimate.steps += int(numbers_of_steps.sum())
+
+    # each step sends a new pulse-width to both arm servos
+    estimate.servo_commands += 2 * int(numbers_of_steps.sum())
+
+    if bg.acceleration and wait:
+        # the arms accelerate and decelerate, with no need to settle
+        moving_time = profile_durations(lengths, speeds[:, 0], speeds[:, 1], 1 / wait, bg.acceleration).sum()
+
+    else:
+        # every step but the last takes its share of the time; the last is replaced by the settling time
+        moving_time = ((lengths - last_steps) * wait).sum()
+        estimate.settling_time += float((lengths * wait / 10).sum())
+
+    return float(moving_time), float(lengths.sum()), int(len(lengths))
@@ -1,6 +1,15 @@
+import copy
+import json
+import math
+
 import pytest
+import numpy
 
 from brachiograph import BrachioGraph
+from drawing import Drawing
+from drivers import PigpioDriver, RecordingDriver
+from linefile import save_lines
+from plot_program import PlotProgram, hysteresis_corrections
 import linedraw
 
 virtual_bg = BrachioGraph(
@@ -17,6 +26,368 @@ def test_plot_from_file():
     virtual_bg.plot_file("test-patterns/test-pattern.json")
 
 
+def test_plot_from_file_optimised():
+    virtual_bg.plot_file("test-patterns/accuracy.json", optimise=1, merge=0.05)
+
+
+def test_plot_from_line_file(tmp_path):
+    with open("test-patterns/accuracy.json") as line_file:
+        lines = json.load(line_file)
+    save_lines(lines, str(tmp_path / "accuracy.lines"))
+
+    virtual_bg.plot_file(str(tmp_path / "accuracy.lines"))
+
+
+def test_plot_stream_matches_plot_lines():
+    with open("test-patterns/accuracy.json") as line_file:
+        lines = json.load(line_file)
+
+    points = numpy.array([point for line in lines for point in line])
+    extent = (*points.min(axis=0), *points.max(axis=0))
+    chunks = [copy.deepcopy(lines[i:i + 3]) for i in range(0, len(lines), 3)]
+
+    sent = []
+    for plot in (
+        lambda plotter: plotter.plot_lines(copy.deepcopy(lines), flip=True),
+        lambda plotter: plotter.plot_stream(iter(chunks), extent),
+    ):
+        driver = RecordingDriver()
+        plot(BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver))
+        sent.append([driver.sent(pin) for pin in (14, 15, 18)])
+
+    assert sent[0] == sent[1]
+
+
+# ----------------- plot program methods -----------------
+
+@pytest.mark.parametrize("options", [{}, {"tolerance": 0.1}, {"acceleration": 20, "wait": 0.1}])
+def test_compile_lines_matches_plot_lines(options):
+    with open("test-patterns/accuracy.json") as line_file:
+        lines = json.load(line_file)
+
+    driver = RecordingDriver()
+    plotter = BrachioGraph(
+        inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver, **options
+    )
+
+    program = plotter.compile_lines(json.loads(json.dumps(lines)))
+
+    # record the pulse-widths that plotting the same lines sends to the servos
+    driver.clear()
+    plotter.plot_lines(json.loads(json.dumps(lines)))
+    sent = list(zip(driver.sent(14), driver.sent(15)))
+
+    # pen movements are separate records in the program; drop the repeated arm positions
+    arm_pws = program.records[["pw_1", "pw_2"]].tolist()
+    arm_pws = [arm_pws[0]] + [pws for previous, pws in zip(arm_pws, arm_pws[1:]) if pws != previous]
+
+    assert numpy.array(arm_pws) == pytest.approx(numpy.array(sent), abs=1e-3)
+
+
+def test_save_load_and_run_program(tmp_path):
+    program = virtual_bg.compile_file("test-patterns/accuracy.json")
+    program.save(tmp_path / "accuracy.npz")
+
+    loaded = PlotProgram.load(tmp_path / "accuracy.npz")
+
+    assert (loaded.records == program.records).all()
+    assert (loaded.start, loaded.end, loaded.corrections) == (program.start, program.end, program.corrections)
+
+    virtual_bg.run_program(loaded)
+    assert (virtual_bg.current_x, virtual_bg.current_y) == program.end
+
+
+def test_plotting_carries_on_after_run_program():
+    lines = [[[-4, 6], [4, 6], [4, 10]], [[2, 8], [-2, 8]]]
+
+    def state(plotter):
+        return [
+            plotter.current_x, plotter.current_y, plotter.angle_1, plotter.angle_2,
+            plotter.previous_pw_1, plotter.previous_pw_2,
+            plotter.active_hysteresis_correction_1, plotter.active_hysteresis_correction_2,
+            plotter.pen.pulse_width,
+        ]
+
+    states, sent = [], []
+    for run in (True, False):
+        driver = RecordingDriver()
+        plotter = BrachioGraph(
+            inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver,
+            hysteresis_correction_1=10, hysteresis_correction_2=10,
+        )
+        if run:
+            plotter.run_program(plotter.compile_lines(copy.deepcopy(lines)))
+        else:
+            plotter.plot_lines(copy.deepcopy(lines))
+        states.append(state(plotter))
+
+        driver.clear()
+        plotter.xy(0, 8)
+        states.append(state(plotter))
+        sent.append([driver.sent(pin) for pin in (14, 15, 18)])
+
+    # after running the program, the plotter is in the same state as if it had plotted the lines
+    # one step at a time, and its next move sends the same pulse-widths
+    ran, ran_then_moved, plotted, plotted_then_moved = states
+    assert ran == pytest.approx(plotted, abs=1e-3)
+    assert ran_then_moved == pytest.approx(plotted_then_moved, abs=1e-3)
+    assert numpy.array(sent[0][0]) == pytest.approx(numpy.array(sent[1][0]), abs=1e-3)
+    assert numpy.array(sent[0][1]) == pytest.approx(numpy.array(sent[1][1]), abs=1e-3)
+    assert sent[0][2] == sent[1][2] == []
+
+
+def test_hysteresis_corrections():
+    pws = numpy.array([1500, 1510, 1510, 1505, 1505, 1520])
+    corrections = hysteresis_corrections(pws, previous_pw=1500, active_correction=-3, correction=3)
+    assert corrections.tolist() == [-3, 3, 3, -3, -3, 3]
+
+
+# ----------------- waveform output -----------------
+
+class FakePi:
+
+    # stands in for pigpio.pi(), recording the servo pulse-widths and waves it is sent
+
+    def __init__(self):
+        self.servo_pulse_widths = {}
+        self.waves = {}
+        self.pending_pulses = []
+        self.played = []
+
+    def set_mode(self, pin, mode):
+        pass
+
+    def set_PWM_frequency(self, pin, frequency):
+        pass
+
+    def set_servo_pulsewidth(self, pin, pulse_width):
+        self.servo_pulse_widths[pin] = pulse_width
+
+    def get_servo_pulsewidth(self, pin):
+        return self.servo_pulse_widths[pin]
+
+    def wave_add_generic(self, pulses):
+        self.pending_pulses.extend(pulses)
+
+    def wave_create(self):
+        wave_id = max(self.waves, default=-1) + 1
+        self.waves[wave_id], self.pending_pulses = self.pending_pulses, []
+        return wave_id
+
+    def wave_delete(self, wave_id):
+        del self.waves[wave_id]
+
+    def wave_tx_busy(self):
+        return False
+
+    def wave_chain(self, chain):
+        # only the loop construction used by ServoWaves is understood
+        while chain:
+            if chain[0] == 255:
+                wave_id, repeats = chain[2], chain[5] + 256 * chain[6]
+                chain = chain[7:]
+            else:
+                wave_id, repeats, chain = chain[0], 1, chain[1:]
+            self.played.extend([self.waves[wave_id]] * repeats)
+
+    def played_frames(self, pins):
+        # decode each played wave back into the pulse-width of each pin and the frame length
+        frames = []
+        for pulses in self.played:
+            elapsed, pulse_widths = 0, {}
+            for pulse in pulses:
+                for pin in pins:
+                    if pulse.gpio_off & 1 << pin:
+                        pulse_widths[pin] = elapsed
+                elapsed = elapsed + pulse.delay
+            frames.append((tuple(pulse_widths[pin] for pin in pins), elapsed))
+        return frames
+
+
+def test_servo_waves_play():
+    servo_waves = pytest.importorskip("servo_waves")
+
+    rpi = FakePi()
+    waves = servo_waves.ServoWaves(rpi, pins=(14, 15), chunk_size=3)
+    waves.play([(1500, 1400), (1510, 1510), (1520, 1600), (1530, 1610)], [0.01, 0.01, 0.015, 0.06])
+
+    assert rpi.played_frames((14, 15)) == [
+        ((1500, 1400), 10000),
+        ((1510, 1510), 10000),
+        ((1520, 1600), 15000),
+        ((1530, 1610), 20000), ((1530, 1610), 20000), ((1530, 1610), 20000),
+    ]
+
+    # all the waves have been cleaned up, and the servos are left holding the last position
+    assert rpi.waves == {}
+    assert rpi.servo_pulse_widths == {14: 1530, 15: 1610}
+
+
+@pytest.mark.parametrize("dwell", [0.01, 0.015, 0.02, 0.025, 0.03, 0.0333333, 0.1234567, 0.5])
+def test_servo_waves_keep_step_timing(dwell):
+    servo_waves = pytest.importorskip("servo_waves")
+
+    waves = servo_waves.ServoWaves(FakePi())
+    frames = list(waves.steps_to_frames([(1500, 1500)], [dwell]))
+
+    played = sum(frame_length * repeats for _, frame_length, repeats in frames)
+    assert played == pytest.approx(dwell * 1000000, abs=1)
+    assert all(waves.min_frame <= frame_length <= waves.max_frame for _, frame_length, _ in frames)
+
+
+def test_waveform_moves():
+    pytest.importorskip("pigpio")
+
+    rpi = FakePi()
+    plotter = BrachioGraph(
+        inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), driver=PigpioDriver(rpi=rpi, waveforms=True)
+    )
+    plotter.xy(-3, 10)
+    plotter.draw(3, 10)
+
+    (pw_1, pw_2) = plotter.angles_to_pulse_widths(*plotter.xy_to_angles(3, 10))
+    assert rpi.played_frames((14, 15))[-1][0] == (round(pw_1), round(pw_2))
+    assert (plotter.current_x, plotter.current_y) == pytest.approx((3, 10))
+
+
+def test_waveforms_play_whole_lines(monkeypatch):
+    pytest.importorskip("pigpio")
+
+    rpi = FakePi()
+    driver = PigpioDriver(rpi=rpi, waveforms=True)
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), driver=driver, wiggle_pen=False)
+    monkeypatch.setattr("brachiograph.sleep", lambda seconds: None)
+
+    plays, play = [], driver.play
+    monkeypatch.setattr(driver, "play", lambda *args: (plays.append(len(args[1])), play(*args)))
+
+    plotter.draw_lines([[[-3, 10], [0, 10], [3, 10], [3, 8]]], interpolate=2)
+
+    # one move to the start of the line, and one for the whole line: 6 + 6 + 4 steps
+    assert len(plays) == 2
+    assert plays[1] == 16
+
+    (pw_1, pw_2) = plotter.angles_to_pulse_widths(*plotter.xy_to_angles(3, 8))
+    assert rpi.played_frames((14, 15))[-1][0] == (round(pw_1), round(pw_2))
+    assert (plotter.current_x, plotter.current_y) == pytest.approx((3, 8))
+
+
+# ----------------- drivers -----------------
+
+def test_recording_driver_servo_traffic():
+    driver = RecordingDriver()
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver)
+
+    # the pen shares the plotter's driver
+    assert plotter.pen.driver is driver
+
+    plotter.xy(-8, 8)
+    driver.clear()
+    plotter.draw(-7, 8, interpolate=2)
+
+    (pw_1, pw_2) = plotter.angles_to_pulse_widths(*plotter.xy_to_angles(-7, 8))
+
+    assert driver.sent(18) == [1100]
+    assert len(driver.sent(14)) == len(driver.sent(15)) == 2
+    assert (driver.sent(14)[-1], driver.sent(15)[-1]) == pytest.approx((pw_1, pw_2))
+    assert plotter.get_pulse_widths() == (driver.sent(14)[-1], driver.sent(15)[-1])
+
+
+def test_pen_only_moves_between_lines(monkeypatch):
+    driver = RecordingDriver()
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver)
+    pen = plotter.pen
+
+    # a pen that waits for its servo, as it would on real hardware
+    sleeps = []
+    monkeypatch.setattr("brachiograph.sleep", sleeps.append)
+    pen.virtual_mode = False
+
+    driver.clear()
+    # the second line carries on from the end of the first; the third has to be travelled to
+    plotter.draw_lines([[[-4, 6], [-2, 6], [0, 6], [2, 6]], [[2, 6], [2, 8], [2, 10]], [[-4, 10], [-2, 10]]])
+
+    assert driver.sent(18) == [pen.pw_down, pen.pw_up, pen.pw_down]
+    assert sleeps == [pen.transition_time] * 3
+
+
+def test_recording_driver_ring_buffer():
+    driver = RecordingDriver(size=3)
+    for pulse_width in [1000, 1100, 1200, 1300]:
+        driver.set_pulse_width(14, pulse_width)
+
+    assert driver.sent(14) == [1100, 1200, 1300]
+
+
+def test_virtual_driver_rejects_unsafe_pulse_widths():
+    with pytest.raises(ValueError):
+        virtual_bg.set_pulse_widths(2600, 1500)
+
+
+# ----------------- line-processing methods -----------------
+
+def test_rotate_and_scale_lines():
+    lines = [[[0, 0], [100, 0]], [[100, 50], [0, 50]]]
+
+    scaled = virtual_bg.rotate_and_scale_lines(lines, bounds=(-6, 4, 6, 12))
+
+    assert isinstance(scaled, Drawing)
+    assert scaled.to_lines() == [[[-6, 5], [6, 5]], [[6, 11], [-6, 11]]]
+
+    # the lines passed in aren't changed
+    assert lines == [[[0, 0], [100, 0]], [[100, 50], [0, 50]]]
+
+
+def test_rotate_and_scale_lines_rotates_and_flips():
+    # tall lines are rotated to fit wide bounds
+    drawing = Drawing.from_lines([[[0, 0], [0, 100]], [[50, 100], [50, 0]]])
+
+    scaled = virtual_bg.rotate_and_scale_lines(drawing, bounds=(-6, 4, 6, 12))
+    assert scaled.to_lines() == [[[6, 5], [-6, 5]], [[-6, 11], [6, 11]]]
+
+    flipped = virtual_bg.rotate_and_scale_lines(drawing, bounds=(-6, 4, 6, 12), flip=True)
+    assert flipped.to_lines() == [[[-6, 5], [6, 5]], [[6, 11], [-6, 11]]]
+
+
+def test_lines_can_be_plotted_again():
+    with open("test-patterns/accuracy.json") as line_file:
+        lines = json.load(line_file)
+    original = copy.deepcopy(lines)
+
+    sent = []
+    for i in range(2):
+        driver = RecordingDriver()
+        plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver)
+        plotter.plot_lines(lines, flip=True)
+        sent.append(driver.sent(14))
+
+    assert sent[0] == sent[1]
+    assert lines == original
+
+
+def test_prepare_lines_returns_a_drawing(tmp_path):
+    with open("test-patterns/accuracy.json") as line_file:
+        lines = json.load(line_file)
+    save_lines(lines, str(tmp_path / "accuracy.lines"))
+
+    drawing = Drawing.load(str(tmp_path / "accuracy.lines"))
+    prepared = virtual_bg.prepare_lines(drawing, bounds=(-6, 4, 6, 12), optimise=0.1)
+
+    assert isinstance(prepared, Drawing)
+    assert len(prepared) == len(lines)
+
+
+def test_prepare_lines_counts_only_pen_lifts_saved(capsys):
+    # the first two lines already touch, so joining them saves nothing; once the lines are scaled to
+    # the bounds, the third starts about 2mm from the end of the second
+    lines = [[[0, 0], [100, 0]], [[100, 0], [100, 50]], [[101.7, 50], [0, 50]]]
+
+    merged = virtual_bg.prepare_lines(lines, bounds=(-6, 4, 6, 12), merge=0.25)
+
+    assert len(merged) == 1
+    assert "Merged 3 lines into 1, saving 1 pen lifts" in capsys.readouterr().out
+
+
 # ----------------- test pattern methods -----------------
 
 def test_test_pattern():
@@ -38,6 +409,120 @@ def test_centre():
     virtual_bg.park()
 
 
+# ----------------- vectorised kinematics -----------------
+
+def test_xy_to_angles_array_matches_scalar():
+    xs = numpy.linspace(-6, 6, 25)
+    ys = numpy.linspace(4, 12, 25)
+
+    angles_1, angles_2 = virtual_bg.xy_to_angles_array(xs, ys)
+
+    for x, y, angle_1, angle_2 in zip(xs, ys, angles_1, angles_2):
+        assert (angle_1, angle_2) == pytest.approx(virtual_bg.xy_to_angles(x, y), abs=1e-9)
+
+
+def test_xy_to_angles_array_out_of_reach():
+    with pytest.raises(Exception):
+        virtual_bg.xy_to_angles_array([0, -10.2], [8, 13.85])
+
+
+def test_interpolate_xy_matches_repeated_addition():
+    virtual_bg.current_x, virtual_bg.current_y = -8, 8
+    x_steps, y_steps = virtual_bg.interpolate_xy(3.3, 9.7, 117)
+
+    x, y = -8, 8
+    for step in range(117):
+        x = x + (3.3 - -8) / 117
+        y = y + (9.7 - 8) / 117
+        assert (x_steps[step], y_steps[step]) == (x, y)
+
+
+def test_angles_to_xy_array_matches_scalar():
+    angles_1, angles_2 = virtual_bg.xy_to_angles_array(numpy.linspace(-6, 6, 25), numpy.linspace(4, 12, 25))
+
+    xs, ys = virtual_bg.angles_to_xy_array(angles_1, angles_2)
+
+    for x, y, angle_1, angle_2 in zip(xs, ys, angles_1, angles_2):
+        assert (x, y) == pytest.approx(virtual_bg.angles_to_xy(angle_1, angle_2), abs=1e-9)
+
+
+# ----------------- adaptive interpolation -----------------
+
+def test_adaptive_steps_stay_within_tolerance():
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-8, 4, 8, 15), virtual_mode=True, tolerance=0.1)
+
+    for start, end in [((-8, 4), (8, 4)), ((-7, 14), (7, 14)), ((-2, 6), (2, 6)), ((-5, 13), (3, 8))]:
+        x_steps, y_steps, dwells = plotter.steps(*end, wait=0.1, interpolate=10, start=start)
+
+        assert (x_steps[-1], y_steps[-1]) == end
+        assert len(x_steps) < math.hypot(end[0] - start[0], end[1] - start[1]) * 10
+
+        # follow the arms through each step, in angle space, and measure how far the pen strays
+        angles_1, angles_2 = plotter.xy_to_angles_array(numpy.r_[start[0], x_steps], numpy.r_[start[1], y_steps])
+        fractions = numpy.linspace(0, 1, 51)[:, None]
+        xs, ys = plotter.angles_to_xy_array(
+            angles_1[:-1] + fractions * numpy.diff(angles_1), angles_2[:-1] + fractions * numpy.diff(angles_2)
+        )
+
+        x_length, y_length = end[0] - start[0], end[1] - start[1]
+        deviations = numpy.abs(x_length * (ys - start[1]) - y_length * (xs - start[0])) / math.hypot(x_length, y_length)
+
+        assert deviations.max() <= 0.01 * 1.05
+
+
+def test_adaptive_dwells():
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, virtual_mode=True, tolerance=0.1)
+    x_steps, y_steps, dwells = plotter.steps(6, 12, wait=0.1, interpolate=10, start=(-6, 12))
+
+    # the arms wait in proportion to the length of each step, and settle at the end
+    step_lengths = numpy.hypot(numpy.diff(x_steps, prepend=-6), numpy.diff(y_steps, prepend=12))
+    assert dwells[:-1] == pytest.approx(step_lengths[:-1] * 0.1)
+    assert dwells[-1] == pytest.approx(12 * 0.1 / 10)
+
+
+# ----------------- motion profiles -----------------
+
+def test_motion_profile_timeline():
+    # top speed 5cm/s; accelerating at 10cm/s² it takes 0.5s and 1.25cm to get there, and as long to stop
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, virtual_mode=True, wait=0.2, acceleration=10)
+
+    x_steps, y_steps, dwells = plotter.steps(10, 8, wait=0.2, interpolate=1, start=(0, 8))
+
+    assert x_steps.tolist() == pytest.approx(list(range(1, 11)))
+    assert numpy.cumsum(dwells).tolist() == pytest.approx(
+        [0.4472136, 0.65, 0.85, 1.05, 1.25, 1.45, 1.65, 1.85, 2.0527864, 2.5]
+    )
+
+
+def test_motion_profile_short_move():
+    # too short to reach top speed: accelerate for half the move, then decelerate
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, virtual_mode=True, wait=0.2, acceleration=10)
+
+    x_steps, y_steps, dwells = plotter.steps(1, 8, wait=0.2, interpolate=10, start=(0, 8))
+
+    assert dwells.sum() == pytest.approx(2 * math.sqrt(2 * 0.5 / 10))
+    assert dwells[0] == dwells.max()
+    assert dwells[5] == dwells.min()
+
+
+def test_motion_profile_looks_ahead():
+    def duration(lines, **kwargs):
+        plotter = BrachioGraph(
+            inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, wait=0.2, **kwargs
+        )
+        return plotter.compile_lines(lines).duration
+
+    straight = [[[0, 0], [4, 0]]]
+    divided = [[[0, 0], [1, 0], [2, 0], [3, 0], [4, 0]]]
+    gentle = [[[0, 0], [2, 0], [4, 0.2]]]
+    corner = [[[0, 0], [2, 0], [2, 2]]]
+
+    # the pen runs straight through points where the line doesn't change direction, and
+    # slows down more for sharp corners than gentle ones
+    assert duration(divided, acceleration=10) == pytest.approx(duration(straight, acceleration=10), abs=1e-3)
+    assert duration(gentle, acceleration=10) < duration(corner, acceleration=10)
+
+
 # ----------------- reporting methods -----------------
 
 def test_report():
@@ -0,0 +1,87 @@
+import numpy
+import pytest
+
+from brachiograph import BrachioGraph
+import calibration
+from calibration import Calibration, calibration_key
+
+
+servo_1_angle_pws = [
+    [-162, 2470], [-144, 2250], [-126, 2050], [-108, 1860], [-90, 1690], [-72, 1530],
+    [-54, 1350], [-36, 1190], [-18, 1010], [0, 840], [18, 640],
+]
+
+
+# ----------------- evaluation -----------------
+
+def test_calibration_matches_poly1d():
+    measurements = numpy.array(servo_1_angle_pws, dtype=float)
+    poly = numpy.poly1d(numpy.polyfit(measurements[:, 0], measurements[:, 1], 3))
+    fitted = Calibration.fit(servo_1_angle_pws)
+
+    angles = numpy.random.default_rng(18).uniform(-170, 30, 1000)
+
+    assert numpy.array_equal(fitted(angles), poly(angles))
+    assert [fitted(angle) for angle in angles.tolist()] == [poly(angle) for angle in angles.tolist()]
+
+
+def test_angle_range_and_inverse():
+    fitted = Calibration.fit(servo_1_angle_pws)
+
+    assert fitted.angle_range == (-162, 18)
+    assert fitted.inverse_pulse_widths == sorted(fitted.inverse_pulse_widths)
+
+    for angle in (-160, -90, -45.5, 0, 17):
+        assert fitted.angle(fitted(angle)) == pytest.approx(angle, abs=0.01)
+
+    with pytest.raises(ValueError):
+        fitted.angle(3000)
+
+
+def test_calibration_without_inverse():
+    # pulse-widths that go up and then down again can't be turned back into angles
+    fitted = Calibration.fit([[-90, 1000], [-45, 1500], [0, 1700], [45, 1500], [90, 1000]])
+
+    assert fitted.inverse_pulse_widths == []
+    with pytest.raises(ValueError):
+        fitted.angle(1200)
+
+
+# ----------------- caching -----------------
+
+def test_cached_calibration(tmp_path, monkeypatch):
+    monkeypatch.setattr(calibration, "fitted", {})
+
+    first = Calibration.cached(servo_1_angle_pws, tmp_path)
+    assert Calibration.cached(servo_1_angle_pws, tmp_path) is first
+
+    files = list(tmp_path.iterdir())
+    assert [path.name for path in files] == [f"calibration-{calibration_key(servo_1_angle_pws)}.json"]
+
+    # a new process would load the calibration rather than fitting it again
+    monkeypatch.setattr(calibration, "fitted", {})
+    monkeypatch.setattr(Calibration, "fit", None)
+
+    loaded = Calibration.cached(servo_1_angle_pws, tmp_path)
+    assert loaded.coefficients == first.coefficients
+    assert loaded.angle_range == first.angle_range
+    assert loaded.inverse_angles == first.inverse_angles
+    assert loaded(-45.3) == first(-45.3)
+
+
+def test_calibration_key():
+    key = calibration_key(servo_1_angle_pws)
+
+    assert calibration_key([tuple(pair) for pair in servo_1_angle_pws]) == key
+    assert calibration_key(servo_1_angle_pws, degree=2) != key
+    assert calibration_key(servo_1_angle_pws[:-1]) != key
+
+
+def test_brachiograph_uses_calibration_cache(tmp_path):
+    bg = BrachioGraph(
+        inner_arm=8, outer_arm=8, virtual_mode=True,
+        servo_1_angle_pws=servo_1_angle_pws, calibration_cache=tmp_path,
+    )
+
+    assert isinstance(bg.angles_to_pw_1, Calibration)
+    assert bg.angles_to_pw_2 == bg.naive_angles_to_pulse_widths_2
@@ -0,0 +1,99 @@
+import json
+
+import numpy
+import pytest
+
+from drawing import Drawing
+
+
+lines = [
+    [[0, 0], [10.25, 0], [10.25, 20.5]],
+    [[-3, 4]],
+    [[1, 1], [2, 2], [3, 1], [4, 2]],
+    [[5, -5], [6, 6]],
+]
+
+
+def test_lines_round_trip():
+    drawing = Drawing.from_lines(lines)
+
+    assert drawing.points.shape == (10, 2)
+    assert drawing.offsets.tolist() == [0, 3, 4, 8, 10]
+    assert drawing.to_lines() == lines
+
+
+def test_points_with_extra_values():
+    drawing = Drawing.from_lines([[[0, 1, 5], [2, 3, 5]], [[4, 5, 5]]])
+
+    assert drawing.to_lines() == [[[0, 1], [2, 3]], [[4, 5]]]
+
+
+def test_empty_drawing():
+    drawing = Drawing.from_lines([])
+
+    assert len(drawing) == 0
+    assert drawing.to_lines() == []
+    assert list(drawing) == []
+
+
+def test_iteration_and_indexing():
+    drawing = Drawing.from_lines(lines)
+
+    assert len(drawing) == 4
+    assert [line.tolist() for line in drawing] == lines
+    assert drawing[-1].tolist() == lines[-1]
+
+    with pytest.raises(IndexError):
+        drawing[4]
+
+
+def test_slicing():
+    drawing = Drawing.from_lines(lines)
+
+    assert drawing[1:3].to_lines() == lines[1:3]
+    assert drawing[::-2].to_lines() == lines[::-2]
+    assert drawing[3:1].to_lines() == []
+
+    # consecutive lines share the points of the original
+    assert numpy.shares_memory(drawing[1:3].points, drawing.points)
+
+
+def test_reorder_and_reverse():
+    drawing = Drawing.from_lines(lines)
+
+    assert drawing.reorder([2, 0], reverse=[True, False]).to_lines() == [lines[2][::-1], lines[0]]
+    assert drawing.reversed().to_lines() == [line[::-1] for line in lines[::-1]]
+
+
+def test_starts_ends_and_bounds():
+    drawing = Drawing.from_lines(lines)
+
+    assert drawing.starts.tolist() == [line[0] for line in lines]
+    assert drawing.ends.tolist() == [line[-1] for line in lines]
+    assert drawing.lengths.tolist() == [3, 1, 4, 2]
+    assert drawing.bounds() == (-3, -5, 10.25, 20.5)
+
+
+def test_segments():
+    drawing = Drawing.from_lines(lines)
+    starts, ends, line_indices = drawing.segments()
+
+    expected = [(line[i], line[i + 1], index) for index, line in enumerate(lines) for i in range(len(line) - 1)]
+
+    assert list(zip(starts.tolist(), ends.tolist(), line_indices.tolist())) == expected
+
+
+def test_invalid_offsets():
+    with pytest.raises(ValueError):
+        Drawing([[0, 0], [1, 1]], [0, 1])
+
+
+def test_save_and_load(tmp_path):
+    drawing = Drawing.from_lines(lines)
+    drawing.save(str(tmp_path / "drawing.lines"))
+
+    with open(tmp_path / "drawing.json", "w") as json_file:
+        json.dump(lines, json_file)
+
+    assert Drawing.load(str(tmp_path / "drawing.lines")).to_lines() == lines
+    assert Drawing.load(str(tmp_path / "drawing.json")).to_lines() == lines
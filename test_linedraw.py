@@ -0,0 +1,221 @@
+import concurrent.futures
+
+import numpy
+import pytest
+from PIL import Image, ImageOps
+
+import linedraw
+import linedraw_reference
+
+
+def random_edges(width, height, seed=0):
+
+    # a black and white image like the ones find_edges() produces
+    rng = numpy.random.default_rng(seed)
+    pixels = rng.random((height, width)) < rng.uniform(0.05, 0.5)
+    return Image.fromarray(pixels.astype(numpy.uint8) * 255)
+
+
+def random_image(width, height, seed=0):
+
+    # an image with a mixture of brightnesses in each of the hatching bands, with runs of similar values
+    rng = numpy.random.default_rng(seed)
+    levels = rng.choice([0, 10, 20, 50, 70, 100, 150, 200, 255], size=(height, width))
+    return Image.fromarray(numpy.sort(levels, axis=1).astype(numpy.uint8))
+
+
+# ----------------- hatching tests -----------------
+
+@pytest.mark.parametrize("width, height, seed", [(1, 1, 0), (17, 5, 1), (5, 17, 2), (30, 30, 3)])
+@pytest.mark.parametrize("draw_hatch", [16, 8, 2.5])
+def test_hatch_matches_reference(width, height, seed, draw_hatch):
+    image = random_image(width, height, seed)
+
+    assert linedraw.hatch(image, draw_hatch) == linedraw_reference.hatch(image, draw_hatch)
+
+
+def test_hatch_matches_reference_on_photo():
+    image = ImageOps.autocontrast(Image.open("images/africa.jpg").convert("L"), 10).resize((48, 48))
+
+    assert linedraw.hatch(image, 16) == linedraw_reference.hatch(image, 16)
+
+
+def test_hatch_runs():
+    # a dark 3x3 square in a white image, with one light grey pixel
+    pixels = numpy.full((5, 5), 255, dtype=numpy.uint8)
+    pixels[1:4, 1:4] = 0
+    pixels[1, 3] = 100
+    lines = linedraw.hatch(Image.fromarray(pixels), 4)
+
+    assert lines == [
+        [(4, 5.0), (16, 5.0)],      # each row gets a single horizontal line...
+        [(4, 7.0), (12, 7.0)],      # ...and the dark pixels a second one
+        [(4, 9.0), (16, 9.0)],
+        [(4, 11.0), (16, 11.0)],
+        [(4, 13.0), (16, 13.0)],
+        [(4, 15.0), (16, 15.0)],
+        [(8, 4), (4, 8)],           # the diagonals leave out the light grey pixel
+        [(12, 4), (4, 12)],
+        [(12, 8), (4, 16)],
+        [(16, 8), (8, 16)],
+        [(16, 12), (12, 16)],
+    ]
+
+
+# ----------------- contour tests -----------------
+
+@pytest.mark.parametrize("seed", range(20))
+def test_getdots_matches_reference(seed):
+    image = random_edges(25, 20, seed)
+
+    assert linedraw.getdots(image) == linedraw_reference.getdots(image)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_connectdots_matches_reference(seed):
+    dots = linedraw.getdots(random_edges(20, 25, seed))
+    contours = linedraw.connectdots(dots)
+
+    # the reference version misses some of the short contours it should drop, as it removes them from
+    # the list it's looping over
+    expected = [c for c in linedraw_reference.connectdots(dots) if len(c) >= 4 or c[-1][1] >= len(dots)-2]
+
+    assert contours == expected
+
+
+def test_connectdots():
+    dots = [
+        [(1, 0), (10, 0)],
+        [(3, 0), (8, 0)],   # continues the contour above 2 to the left, not the one 2 to the right
+        [(4, 1)],
+        [(3, 0), (5, 0)],   # the second run is as close to (4, 1), but that's been continued already
+        [(2, 0)],
+        [(20, 0)],          # too far from (2, 0) to continue its contour
+        [(20, 0)],
+    ]
+
+    # the contours starting at (10, 0) and (5, 3) are dropped as too short
+    assert linedraw.connectdots(dots) == [
+        [(1, 0), (3, 1), (4, 2), (3, 3), (2, 4)],
+        [(20, 5), (20, 6)],
+    ]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_join_contours_matches_reference(seed):
+    rng = numpy.random.default_rng(seed)
+    contours = [
+        [tuple(point) for point in rng.integers(0, 60, (rng.integers(1, 5), 2)).tolist()]
+        for i in range(50)
+    ]
+
+    assert linedraw.join_contours(contours) == linedraw_reference.join_contours(contours)
+
+
+def test_join_contours():
+    contours = [
+        [(0, 0), (10, 0)],
+        [(30, 0), (40, 0)],
+        [(13, 0), (20, 0)],     # joins the end of the first contour...
+        [(25, 0), (28, 0)],     # ...and then this does, but the second one comes before it, so doesn't
+        [(50, 50), (52, 52)],   # ends close enough to its own start to be dropped
+    ]
+
+    assert linedraw.join_contours(contours) == [
+        [(0, 0), (10, 0), (13, 0), (20, 0), (25, 0), (28, 0)],
+        [(30, 0), (40, 0)],
+    ]
+
+    assert linedraw.join_contours(contours, join_distance=2) == contours
+
+
+# ----------------- edge detection tests -----------------
+
+@pytest.mark.parametrize("masks", [
+    [linedraw.F_SobelX, linedraw.F_SobelY],
+    [linedraw.F_Blur],
+    [linedraw.F_SobelX, linedraw.F_Blur],
+])
+@pytest.mark.parametrize("width, height, seed", [(1, 1, 0), (2, 9, 1), (9, 2, 2), (25, 20, 3)])
+def test_appmask_matches_reference(masks, width, height, seed):
+    rng = numpy.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 256, (height, width)).astype(numpy.uint8))
+    reference_image = image.copy()
+
+    linedraw.appmask(image, masks)
+    linedraw_reference.appmask(reference_image, masks)
+
+    assert image.tobytes() == reference_image.tobytes()
+
+
+def test_appmask_sobel():
+    # a vertical edge gives the maximum response, clipped to 255, either side of it
+    pixels = numpy.zeros((5, 6), dtype=numpy.uint8)
+    pixels[:, 3:] = 255
+    image = Image.fromarray(pixels)
+
+    linedraw.appmask(image, [linedraw.F_SobelX, linedraw.F_SobelY])
+
+    assert numpy.asarray(image)[2].tolist() == [0, 0, 255, 255, 0, 255]
+
+
+# ----------------- tiled vectorisation tests -----------------
+
+@pytest.mark.parametrize("tiles", [1, 2, 3, 7])
+@pytest.mark.parametrize("draw_hatch", [16, 2.5])
+def test_tiled_hatch_matches_hatch(tiles, draw_hatch):
+    image = random_image(20, 31, seed=tiles)
+
+    assert linedraw.tiled_hatch(image, draw_hatch, tiles=tiles) == linedraw.hatch(image, draw_hatch)
+
+
+def test_tiled_getcontours():
+    image = ImageOps.autocontrast(Image.open("images/africa.jpg").convert("L"), 10).resize((256, 256))
+    contours = linedraw.getcontours(image.copy(), 2)
+
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        tiled_contours = linedraw.tiled_getcontours(image.copy(), 2, executor, tiles=4)
+
+    # contours crossing between tiles are joined up again, so there should be few differences
+    assert len(tiled_contours) == pytest.approx(len(contours), rel=0.05)
+    assert sum(map(len, tiled_contours)) == pytest.approx(sum(map(len, contours)), rel=0.05)
+
+
+def test_vectorise_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(linedraw, "svg_folder", f"{tmp_path}/")
+
+    lines = linedraw.vectorise("africa.jpg", resolution=256, draw_hatch=16)
+
+    assert linedraw.vectorise("africa.jpg", resolution=256, draw_hatch=16, workers=2) == lines
+
+
+# ----------------- streaming tests -----------------
+
+def test_vectorise_stream_matches_vectorise(tmp_path, monkeypatch):
+    monkeypatch.setattr(linedraw, "svg_folder", f"{tmp_path}/")
+    options = dict(resolution=256, draw_contours=2, draw_hatch=16, repeat_hatch=2)
+
+    lines = linedraw.vectorise("africa.jpg", **options)
+    extent, chunks = linedraw.vectorise_stream("africa.jpg", chunk_size=10, **options)
+    chunks = list(chunks)
+
+    assert [line for chunk in chunks for line in chunk] == lines
+    assert max(len(chunk) for chunk in chunks) == 10
+    assert extent[2] == 256
+
+    for line in lines:
+        for x, y in line:
+            assert 0 <= x <= extent[2] and 0 <= y <= extent[3]
+
+
+def test_prefetch():
+    assert list(linedraw.prefetch(iter(range(5)))) == [0, 1, 2, 3, 4]
+
+    def failing():
+        yield 1
+        raise ValueError("failed")
+
+    items = linedraw.prefetch(failing())
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
@@ -0,0 +1,79 @@
+import json
+
+import numpy
+import pytest
+
+from drawing import Drawing
+from linefile import save_lines, load_lines, read_lines, write_lines, is_line_file
+
+
+lines = [
+    [[0, 0], [10.25, 0], [10.25, 20.5]],
+    [[-3, 4]],
+    [[1, 1], [2, 2]],
+]
+
+
+def test_save_and_read_lines(tmp_path):
+    filename = str(tmp_path / "drawing.lines")
+    save_lines(lines, filename)
+
+    assert is_line_file(filename)
+    assert read_lines(filename).to_lines() == lines
+
+
+def test_read_lines_does_not_copy_points(tmp_path):
+    filename = str(tmp_path / "drawing.lines")
+    save_lines(lines, filename)
+
+    drawing = read_lines(filename)
+
+    # the points are still the read-only float32 values mapped from the file
+    assert isinstance(drawing, Drawing)
+    assert drawing.points.dtype == numpy.float32 and not drawing.points.flags.writeable
+
+
+def test_load_lines_is_memory_mapped(tmp_path):
+    filename = str(tmp_path / "drawing.lines")
+    save_lines(lines, filename)
+
+    points, offsets = load_lines(filename)
+
+    assert isinstance(points, numpy.memmap) and isinstance(offsets, numpy.memmap)
+    assert points.dtype == numpy.float32 and points.shape == (6, 2)
+    assert offsets.tolist() == [0, 3, 4, 6]
+
+
+def test_read_lines_always_returns_a_drawing(tmp_path):
+    write_lines(lines, str(tmp_path / "drawing.json"))
+
+    drawing = read_lines(str(tmp_path / "drawing.json"))
+
+    assert isinstance(drawing, Drawing)
+    assert drawing.to_lines() == lines
+
+
+def test_empty_line_file(tmp_path):
+    filename = str(tmp_path / "empty.lines")
+    save_lines([], filename)
+
+    assert read_lines(filename).to_lines() == []
+
+
+def test_write_lines_chooses_format(tmp_path):
+    write_lines(lines, str(tmp_path / "drawing.json"))
+    write_lines(lines, str(tmp_path / "drawing.lines"))
+
+    with open(tmp_path / "drawing.json") as json_file:
+        assert json.load(json_file) == lines
+
+    assert not is_line_file(str(tmp_path / "drawing.json"))
+    assert read_lines(str(tmp_path / "drawing.json")).to_lines() == read_lines(str(tmp_path / "drawing.lines")).to_lines()
+
+
+def test_load_lines_rejects_other_files(tmp_path):
+    filename = str(tmp_path / "drawing.json")
+    write_lines(lines, filename)
+
+    with pytest.raises(ValueError):
+        load_lines(filename)
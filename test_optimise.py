@@ -0,0 +1,101 @@
+import random
+
+from drawing import Drawing
+import optimise
+import linedraw
+
+
+def random_lines(number, seed=0):
+    generator = random.Random(seed)
+    lines = []
+    for i in range(number):
+        x, y = generator.uniform(0, 1000), generator.uniform(0, 1000)
+        lines.append([(x, y), (x + generator.uniform(-20, 20), y + generator.uniform(-20, 20))])
+    return lines
+
+
+# ----------------- stroke ordering -----------------
+
+def test_sort_lines_keeps_every_line():
+    lines = random_lines(500)
+    sorted_lines = optimise.sort_lines(lines)
+
+    assert sorted_lines[0] == lines[0]
+    assert sorted(map(sorted, sorted_lines)) == sorted(map(sorted, lines))
+
+
+def test_sort_lines_reduces_pen_up_distance():
+    lines = random_lines(500)
+    sorted_lines = linedraw.sortlines(lines)
+
+    assert optimise.pen_up_distance(sorted_lines) < optimise.pen_up_distance(lines) / 10
+
+
+def test_sort_lines_reverses_lines():
+    lines = [[(0, 0), (10, 0)], [(30, 0), (20, 0)], [(10, 1), (19, 1)]]
+    assert optimise.sort_lines(lines) == [[(0, 0), (10, 0)], [(10, 1), (19, 1)], [(20, 0), (30, 0)]]
+
+
+def test_sort_lines_is_never_worse():
+    lines = [[(0, 0), (1, 0)], [(1, 0), (2, 0)], [(2, 0), (3, 0)]]
+    assert optimise.sort_lines(lines) == lines
+
+
+def test_improve_order_reduces_pen_up_distance():
+    sorted_lines = optimise.sort_lines(random_lines(1000))
+    improved_lines = optimise.improve_order(sorted_lines, time_limit=5)
+
+    assert improved_lines[0] == sorted_lines[0]
+    assert sorted(map(sorted, improved_lines)) == sorted(map(sorted, sorted_lines))
+    assert optimise.pen_up_distance(improved_lines) < optimise.pen_up_distance(sorted_lines) * 0.9
+
+
+def test_improve_order_fixes_a_crossing():
+    lines = [[(0, 0), (1, 0)], [(3, 0), (4, 0)], [(2, 0), (1.5, 0)], [(5, 0), (6, 0)]]
+    assert optimise.improve_order(lines) == [[(0, 0), (1, 0)], [(1.5, 0), (2, 0)], [(3, 0), (4, 0)], [(5, 0), (6, 0)]]
+
+
+def test_ordering_a_drawing():
+    lines = random_lines(500)
+    drawing = Drawing.from_lines(lines)
+
+    sorted_drawing = optimise.sort_lines(drawing)
+    assert isinstance(sorted_drawing, Drawing)
+    assert sorted_drawing.to_lines() == [list(map(list, line)) for line in optimise.sort_lines(lines)]
+
+    improved_drawing = optimise.improve_order(sorted_drawing, time_limit=1)
+    assert isinstance(improved_drawing, Drawing)
+    assert optimise.pen_up_distance(improved_drawing) <= optimise.pen_up_distance(sorted_drawing)
+
+
+# ----------------- merging lines -----------------
+
+def test_merge_lines():
+    lines = [
+        [(0, 0), (1, 0)],
+        [(5, 5), (6, 6)],
+        [(1, 1), (1, 0)],       # ends at the end of the first line, so is reversed and joined on
+        [(-1, 0), (0, 0)],      # ends at the start of the first line, so goes in front of it
+        [(1.01, 1), (3, 1)],    # starts within tolerance of the end of the third
+    ]
+
+    # (0, 0) and (1, 1) lie on straight lines between their neighbours, so are dropped
+    assert optimise.merge_lines(lines, tolerance=0.05) == [
+        [(-1, 0), (1, 0), (1.01, 1), (3, 1)],
+        [(5, 5), (6, 6)],
+    ]
+
+
+def test_merge_lines_tolerance():
+    lines = [[(0, 0), (1, 0)], [(1.1, 0), (1.1, 1)]]
+
+    assert len(optimise.merge_lines(lines, tolerance=0.05)) == 2
+    assert len(optimise.merge_lines(lines, tolerance=0.2)) == 1
+
+
+def test_pen_lifts():
+    # the second line starts within a millimetre of the end of the first, so the pen stays down
+    lines = [[(0, 0), (1, 0)], [(1.01, 0), (1, 1)], [(5, 5), (6, 6)]]
+
+    assert optimise.pen_lifts(lines) == 1
+    assert optimise.pen_lifts(optimise.merge_lines(lines, tolerance=0.05)) == 1
@@ -0,0 +1,104 @@
+import logging
+
+from brachiograph import BrachioGraph
+from progress import Progress, TqdmSink, LogSink, CallbackSink, make_sinks
+
+
+class Clock:
+
+    # a clock that only moves when told to
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+# ----------------- Progress -----------------
+
+def test_reports_at_a_fixed_rate():
+    clock = Clock()
+    reports = []
+    progress = Progress(1000, [CallbackSink(lambda progress: reports.append(progress.done))], interval=1, clock=clock)
+
+    for step in range(1000):
+        clock.time = step / 100
+        progress.step()
+    progress.close()
+
+    # one report at the start, then one a second, and one at the end
+    assert reports[0] == 0
+    assert len(reports) == 11
+    assert reports[-1] == 1000
+
+
+def test_progress_figures():
+    clock = Clock()
+    progress = Progress(200, clock=clock)
+
+    assert progress.remaining is None
+
+    clock.time = 10
+    progress.step(50)
+
+    assert progress.fraction == 0.25
+    assert progress.elapsed == 10
+    assert progress.remaining == 30
+
+
+def test_tqdm_sink():
+    clock = Clock()
+    sink = TqdmSink(disable=True)
+    progress = Progress(10, [sink], interval=1, clock=clock)
+
+    progress.step(3)
+    assert sink.shown == 0
+
+    clock.time = 1
+    progress.step(3)
+    assert sink.shown == 6
+
+    progress.close()
+    assert sink.bar is None
+
+
+def test_log_sink(caplog):
+    clock = Clock()
+
+    with caplog.at_level(logging.INFO, logger="brachiograph"):
+        with Progress(4, [LogSink()], description="Box", unit="sides", clock=clock) as progress:
+            clock.time = 2
+            progress.step(4)
+
+    assert caplog.messages[0] == "Box: 0/4 sides (0%), 0.0s elapsed"
+    assert caplog.messages[-2] == "Box: 4/4 sides (100%), 2.0s elapsed, about 0s remaining"
+    assert caplog.messages[-1] == "Box: finished 4 sides in 2.0s"
+
+
+def test_make_sinks():
+    function = lambda progress: None
+    sink = LogSink()
+
+    assert isinstance(make_sinks(None)[0], TqdmSink)
+    assert make_sinks(False) == []
+    assert make_sinks(sink) == [sink]
+    assert isinstance(make_sinks(function)[0], CallbackSink)
+    assert [type(item) for item in make_sinks([sink, function])] == [LogSink, CallbackSink]
+
+
+# ----------------- plotting -----------------
+
+def test_plot_progress():
+    reports = []
+    plotter = BrachioGraph(
+        inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True,
+        progress=lambda progress: reports.append((progress.done, progress.total)),
+    )
+
+    plotter.plot_lines([[[0, 0], [1, 0], [1, 1]], [[2, 2], [3, 3]], [[4, 4]]])
+    plotter.box()
+
+    assert reports[0] == (0, 3)
+    assert (3, 3) in reports
+    assert reports[-1] == (4, 4)
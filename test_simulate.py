@@ -0,0 +1,105 @@
+import json
+import time
+
+import pytest
+import numpy
+
+from brachiograph import BrachioGraph
+from drivers import RecordingDriver
+from motion import profile_durations, profile_times
+
+
+def recorded_plot(plotter, lines):
+
+    # plots the lines, returning every dwell of every move, and the number of pen movements
+
+    dwells, pen_movements = [], []
+    steps, pw = plotter.steps, plotter.pen.pw
+
+    def recording_steps(*args, **kwargs):
+        x_steps, y_steps, step_dwells = steps(*args, **kwargs)
+        dwells.extend(step_dwells)
+        return x_steps, y_steps, step_dwells
+
+    plotter.steps = recording_steps
+    plotter.pen.pw = lambda pulse_width: (
+        pen_movements.append("down" if pulse_width == plotter.pen.pw_down else "up"), pw(pulse_width)
+    )
+
+    plotter.plot_lines(lines)
+
+    return dwells, pen_movements
+
+
+# ----------------- estimates -----------------
+
+@pytest.mark.parametrize("options", [{}, {"tolerance": 0.1}, {"acceleration": 20}])
+def test_estimate_matches_plot(options):
+    with open("test-patterns/accuracy.json") as line_file:
+        lines = json.load(line_file)
+
+    driver = RecordingDriver()
+    plotter = BrachioGraph(
+        inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, driver=driver, wait=0.1, **options
+    )
+
+    estimate = plotter.estimate_lines(json.loads(json.dumps(lines)))
+
+    driver.clear()
+    dwells, pen_movements = recorded_plot(plotter, json.loads(json.dumps(lines)))
+
+    # park() waits a second after its move; the plotter's accumulated steps can leave it a step short
+    assert estimate.drawing_time + estimate.travel_time + estimate.settling_time == pytest.approx(sum(dwells) + 1, rel=0.01)
+    assert estimate.pen_time == pytest.approx(len(pen_movements) * plotter.pen.transition_time)
+    assert estimate.steps == pytest.approx(len(dwells), rel=0.02)
+    assert estimate.servo_commands - len(driver.log) == 2 * (estimate.steps - len(dwells))
+    assert estimate.pen_lifts == sum(
+        1 for previous, movement in zip(pen_movements, pen_movements[1:]) if (previous, movement) == ("down", "up")
+    )
+
+    if options.get("acceleration"):
+        assert estimate.settling_time == 1
+
+
+def test_estimate_counts():
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True)
+
+    # two lines joined end to start, a separate one, and a single point
+    estimate = plotter.estimate_lines([[[0, 0], [1, 0]], [[1, 0], [1, 1]], [[3, 3], [4, 4]], [[2, 0]]])
+
+    assert estimate.drawing_moves == 3
+    assert estimate.travel_moves == 4
+    assert estimate.pen_lifts == 2
+    assert estimate.total_time == pytest.approx(
+        estimate.drawing_time + estimate.travel_time + estimate.pen_time + estimate.settling_time
+    )
+    assert "pen lifts" in str(estimate)
+
+
+def test_estimate_is_fast():
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True)
+
+    # 100,000 points, in lines of 20
+    random = numpy.random.default_rng(0)
+    lines = numpy.cumsum(random.normal(size=(5000, 20, 2)), axis=1).tolist()
+
+    started = time.perf_counter()
+    estimate = plotter.estimate_lines(lines)
+
+    assert time.perf_counter() - started < 1
+    assert estimate.drawing_moves == 5000 * 19
+
+
+# ----------------- motion profiles -----------------
+
+def test_profile_durations_match_profile_times():
+    lengths = numpy.array([0, 0.01, 0.5, 3, 10, 0.2])
+    entry_speeds = numpy.array([0, 0, 5, 0, 10, 6])
+    exit_speeds = numpy.array([0, 1, 2, 0, 10, 0])
+
+    expected = [
+        profile_times([length], length, entry_speed, exit_speed, 10, 20)[0]
+        for length, entry_speed, exit_speed in zip(lengths, entry_speeds, exit_speeds)
+    ]
+
+    assert profile_durations(lengths, entry_speeds, exit_speeds, 10, 20) == pytest.approx(expected)
@@ -0,0 +1,134 @@
+import pytest
+
+from brachiograph import BrachioGraph
+from drivers import RecordingDriver
+from validate import validate, clip, rescale
+
+
+def make_plotter(**options):
+    return BrachioGraph(inner_arm=8, outer_arm=8, bounds=(-6, 4, 6, 12), virtual_mode=True, **options)
+
+
+# lines that are fine, out of reach, pass through the unreachable shoulder, need unsafe pulse-widths,
+# and go outside the bounds
+lines = [
+    [[-4, 6], [4, 6], [4, 10]],
+    [[0, 10], [0, 17]],
+    [[-1, 0], [1, 0]],
+    [[10, 2], [12, 0]],
+    [[-5, 10], [-7, 10]],
+]
+
+
+# ----------------- validation -----------------
+
+def test_validation_finds_problems():
+    plotter = make_plotter()
+
+    # each line on its own, starting from its first point
+    problems = [validate(plotter, [line], bounds=(-6, 4, 6, 12), start=line[0]) for line in lines]
+
+    assert [bool(validation.unreachable) for validation in problems] == [False, True, True, False, False]
+    # (close to the shoulder, the servos would have to turn too far, too)
+    assert [bool(validation.pulse_widths) for validation in problems] == [False, False, True, True, False]
+    assert [bool(validation.out_of_bounds) for validation in problems] == [False, True, True, True, True]
+
+    validation = validate(plotter, lines, bounds=(-6, 4, 6, 12))
+
+    assert validation.lines == [1, 2, 3, 4]
+    assert not validation.ok
+    assert "out of reach: lines 1, 2" in str(validation)
+
+
+def test_validation_checks_travel():
+    # the line is fine, but the pen has to travel through the shoulder to get to it
+    validation = validate(make_plotter(), [[[1, 0], [2, 0]]], start=(-1, 0))
+
+    assert validation.unreachable == [0]
+
+
+def test_validation_allows_for_hysteresis():
+    # just within the servo's range, but not once hysteresis correction is added
+    line = [[[9.9, 2], [10, 2]]]
+
+    assert validate(make_plotter(), line).ok
+    assert validate(make_plotter(hysteresis_correction_1=150), line).pulse_widths == [0]
+
+
+def test_draw_lines_refuses_before_moving():
+    driver = RecordingDriver()
+    plotter = make_plotter(driver=driver)
+    driver.clear()
+
+    with pytest.raises(ValueError):
+        plotter.draw_lines(lines)
+
+    assert not driver.log
+
+
+# ----------------- fixing lines -----------------
+
+def test_clip():
+    clipped = clip(make_plotter(), lines, bounds=(-6, 4, 6, 12)).to_lines()
+
+    assert clipped[0] == lines[0]
+    assert validate(make_plotter(), clipped, bounds=(-6, 4, 6, 12)).ok
+
+    # the part of the line that's out of reach has gone; the rest stays
+    assert clipped[1][0] == [0, 10]
+    assert max(y for x, y in clipped[1]) <= 12
+
+
+def test_clip_keeps_original_points():
+    plotter = make_plotter()
+
+    # only the last segment goes out of reach
+    line = [[-4, 6], [-2, 6], [0, 10], [0, 17]]
+    clipped = clip(plotter, [line], start=line[0]).to_lines()
+
+    assert clipped[0][:3] == line[:3]
+    assert 10 < clipped[0][-1][1] < 17
+    assert all(x == 0 for x, y in clipped[0][2:])
+
+
+def test_clip_leaves_out_lines_that_cannot_be_travelled_to():
+    plotter = make_plotter()
+
+    # the line is fine, but the pen has to travel through the shoulder to get to it
+    assert clip(plotter, [[[1, 0], [2, 0]]], start=(-1, 0)).to_lines() == []
+
+    # the pen would pass under the shoulder between the first two lines; the third can still be
+    # travelled to from the end of the first
+    lines = [[[-6, 2], [-6, 0]], [[1, 0], [2, 0]], [[-5, 2], [-4, 2]]]
+    clipped = clip(plotter, lines, start=(-6, 2)).to_lines()
+
+    assert validate(plotter, lines, start=(-6, 2)).lines == [1]
+    assert clipped == [lines[0], lines[2]]
+    assert validate(plotter, clipped, start=(-6, 2)).ok
+
+
+def test_rescale():
+    drawing = [[[-6, 4], [6, 4], [6, 16], [-6, 16]]]
+    rescaled = rescale(make_plotter(), drawing)
+
+    assert validate(make_plotter(), rescaled).ok
+    assert not validate(make_plotter(), drawing).ok
+    assert rescaled[0][2][1] < 16
+
+
+def test_plot_lines_with_fix():
+    plotter = make_plotter()
+
+    # scaled to fit the bounds, the corner of the box is out of reach of these short arms
+    short_arms = BrachioGraph(inner_arm=6, outer_arm=6, bounds=(-6, 4, 6, 12), virtual_mode=True)
+    box = [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+
+    with pytest.raises(ValueError):
+        short_arms.plot_lines(box)
+
+    short_arms.plot_lines(box, fix="rescale")
+    short_arms.plot_lines(box, fix="clip")
+    plotter.plot_lines(box, fix="clip")
+
+    with pytest.raises(ValueError):
+        plotter.plot_lines(box, fix="stretch")
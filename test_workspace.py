@@ -0,0 +1,81 @@
+import math
+
+import pytest
+import numpy
+from PIL import Image
+
+from brachiograph import BrachioGraph
+from workspace import Workspace, survey, geometries
+
+
+# ----------------- Workspace -----------------
+
+def test_angles_match_brachiograph():
+    plotter = BrachioGraph(inner_arm=8, outer_arm=8, virtual_mode=True)
+    workspace = Workspace()
+
+    for shoulder_angle, elbow_angle in [(-90, 90), (-60, 120), (-20, 45)]:
+        x, y = workspace.angles_to_xy(shoulder_angle, elbow_angle)
+        assert (x, y) == pytest.approx(plotter.angles_to_xy(shoulder_angle, elbow_angle))
+
+
+def test_reachable_points():
+    workspace = Workspace(shoulder_centre_angle=-90, shoulder_sweep=180, elbow_centre_angle=90, elbow_sweep=180)
+
+    # BrachioGraph's angles for these points are within the sweeps, except beyond the reach of the
+    # arms, too close to the shoulder, or behind it
+    assert workspace.reachable([0, -8, 0, 0, 1, 5], [8, 8, 17, 3, -10, -5]).tolist() == [
+        True, True, False, False, False, False
+    ]
+
+
+def test_full_sweeps_reach_an_annulus():
+    workspace = Workspace(shoulder_sweep=360, elbow_sweep=360, min_radius=4, resolution=0.05)
+
+    assert workspace.area() == pytest.approx(math.pi * (16 ** 2 - 4 ** 2), rel=0.01)
+
+    # with nothing in the way at the centre, a square inside the circle of reach
+    workspace = Workspace(shoulder_sweep=360, elbow_sweep=360, min_radius=0, resolution=0.05)
+    min_x, min_y, max_x, max_y = workspace.largest_rectangle()
+    assert (max_x - min_x) * (max_y - min_y) == pytest.approx(2 * 16 ** 2, rel=0.02)
+
+
+def test_outline_matches_raster():
+    workspace = Workspace(min_radius=0, resolution=0.05)
+    x, y = workspace.outline().T
+
+    # the shoelace formula
+    area = abs(numpy.dot(x, numpy.roll(y, 1)) - numpy.dot(y, numpy.roll(x, 1))) / 2
+
+    assert area == pytest.approx(workspace.area(), rel=0.01)
+
+
+def test_largest_rectangle_is_reachable():
+    workspace = Workspace()
+    min_x, min_y, max_x, max_y = workspace.largest_rectangle()
+
+    x, y = numpy.meshgrid(numpy.linspace(min_x, max_x, 50), numpy.linspace(min_y, max_y, 50))
+    assert workspace.reachable(x, y).all()
+
+
+def test_render(tmp_path):
+    Workspace().render(tmp_path / "workspace.png", scale=10)
+
+    assert Image.open(tmp_path / "workspace.png").size == (320, 320)
+
+
+# ----------------- surveys -----------------
+
+def test_survey_ranks_geometries():
+    candidates = geometries(shoulder_centre_angle=[-90, -60], elbow_centre_angle=[60, 90])
+    results = survey(candidates, resolution=0.2)
+
+    assert len(results) == 4
+    assert [result["area"] for result in results] == sorted((result["area"] for result in results), reverse=True)
+    assert results[0]["geometry"]["shoulder_centre_angle"] == -60
+
+
+def test_survey_in_parallel():
+    candidates = geometries(shoulder_centre_angle=[-90, -60], elbow_sweep=[120, 180])
+
+    assert survey(candidates, resolution=0.2, workers=2) == survey(candidates, resolution=0.2)
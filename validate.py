@@ -0,0 +1,282 @@
+# Checking a drawing before it is plotted.
+#
+# The plotter only finds out that a point is out of reach, or needs a pulse-width outside a servo's
+# safe range, when it gets there - perhaps hours into a plot. validate() checks every point the pen
+# will pass through - each interpolated step of every line, and of the travel to it - in a single
+# vectorised pass, before anything moves. For each point it checks that:
+#
+# the arms can reach it
+# the pulse-widths for it are within the servos' safe range, even with hysteresis correction
+# it is within the bounds (if given - only the points of the lines themselves are checked)
+#
+# Lines with problems can be clipped to the parts that can be plotted - leaving out any lines that the
+# pen can't travel to - or the whole drawing can be rescaled until they all can.
+
+import numpy
+
+from drawing import Drawing
+
+
+class Validation:
+
+    # The result of validating lines: for each kind of problem, the indices of the lines that have it.
+
+    def __init__(self, unreachable, pulse_widths, out_of_bounds, points):
+
+        self.unreachable = unreachable
+        self.pulse_widths = pulse_widths
+        self.out_of_bounds = out_of_bounds
+        self.points = points  # the number of points checked
+
+    @property
+    def lines(self):
+        # all the lines that can't be plotted
+        return sorted(set(self.unreachable) | set(self.pulse_widths) | set(self.out_of_bounds))
+
+    @property
+    def ok(self):
+        return not self.lines
+
+    def __str__(self):
+
+        if self.ok:
+            return f"All {self.points} points can be plotted"
+
+        def summary(lines):
+            shown = ", ".join(str(line) for line in lines[:10])
+            return shown + (f" and {len(lines) - 10} more" if len(lines) > 10 else "")
+
+        problems = [
+            ("out of reach", self.unreachable),
+            ("outside the servos' pulse-width range", self.pulse_widths),
+            ("outside the bounds", self.out_of_bounds),
+        ]
+
+        return "\n".join(
+            [f"{len(self.lines)} lines can't be plotted:"]
+            + [f"    {description}: lines {summary(lines)}" for description, lines in problems if lines]
+        )
+
+
+def validate(bg, lines, interpolate=10, bounds=None, start=None):
+
+    # Checks lines (already scaled to fit the bounds) for plotting with the BrachioGraph bg, starting
+    # from start (by default, its current position), and returns a Validation.
+
+    drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+
+    if not len(drawing):
+        return Validation([], [], [], 0)
+
+    # every line is travelled to from the end of the one before, then drawn segment by segment
+    segment_starts, segment_ends, segment_lines = drawing.segments()
+    previous_ends = numpy.concatenate(([start or (bg.current_x, bg.current_y)], drawing.ends[:-1]))
+
+    steps, moves = move_steps(
+        numpy.concatenate((previous_ends, segment_starts)), numpy.concatenate((drawing.starts, segment_ends)), interpolate
+    )
+    step_lines = numpy.concatenate((numpy.arange(len(drawing)), segment_lines))[moves]
+
+    unreachable, bad_pulse_widths = check_points(bg, steps)
+
+    if bounds:
+        point_lines = numpy.repeat(numpy.arange(len(drawing)), drawing.lengths)
+        out_of_bounds = point_lines[outside(drawing.points, bounds)]
+    else:
+        out_of_bounds = []
+
+    return Validation(
+        numpy.unique(step_lines[unreachable]).tolist(),
+        numpy.unique(step_lines[bad_pulse_widths]).tolist(),
+        numpy.unique(out_of_bounds).tolist(),
+        len(steps),
+    )
+
+
+def move_steps(starts, ends, interpolate):
+
+    # Returns the positions of the interpolated steps of straight moves from starts to ends - as
+    # BrachioGraph.steps() places them, interpolate to the cm - and the index of the move of each.
+
+    lengths = numpy.hypot(*(ends - starts).T)
+    numbers_of_steps = numpy.maximum((lengths * interpolate).astype(int), 1)
+
+    moves = numpy.repeat(numpy.arange(len(starts)), numbers_of_steps)
+    step_numbers = numpy.arange(len(moves)) - numpy.repeat(numpy.cumsum(numbers_of_steps) - numbers_of_steps, numbers_of_steps) + 1
+
+    fractions = step_numbers / numbers_of_steps[moves]
+
+    return starts[moves] + fractions[:, None] * (ends - starts)[moves], moves
+
+
+def check_points(bg, points):
+
+    # Returns boolean arrays marking the points that are out of reach, and those that need a
+    # pulse-width outside the driver's safe range (allowing for hysteresis correction either way).
+
+    angles_1, angles_2, pws_1, pws_2 = exact_values(bg, points[:, 0], points[:, 1])
+
+    unreachable = numpy.isnan(angles_1) | numpy.isnan(angles_2)
+
+    min_pulse_width = getattr(bg.driver, "min_pulse_width", 500)
+    max_pulse_width = getattr(bg.driver, "max_pulse_width", 2500)
+
+    safe = numpy.ones(len(points), dtype=bool)
+    for pws, correction in ((pws_1, bg.hysteresis_correction_1), (pws_2, bg.hysteresis_correction_2)):
+        safe &= (pws - abs(correction) > min_pulse_width) & (pws + abs(correction) < max_pulse_width)
+
+    return unreachable, ~unreachable & ~safe
+
+
+def exact_values(bg, x, y):
+
+    # angles and pulse-widths for each point, calculated exactly; NaN where they can't be
+
+    hypotenuse = numpy.sqrt(x**2 + y**2)
+    reachable = (hypotenuse > 0) & (hypotenuse >= abs(bg.INNER_ARM - bg.OUTER_ARM)) & (
+        hypotenuse <= bg.INNER_ARM + bg.OUTER_ARM
+    )
+
+    values = numpy.full((4, len(x)), numpy.nan)
+
+    with numpy.errstate(invalid="ignore"):
+        try:
+            angles_1, angles_2 = bg.xy_to_angles_array(x[reachable], y[reachable])
+        except ValueError:
+            # some points can't be calculated; work them out one by one
+            angles = numpy.array([angles_or_nan(bg, *point) for point in zip(x[reachable], y[reachable])])
+            angles_1, angles_2 = angles.reshape(-1, 2).T
+
+    pws_1, pws_2 = bg.angles_to_pulse_widths(angles_1, angles_2)
+
+    values[:, reachable] = angles_1, angles_2, pws_1, pws_2
+
+    return values
+
+
+def angles_or_nan(bg, x, y):
+
+    try:
+        return bg.xy_to_angles_array([x], [y])
+    except (ValueError, ZeroDivisionError):
+        return [numpy.nan], [numpy.nan]
+
+
+def outside(points, bounds, margin=1e-9):
+
+    # marks the points that are outside the bounds (by more than a rounding error)
+
+    return (
+        (points[:, 0] < bounds[0] - margin) | (points[:, 1] < bounds[1] - margin)
+        | (points[:, 0] > bounds[2] + margin) | (points[:, 1] > bounds[3] + margin)
+    )
+
+
+# ----------------- fixing lines -----------------
+
+def clip(bg, lines, interpolate=10, bounds=None, start=None):
+
+    # Returns a Drawing of the lines, with those that have problems cut down to the parts that can be
+    # plotted. Where a line has to be cut, the cut is made at its interpolated steps; otherwise its
+    # original points are kept. Lines that can't be travelled to - because the pen would pass out of
+    # reach on the way - are left out, so the lines that are returned can all be plotted.
+
+    drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+    bad_lines = set(validate(bg, drawing, interpolate, bounds, start).lines)
+
+    parts = []
+
+    for index, line in enumerate(drawing):
+
+        if index not in bad_lines:
+            parts.append(line)
+        else:
+            parts.extend(clip_line(bg, line, interpolate, bounds))
+
+    offsets = numpy.concatenate(([0], numpy.cumsum([len(part) for part in parts], dtype=numpy.int64)))
+    clipped = Drawing(numpy.concatenate(parts) if parts else numpy.zeros((0, 2)), offsets)
+
+    return drop_untravellable(bg, clipped, interpolate, bounds, start)
+
+
+def clip_line(bg, line, interpolate, bounds):
+
+    # Returns the parts of a single line (an array of its points) that can be plotted, ignoring the
+    # travel to it.
+
+    if len(line) > 1:
+        steps, segments = move_steps(line[:-1], line[1:], interpolate)
+    else:
+        steps, segments = line[:0], numpy.zeros(0, dtype=int)
+    steps = numpy.concatenate((line[:1], steps))
+    segments = numpy.concatenate(([-1], segments))
+
+    unreachable, bad_pulse_widths = check_points(bg, steps)
+    good = ~unreachable & ~bad_pulse_widths
+    if bounds:
+        good &= ~outside(steps, bounds)
+
+    # the intermediate steps are only needed where a segment has to be cut; the steps at the ends of
+    # the segments are the line's own points
+    bad_segments = numpy.unique(segments[~good])
+    ends_of_segments = numpy.append(segments[1:] != segments[:-1], True)
+    needed = ends_of_segments | numpy.isin(segments, bad_segments)
+
+    # split the line wherever there's a point that can't be plotted, keeping the parts that can
+    parts = []
+    breaks = numpy.flatnonzero(~good)
+    for part, part_good, part_needed in zip(
+        numpy.split(steps, breaks), numpy.split(good, breaks), numpy.split(needed, breaks)
+    ):
+        part = part[part_good & part_needed]
+        if len(part) > 1 or (len(part) and len(line) == 1):
+            parts.append(part)
+
+    return parts
+
+
+def drop_untravellable(bg, drawing, interpolate, bounds, start):
+
+    # Leaves out lines that can only fail because of the travel to them. Leaving out a line changes
+    # where the pen travels to the next one from, so this is repeated until all the lines pass.
+
+    validation = validate(bg, drawing, interpolate, bounds, start)
+
+    while not validation.ok:
+        keep = numpy.ones(len(drawing), dtype=bool)
+        keep[validation.lines] = False
+        drawing = drawing.reorder(numpy.flatnonzero(keep))
+        validation = validate(bg, drawing, interpolate, bounds, start)
+
+    return drawing
+
+
+def rescale(bg, lines, interpolate=10, bounds=None, start=None):
+
+    # Returns a Drawing of the lines, scaled down about the centre of the bounds (or of the lines themselves) as
+    # little as is needed for all of them to be plottable; raises a ValueError if they can't be.
+
+    drawing = lines if isinstance(lines, Drawing) else Drawing.from_lines(lines)
+
+    if validate(bg, drawing, interpolate, bounds, start).ok:
+        return drawing
+
+    min_x, min_y, max_x, max_y = bounds or drawing.bounds()
+    centre = numpy.array([(min_x + max_x) / 2, (min_y + max_y) / 2])
+
+    def scaled(factor):
+        return Drawing(centre + (drawing.points - centre) * factor, drawing.offsets)
+
+    # find the largest scale that works, to within a thousandth
+    smallest, largest = 0, 1
+    while largest - smallest > 0.001:
+        factor = (smallest + largest) / 2
+        if validate(bg, scaled(factor), interpolate, bounds, start).ok:
+            smallest = factor
+        else:
+            largest = factor
+
+    if not smallest:
+        raise ValueError("The lines can't be rescaled so that they can all be plotted")
+
+    return scaled(smallest)
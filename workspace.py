@@ -0,0 +1,334 @@
+# Maps of the area a plotter can draw on, worked out numerically rather than drawn with turtle graphics.
+#
+# A Workspace describes a plotter's geometry in the same terms as turtle_draw.BrachioGraphTurtle: the
+# length of each arm, and the centre and sweep of each servo's range. Angles are in degrees, clockwise,
+# the shoulder's from straight ahead (the y axis) and the elbow's relative to the inner arm - the
+# same as the angles used by BrachioGraph.
+#
+# From the geometry it works out:
+#
+# a raster - which points on a grid the pen can reach, by both ways of bending the arms to reach them
+# the outline of the reachable area, as a polygon - what turtle_draw draws as four coloured arcs
+# the largest rectangle that can be drawn in, for use as a BrachioGraph's bounds
+#
+# survey() does all that for many geometries at once - in parallel, with more than one worker - and
+# ranks them by the size of their rectangles. Maps can be saved as PNG images, without needing Tk.
+#
+# Run with, for example:
+#
+#     python workspace.py --shoulder-centre -60 --shoulder-sweep 120 workspace.png
+
+import argparse
+import concurrent.futures
+import itertools
+
+import numpy
+
+
+class Workspace:
+
+    def __init__(
+        self,
+        inner_arm=8,                # the length of the inner arm
+        outer_arm=8,                # the length of the outer arm
+        shoulder_centre_angle=-60,  # the centre of the shoulder motor's sweep, relative to straight ahead
+        shoulder_sweep=120,         # the arc covered by the shoulder motor
+        elbow_centre_angle=90,      # the centre of the outer arm's sweep, relative to the inner arm
+        elbow_sweep=120,            # the arc covered by the elbow motor
+        min_radius=4,               # how close to the shoulder motor the pen can get
+        resolution=0.1,             # the size in cm of each cell of the raster
+    ):
+
+        self.inner_arm = inner_arm
+        self.outer_arm = outer_arm
+        self.shoulder_centre_angle = shoulder_centre_angle
+        self.shoulder_sweep = shoulder_sweep
+        self.elbow_centre_angle = elbow_centre_angle
+        self.elbow_sweep = elbow_sweep
+        self.min_radius = min_radius
+        self.resolution = resolution
+
+        self._raster = None
+
+    def geometry(self):
+        return {
+            "inner_arm": self.inner_arm,
+            "outer_arm": self.outer_arm,
+            "shoulder_centre_angle": self.shoulder_centre_angle,
+            "shoulder_sweep": self.shoulder_sweep,
+            "elbow_centre_angle": self.elbow_centre_angle,
+            "elbow_sweep": self.elbow_sweep,
+            "min_radius": self.min_radius,
+        }
+
+    def __repr__(self):
+        return f"Workspace({', '.join(f'{name}={value}' for name, value in self.geometry().items())})"
+
+    # ----------------- kinematics -----------------
+
+    def angles_to_xy(self, shoulder_angles, elbow_angles):
+
+        # the x/y positions of the pen for arrays of shoulder and elbow angles
+
+        shoulder = numpy.radians(shoulder_angles)
+        outer = shoulder + numpy.radians(elbow_angles)
+
+        x = self.inner_arm * numpy.sin(shoulder) + self.outer_arm * numpy.sin(outer)
+        y = self.inner_arm * numpy.cos(shoulder) + self.outer_arm * numpy.cos(outer)
+
+        return x, y
+
+    def reachable(self, x, y):
+
+        # Returns a boolean array marking which of the x/y positions the pen can reach: within reach of
+        # the arms, no closer than min_radius, and with the arms bent either way, within the servos' sweeps.
+
+        x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+
+        radius = numpy.hypot(x, y)
+        heading = numpy.degrees(numpy.arctan2(x, y))
+
+        # the elbow angle, by the cosine rule; NaN where the point is out of reach
+        with numpy.errstate(invalid="ignore"):
+            elbow = numpy.degrees(numpy.arccos(
+                (radius ** 2 - self.inner_arm ** 2 - self.outer_arm ** 2) / (2 * self.inner_arm * self.outer_arm)
+            ))
+
+        reachable = numpy.zeros(radius.shape, dtype=bool)
+
+        for elbow_angles in (elbow, -elbow):
+
+            # the angle between the inner arm and the line from the shoulder to the pen
+            offset = numpy.degrees(numpy.arctan2(
+                self.outer_arm * numpy.sin(numpy.radians(elbow_angles)),
+                self.inner_arm + self.outer_arm * numpy.cos(numpy.radians(elbow_angles)),
+            ))
+
+            reachable |= within(heading - offset, self.shoulder_centre_angle, self.shoulder_sweep) & within(
+                elbow_angles, self.elbow_centre_angle, self.elbow_sweep
+            )
+
+        return reachable & (radius >= self.min_radius)
+
+    # ----------------- maps -----------------
+
+    def grid(self):
+
+        # the x and y co-ordinates of the centres of the raster's columns and rows, covering the arms' reach
+
+        reach = self.inner_arm + self.outer_arm
+        cells = int(numpy.ceil(reach / self.resolution))
+        centres = (numpy.arange(-cells, cells) + 0.5) * self.resolution
+
+        return centres, centres
+
+    def raster(self):
+
+        # a boolean array of which cells of the grid the pen can reach (rows in order of increasing y)
+
+        if self._raster is None:
+            x, y = self.grid()
+            self._raster = self.reachable(x[None, :], y[:, None])
+
+        return self._raster
+
+    def area(self):
+        # the area in cm² that the pen can reach
+        return float(self.raster().sum() * self.resolution ** 2)
+
+    def outline(self, points_per_arc=90):
+
+        # Returns the outline of the reachable area (ignoring min_radius) as an array of polygon
+        # vertices: the four arcs that the pen follows with each servo in turn at one end of its sweep.
+        # This is exact as long as the elbow stays between 0° and 180°, which is all that's useful.
+
+        shoulder_min = self.shoulder_centre_angle - self.shoulder_sweep / 2
+        shoulder_max = self.shoulder_centre_angle + self.shoulder_sweep / 2
+        elbow_min = self.elbow_centre_angle - self.elbow_sweep / 2
+        elbow_max = self.elbow_centre_angle + self.elbow_sweep / 2
+
+        shoulder_steps = numpy.linspace(shoulder_min, shoulder_max, points_per_arc, endpoint=False)
+        elbow_steps = numpy.linspace(elbow_min, elbow_max, points_per_arc, endpoint=False)
+
+        # around the edge of the servos' angles: both at their minimum, then each in turn to its maximum
+        shoulder_angles = numpy.concatenate((
+            shoulder_steps, numpy.full(points_per_arc, shoulder_max),
+            shoulder_steps[::-1] + (shoulder_max - shoulder_min) / points_per_arc, numpy.full(points_per_arc, shoulder_min),
+        ))
+        elbow_angles = numpy.concatenate((
+            numpy.full(points_per_arc, elbow_min), elbow_steps,
+            numpy.full(points_per_arc, elbow_max), elbow_steps[::-1] + (elbow_max - elbow_min) / points_per_arc,
+        ))
+
+        return numpy.column_stack(self.angles_to_xy(shoulder_angles, elbow_angles))
+
+    def largest_rectangle(self):
+
+        # Returns the largest rectangle (min x, min y, max x, max y) - to within the resolution - all of
+        # whose cells can be reached, for use as a BrachioGraph's bounds; None if there isn't one.
+
+        raster = self.raster()
+        columns = raster.shape[1]
+
+        column_numbers = numpy.arange(columns)
+
+        # For each cell, as the rows are worked through: how many reachable cells there are in an
+        # unbroken column up to it, and how far left and right a rectangle of that height can extend from it. The largest
+        # rectangle is the largest of the ones found for each cell.
+        heights = numpy.zeros(columns, dtype=int)
+        lefts = numpy.zeros(columns, dtype=int)
+        rights = numpy.full(columns, columns)
+
+        best_area, best = 0, None
+
+        for row, cells in enumerate(raster):
+
+            heights = numpy.where(cells, heights + 1, 0)
+
+            # just after the last unreachable cell on the left, and at the first on the right
+            lefts_in_row = numpy.maximum.accumulate(numpy.where(cells, 0, column_numbers + 1))
+            rights_in_row = numpy.minimum.accumulate(numpy.where(cells, columns, column_numbers)[::-1])[::-1]
+
+            lefts = numpy.where(cells, numpy.maximum(lefts, lefts_in_row), 0)
+            rights = numpy.where(cells, numpy.minimum(rights, rights_in_row), columns)
+
+            areas = (rights - lefts) * heights
+            column = int(areas.argmax())
+
+            if areas[column] > best_area:
+                best_area = int(areas[column])
+                best = (row - heights[column] + 1, row, lefts[column], rights[column] - 1)
+
+        if not best:
+            return None
+
+        x, y = self.grid()
+        bottom, top, left, right = best
+
+        return float(x[left]), float(y[bottom]), float(x[right]), float(y[top])
+
+    # ----------------- rendering -----------------
+
+    def render(self, filename, scale=20, bounds=None):
+
+        # Saves a map of the workspace as an image (its format from the filename's extension, such as
+        # .png): a grid at every cm, the reachable area, its outline, and bounds - by default, the
+        # largest rectangle. scale is in pixels per cm.
+
+        from PIL import Image, ImageDraw
+
+        reach = self.inner_arm + self.outer_arm
+        size = int(2 * reach * scale)
+
+        def pixel(x, y):
+            # image co-ordinates, with the shoulder at the centre and y upwards
+            return (size / 2 + x * scale, size / 2 - y * scale)
+
+        # the reachable area, scaled up from the raster
+        raster = self.raster()[::-1]
+        reachable = Image.fromarray((raster * 255).astype(numpy.uint8)).resize((size, size), Image.NEAREST)
+
+        image = Image.new("RGB", (size, size), "white")
+        image.paste((210, 230, 250), mask=reachable)
+
+        draw = ImageDraw.Draw(image)
+
+        for cm in range(-int(reach), int(reach) + 1):
+            colour = (150, 150, 150) if cm % 5 else (60, 60, 60)
+            draw.line([pixel(cm, -reach), pixel(cm, reach)], fill=colour)
+            draw.line([pixel(-reach, cm), pixel(reach, cm)], fill=colour)
+
+        draw.polygon([pixel(x, y) for x, y in self.outline()], outline=(0, 0, 200))
+
+        bounds = bounds or self.largest_rectangle()
+        if bounds:
+            draw.rectangle([pixel(bounds[0], bounds[3]), pixel(bounds[2], bounds[1])], outline=(200, 0, 0), width=2)
+
+        draw.ellipse([pixel(-0.2, 0.2), pixel(0.2, -0.2)], fill=(0, 0, 0))
+
+        image.save(filename)
+
+
+def within(angles, centre, sweep):
+
+    # marks the angles that are within the sweep either side of centre, going round the circle either way
+
+    return numpy.abs((angles - centre + 180) % 360 - 180) <= sweep / 2
+
+
+# ----------------- surveys -----------------
+
+def survey(geometries, resolution=0.1, workers=1):
+
+    # Works out the largest rectangle for each of geometries (dictionaries of arguments for a
+    # Workspace), sharing the work between that many processes. Returns a list of dictionaries, each
+    # with the geometry, its bounds and their area, and the area that can be reached - the geometries
+    # with the largest rectangles first.
+
+    geometries = [dict(geometry, resolution=resolution) for geometry in geometries]
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(survey_one, geometries, chunksize=max(len(geometries) // (4 * workers), 1)))
+    else:
+        results = [survey_one(geometry) for geometry in geometries]
+
+    return sorted(results, key=lambda result: result["area"], reverse=True)
+
+
+def survey_one(geometry):
+
+    workspace = Workspace(**geometry)
+    bounds = workspace.largest_rectangle()
+
+    return {
+        "geometry": workspace.geometry(),
+        "bounds": bounds,
+        "area": (bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) if bounds else 0,
+        "reachable_area": workspace.area(),
+    }
+
+
+def geometries(**ranges):
+
+    # Every combination of the values given for each argument of a Workspace, as dictionaries - for
+    # example, geometries(shoulder_centre_angle=range(-90, -30, 5), elbow_centre_angle=[80, 90, 100]).
+
+    names = list(ranges)
+
+    return [dict(zip(names, values)) for values in itertools.product(*(ranges[name] for name in names))]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Map the area a BrachioGraph can draw on")
+    parser.add_argument("filename", help="the image to save the map to, such as workspace.png")
+    parser.add_argument("--inner-arm", type=float, default=8)
+    parser.add_argument("--outer-arm", type=float, default=8)
+    parser.add_argument("--shoulder-centre", type=float, default=-60)
+    parser.add_argument("--shoulder-sweep", type=float, default=120)
+    parser.add_argument("--elbow-centre", type=float, default=90)
+    parser.add_argument("--elbow-sweep", type=float, default=120)
+    parser.add_argument("--min-radius", type=float, default=4)
+    args = parser.parse_args()
+
+    workspace = Workspace(
+        inner_arm=args.inner_arm, outer_arm=args.outer_arm,
+        shoulder_centre_angle=args.shoulder_centre, shoulder_sweep=args.shoulder_sweep,
+        elbow_centre_angle=args.elbow_centre, elbow_sweep=args.elbow_sweep,
+        min_radius=args.min_radius,
+    )
+
+    bounds = workspace.largest_rectangle()
+    workspace.render(args.filename, bounds=bounds)
+
+    print(f"reachable area: {workspace.area():.0f}cm²")
+    if bounds:
+        print(
+            f"largest rectangle: {bounds[2] - bounds[0]:.1f} x {bounds[3] - bounds[1]:.1f}cm, "
+            f"bounds=({', '.join(f'{value:.2f}' for value in bounds)})"
+        )
+
+
+if __name__ == "__main__":
+    main()